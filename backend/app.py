@@ -3,6 +3,7 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 from models import SessionLocal, PantryItem, Recipe
+import recipe_index
 
 load_dotenv()
 
@@ -11,6 +12,9 @@ CORS(app)  # Enable CORS for frontend communication
 
 USE_WATSONX = os.getenv("USE_WATSONX", "false").lower() == "true"
 
+# Saved recipes are also indexed for search (shared with main.py's /api/recipes/search)
+recipe_search = recipe_index.RecipeIndex(os.getenv("RECIPE_INDEX_FILE", "recipe_index.sqlite3"))
+
 # Simple helper: session
 def get_db():
     db = SessionLocal()
@@ -87,10 +91,22 @@ def plan_meal():
     r = Recipe(title=plan.get("title", "Generated Recipe"), body=plan.get("body", ""))
     db.add(r)
     db.commit()
+    recipe_search.add_rows([recipe_index.model_row(r.id, r.title, r.body)])
 
     return jsonify(plan)
 
 
+def backfill_recipe_index():
+    """Index Recipe rows added since the last backfill."""
+    db = next(get_db())
+    last_id = recipe_search.get_meta("db_recipes")
+    rows = db.query(Recipe).filter(Recipe.id > last_id).order_by(Recipe.id).all()
+    if rows:
+        recipe_search.add_rows(recipe_index.model_row(r.id, r.title, r.body) for r in rows)
+        recipe_search.set_meta("db_recipes", rows[-1].id)
+    return len(rows)
+
+
 def _mock_recipe_planner(pantry_items):
     # very small heuristic for demo
     s = ", ".join(pantry_items[:6]) if pantry_items else "nothing"
@@ -100,4 +116,5 @@ def _mock_recipe_planner(pantry_items):
     return {"title": title, "body": body, "missing": shopping}
 
 if __name__ == "__main__":
+    backfill_recipe_index()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,9 @@
+"""
+Benchmark suite for the backend's hot paths.
+
+Run from the backend directory:
+
+    python -m benchmarks.run                      # full suite, results/<commit>.json
+    python -m benchmarks.run --quick -k storage   # smaller sizes, one group
+    python -m benchmarks.compare results/a.json results/b.json
+"""
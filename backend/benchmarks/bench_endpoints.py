@@ -0,0 +1,69 @@
+"""Endpoints end-to-end through the Flask test client, plus concurrent throughput."""
+
+import threading
+import time
+
+from benchmarks.fixtures import isolated_storage, make_pantry, offline_watsonx, without_rate_limits
+
+
+def run(runner, main):
+    with without_rate_limits(main):
+        _run(runner, main)
+
+
+def _run(runner, main):
+    client = main.app.test_client()
+    for size in runner.sizes((10, 1000), (10,)):
+        with isolated_storage(main, pantry=make_pantry(size)):
+            for mode in ("home", "professional"):
+                runner.bench(f"endpoint.meal_plan[{mode},{size}]",
+                             lambda: client.post("/api/meal-plan", json={"cookingMode": mode}),
+                             params={"mode": mode, "items": size})
+            with offline_watsonx(main, runner.cassette):
+                # "fresh" skips the similarity cache, so every request goes through generation
+                runner.bench(f"endpoint.generate_recipe[home,{size}]",
+                             lambda: client.post("/api/generate_recipe", json={"mode": "home", "fresh": True}),
+                             params={"mode": "home", "items": size}, max_number=128)
+                if size <= main.similar_recipes.max_pantry:  # larger pantries skip the cache
+                    runner.bench(f"endpoint.generate_recipe[cached,{size}]",
+                                 lambda: client.post("/api/generate_recipe", json={"mode": "home"}),
+                                 setup=lambda: client.post("/api/generate_recipe", json={"mode": "home", "fresh": True}),
+                                 params={"mode": "home", "items": size, "cached": True})
+
+    latency = 0.02
+    requests_per_thread = runner.sizes(25, 5)
+    for threads in runner.sizes((1, 4, 16), (1, 4)):
+        if not runner.wants(f"endpoint.throughput[{threads}]"):
+            continue
+        samples = []
+        for _ in range(runner.repeat):
+            with isolated_storage(main, pantry=make_pantry(50)), offline_watsonx(main, runner.cassette, latency):
+                samples.append(_throughput(main, threads, requests_per_thread))
+        runner.record(f"endpoint.throughput[{threads}]", samples, unit="req/s", higher_is_better=True,
+                      params={"threads": threads, "stub_latency": latency, "requests": threads * requests_per_thread})
+
+
+def _throughput(main, threads, requests_per_thread):
+    start_barrier = threading.Barrier(threads + 1)
+    errors = []
+
+    def worker():
+        client = main.app.test_client()
+        start_barrier.wait()
+        for i in range(requests_per_thread):
+            path, body = (("/api/generate_recipe", {"mode": "home", "fresh": True}) if i % 2 == 0
+                          else ("/api/meal-plan", {"cookingMode": "home"}))
+            if client.post(path, json=body).status_code != 200:
+                errors.append(path)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        print(f"    {len(errors)} failed requests during throughput run")
+    return threads * requests_per_thread / elapsed
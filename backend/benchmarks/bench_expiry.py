@@ -0,0 +1,26 @@
+"""Expiry index builds and "expiring soon" queries on large pantries."""
+
+import time
+
+import expiry
+from benchmarks.fixtures import isolated_storage, make_pantry
+
+
+def run(runner, main):
+    for size in runner.sizes((1000, 10000, 100000), (1000, 10000)):
+        pantry = make_pantry(size, expiring_every=4)
+        params = {"items": size, "with_expiry": len(pantry[::4])}
+        runner.bench(f"expiry.build_index[{size}]", lambda: expiry.ExpiryIndex(pantry), params=params, max_number=10)
+        tracker = expiry.ExpiryTracker()
+        tracker.index(pantry, "bench", size)
+        # What a request pays while the pantry is unchanged: the cached index plus a range query.
+        runner.bench(f"expiry.expiring_within[{size}]",
+                     lambda: tracker.index(pantry, "bench", size).expiring_within(main.EXPIRY_SOON_DAYS),
+                     params=params)
+        since = time.time() - 3600
+        runner.bench(f"expiry.sweep_window[{size}]", lambda: tracker.index(pantry, "bench", size).expired(since=since),
+                     params=params)
+        with isolated_storage(main, pantry=pantry):
+            current = main.load_pantry()
+            runner.bench(f"expiry.usable_pantry[{size}]", lambda: main.usable_pantry(current), params=params,
+                         max_number=100)
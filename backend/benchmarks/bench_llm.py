@@ -0,0 +1,51 @@
+"""The offline LLM stand-ins: cassette lookups, and call_watsonx over in-process replay and the fake server."""
+
+import os
+import shutil
+import tempfile
+
+import llm_replay
+from benchmarks.fixtures import fake_llm_server, isolated_storage, llm_backend, make_cassette, make_pantry
+
+
+def run(runner, main):
+    workdir = tempfile.mkdtemp(prefix="pantry-llm-")
+    try:
+        _run(runner, main, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run(runner, main, workdir):
+    for size in runner.sizes((100, 10000), (100,)):
+        path = os.path.join(workdir, f"cassette-{size}.jsonl")
+        cassette = make_cassette(path, size)
+        prompt = cassette.exchanges()[size // 2]["prompt"]
+        params = {"exchanges": size}
+        runner.bench(f"llm.cassette_load[{size}]", lambda: llm_replay.Cassette(path).exchanges(), params=params,
+                     max_number=10)
+        runner.bench(f"llm.cassette_hit[{size}]", lambda: cassette.find(prompt), params=params)
+        runner.bench(f"llm.cassette_miss[{size}]", lambda: cassette.find("an unrecorded prompt"), params=params)
+
+    # The whole generation path (router, parse, validation, repair) with the model replaced.
+    # No delays here: what is left is the overhead of the stand-in itself.
+    cassette = make_cassette(os.path.join(workdir, "cassette.jsonl"))
+    pantry = make_pantry(20)
+    pantry_names = [item["name"] for item in pantry]
+    prompt = main.build_recipe_prompt(pantry, "home", {})
+
+    def call():
+        return main.call_watsonx(prompt, "home", pantry_names=pantry_names)
+
+    with isolated_storage(main, pantry=pantry):
+        with llm_backend(main, llm_replay.ReplayBackend(cassette)):
+            runner.bench("llm.call_watsonx[replay]", call, max_number=200)
+        truncating = llm_replay.Faults(truncate_rate=1.0, seed=1)
+        with llm_backend(main, llm_replay.ReplayBackend(cassette, faults=truncating)):
+            runner.bench("llm.call_watsonx[replay,truncated]", call, params={"truncate_rate": 1.0},
+                         max_number=200)
+        with fake_llm_server(cassette) as server:
+            for stream in (False, True):
+                label = "fake_stream" if stream else "fake_http"
+                with llm_backend(main, llm_replay.FakeModelClient(server.url, stream=stream)):
+                    runner.bench(f"llm.call_watsonx[{label}]", call, params={"stream": stream}, max_number=200)
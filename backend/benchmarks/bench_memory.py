@@ -0,0 +1,59 @@
+"""Resident footprint of pantries and recipe history: plain dicts vs records.py records."""
+
+import gc
+import tracemalloc
+
+import records
+import serialization
+from benchmarks.fixtures import make_pantry, make_recipe
+
+
+def footprint(build):
+    """Bytes still allocated by ``build()`` once it returns (temporaries freed)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def compare(runner, group, size, payload, cls):
+    """Record dict and record footprints of one JSON list, plus how many times smaller records are."""
+    names = [f"memory.{group}_{kind}[{size}]" for kind in ("dicts", "records", "ratio")]
+    if not any(runner.wants(name) for name in names):
+        return
+    params = {"items": size}
+    as_dicts = footprint(lambda: serialization.loads(payload))
+    as_records = footprint(lambda: [records.compact(item, cls) for item in serialization.loads(payload)])
+    runner.record(names[0], [as_dicts], params=params, unit="B")
+    runner.record(names[1], [as_records], params=params, unit="B")
+    runner.record(names[2], [as_dicts / as_records], params=params, unit="x", higher_is_better=True)
+
+
+def run(runner, main):
+    for size in runner.sizes((100000,), (10000,)):
+        pantry = make_pantry(size, expiring_every=4)
+        compare(runner, "pantry", size, serialization.dumps(pantry), records.PantryItem)
+        # The fixture's steps repeat, so real history deflates somewhat less than this.
+        names = [item["name"] for item in pantry[:200]]
+        recipes = [make_recipe(i, names) for i in range(size)]
+        compare(runner, "recipes", size, serialization.dumps(recipes), records.Recipe)
+
+    # What the compact form costs in CPU: built on every pantry read/write, undone for every response.
+    pantry = make_pantry(1000, expiring_every=4)
+    compact = [records.PantryItem.from_dict(item) for item in pantry]
+    params = {"items": len(pantry)}
+    runner.bench("memory.pantry_from_dict[1000]", lambda: [records.PantryItem.from_dict(item) for item in pantry],
+                 params=params)
+    runner.bench("memory.pantry_to_dict[1000]", lambda: [item.to_dict() for item in compact], params=params)
+    runner.bench("memory.pantry_dumps_dicts[1000]", lambda: serialization.dumps(pantry), params=params)
+    runner.bench("memory.pantry_dumps_records[1000]", lambda: serialization.dumps(compact), params=params)
+    recipe_set = {"recipes": [make_recipe(i, [item["name"] for item in pantry]) for i in range(3)]}
+    compact_recipes = [records.Recipe.from_dict(recipe) for recipe in recipe_set["recipes"]]
+    runner.bench("memory.recipe_from_dict", lambda: [records.Recipe.from_dict(r) for r in recipe_set["recipes"]],
+                 params={"recipes": 3})
+    runner.bench("memory.recipe_to_dict", lambda: [r.to_dict() for r in compact_recipes], params={"recipes": 3})
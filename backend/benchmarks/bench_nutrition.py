@@ -0,0 +1,52 @@
+"""Nutrition engine: table load, per-recipe macros (cold and cached) and the meal-plan optimizer."""
+
+import random
+
+import nutrition
+from benchmarks.fixtures import BASE_INGREDIENTS, make_recipe_set
+
+UNITS = (("g", 150), ("ml", 100), ("tbsp", 2), ("piece", 1), ("cup", 0.5))
+
+
+def make_recipes(count, rng):
+    names = [name for name, _, _ in BASE_INGREDIENTS]
+    recipes = []
+    for i in range(count):
+        used = rng.sample(names, 6)
+        recipes.append({
+            "title": f"Recipe {i}",
+            "servings": rng.choice((2, 4)),
+            "ingredientsUsed": used,
+            "missingIngredients": ["salt", "black pepper"],
+            "quantities": [{"item": name, "amount": amount * rng.choice((1, 2)), "unit": unit}
+                           for name, (unit, amount) in zip(used, (rng.choice(UNITS) for _ in used))],
+        })
+    return recipes
+
+
+def run(runner, main):
+    runner.bench("nutrition.load_table", nutrition.NutrientTable.load, params={"rows": len(nutrition.NutrientTable.load())},
+                 max_number=100)
+    table = nutrition.NutrientTable.load()
+    rng = random.Random(7)
+    recipes = make_recipes(100, rng)
+    recipe_set = make_recipe_set()
+
+    def cold():
+        engine = nutrition.NutritionEngine(table)
+        for recipe in recipes:
+            engine.per_serving(recipe)
+
+    runner.bench("nutrition.per_serving[cold,100]", cold, params={"recipes": 100})
+    cached = nutrition.NutritionEngine(table)
+    runner.bench("nutrition.per_serving[cached,100]", lambda: [cached.per_serving(recipe) for recipe in recipes],
+                 params={"recipes": 100})
+    runner.bench("nutrition.add_nutrition[strings]", lambda: main.add_nutrition(recipe_set),
+                 params={"recipes": len(recipe_set["recipes"])})
+
+    targets = {"calories": 2200, "protein": 140, "carbs": 250, "fat": 70}
+    vectors = [cached.per_serving(recipe) for recipe in recipes]
+    for candidates, slots in runner.sizes(((3, 3), (30, 3), (100, 4)), ((3, 3), (30, 3))):
+        runner.bench(f"nutrition.plan_day[{candidates}x{slots}]",
+                     lambda: nutrition.plan_day(vectors[:candidates], targets, slots),
+                     params={"candidates": candidates, "slots": slots})
@@ -0,0 +1,28 @@
+"""JSON parsing, validation and text salvage of LLM output, alone and through call_watsonx."""
+
+import json
+
+from benchmarks.fixtures import BASE_INGREDIENTS, FENCED_RESPONSE, PROSE_RESPONSE, VALID_RESPONSE, stub_watsonx
+
+RESPONSES = {"valid": VALID_RESPONSE, "fenced": FENCED_RESPONSE, "prose": PROSE_RESPONSE}
+
+
+def run(runner, main):
+    runner.bench("parse.json[valid]", lambda: main.parse_llm_json(VALID_RESPONSE),
+                 params={"bytes": len(VALID_RESPONSE)})
+    runner.bench("parse.salvage[prose]", lambda: main.parse_text_response(PROSE_RESPONSE),
+                 params={"bytes": len(PROSE_RESPONSE)})
+
+    pantry_names = [name for name, _, _ in BASE_INGREDIENTS]
+    valid = json.loads(VALID_RESPONSE)
+    params = main.home_parameters
+    runner.bench("parse.validate[valid]",
+                 lambda: main.validate_llm_output(valid, pantry_names, "home", params), params={"recipes": 3})
+
+    # Full post-processing path: routing, validation, salvage and fallback accounting.
+    prompt = "TASK: benchmark"
+    for kind, response in RESPONSES.items():
+        with stub_watsonx(main, response=response):
+            runner.bench(f"parse.call_watsonx[{kind}]",
+                         lambda: main.call_watsonx(prompt, mode="home", pantry_names=pantry_names),
+                         params={"response": kind})
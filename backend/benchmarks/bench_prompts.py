@@ -0,0 +1,13 @@
+"""Prompt construction for both cooking modes."""
+
+from benchmarks.fixtures import make_pantry
+
+OPTIONS = {"servings": 4, "dietary": "vegetarian", "cuisine": "indian", "skill_level": "beginner"}
+
+
+def run(runner, main):
+    for size in runner.sizes((10, 100, 1000), (10, 100)):
+        pantry = make_pantry(size)
+        for mode in ("home", "professional"):
+            runner.bench(f"prompt.build[{mode},{size}]", lambda: main.build_recipe_prompt(pantry, mode, OPTIONS),
+                         params={"mode": mode, "items": size})
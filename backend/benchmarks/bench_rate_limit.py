@@ -0,0 +1,40 @@
+"""Token-bucket checks and fair-scheduler slot handoff."""
+
+import threading
+
+import rate_limit
+
+
+def run(runner, main):
+    limit = rate_limit.Limit(per_minute=600000, burst=1000)
+    store = rate_limit.MemoryStore()
+    runner.bench("rate_limit.take[memory]", lambda: store.take("home:ip:127.0.0.1", limit))
+    limiter = rate_limit.RateLimiter(store, {"home": limit})
+    runner.bench("rate_limit.check[memory]", lambda: limiter.check("ip:127.0.0.1", "home"))
+
+    def many_clients():
+        for i in range(1000):
+            store.take(f"home:ip:10.0.{i // 256}.{i % 256}", limit)
+    runner.bench("rate_limit.take[1000 clients]", many_clients, max_number=100)
+
+    scheduler = rate_limit.FairScheduler(slots=8)
+
+    def uncontended():
+        with scheduler.slot("ip:127.0.0.1", cost=2500):
+            pass
+    runner.bench("rate_limit.slot[uncontended]", uncontended)
+
+    for clients in runner.sizes((4, 16), (4,)):
+        contended = rate_limit.FairScheduler(slots=1)
+
+        def handoff(clients=clients, scheduler=contended):
+            def worker(i):
+                for _ in range(25):
+                    with scheduler.slot(f"client-{i}", cost=1):
+                        pass
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        runner.bench(f"rate_limit.slot[contended,{clients}]", handoff, params={"clients": clients}, max_number=20)
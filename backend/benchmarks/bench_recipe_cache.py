@@ -0,0 +1,45 @@
+"""Similarity-cache lookups against recipe histories of increasing size."""
+
+import random
+
+import recipe_cache
+from benchmarks.fixtures import make_pantry, make_recipe_set
+
+
+def build_cache(size, pantry_names):
+    rng = random.Random(size)
+    cache = recipe_cache.RecipeCache(max_entries=size)
+    for i in range(size):
+        names = rng.sample(pantry_names, 12)
+        cache.add(make_recipe_set(i, names), "home", names)
+    return cache
+
+
+def run(runner, main):
+    pantry_names = [item["name"] for item in make_pantry(200)]
+    hit_pantry = pantry_names[:40]
+    miss_pantry = [f"unknown item {i}" for i in range(40)]
+    for size in runner.sizes((1000, 10000), (1000,)):
+        cache = build_cache(size, pantry_names)
+        cache.add(make_recipe_set(0, hit_pantry[:12]), "home", hit_pantry[:12])
+        params = {"entries": size}
+        runner.bench(f"recipe_cache.lookup_hit[{size}]", lambda: cache.lookup(hit_pantry, "home"), params=params)
+        runner.bench(f"recipe_cache.lookup_miss[{size}]", lambda: cache.lookup(miss_pantry, "home"), params=params)
+        runner.bench(f"recipe_cache.add[{size}]", lambda: cache.add(make_recipe_set(1, hit_pantry), "home", hit_pantry),
+                     params=params, max_number=1000)
+    # The largest pantry still looked up (bigger ones skip the cache), hashed afresh every time.
+    large_pantry = [item["name"] for item in make_pantry(recipe_cache.MAX_PANTRY)]
+    cache = build_cache(1000, pantry_names)
+
+    def lookup_large():
+        recipe_cache._signature.cache_clear()
+        return cache.lookup(large_pantry, "home")
+
+    runner.bench(f"recipe_cache.lookup_miss[pantry={len(large_pantry)}]", lookup_large,
+                 params={"entries": 1000, "pantry": len(large_pantry)}, max_number=20)
+    for size in runner.sizes((1000, 5000), (1000,)):
+        history = [{"mode": "home", "recipe": make_recipe_set(i), "timestamp": "2025-08-18T00:00:00"}
+                   for i in range(size)]
+        runner.bench(f"recipe_cache.load_history[{size}]",
+                     lambda: recipe_cache.RecipeCache(max_entries=size).load_history(history),
+                     params={"entries": size}, max_number=3)
@@ -0,0 +1,40 @@
+"""Recipe search queries against indexes of increasing size."""
+
+import os
+import shutil
+import tempfile
+import time
+
+import recipe_index
+from benchmarks.fixtures import make_history
+
+QUERIES = {
+    "newest": {},
+    "text": {"text": "skillet"},
+    "text_rare": {"text": "skillet 1234"},
+    "text_mode": {"text": "olive", "mode": "home", "sort": "newest"},
+    "ingredient_cook_time": {"ingredients": ["garlic"], "cook_time_max": 25},
+    "technique_calories": {"technique": "stir-fry", "ranges": {"calories": (300, 350)}},
+    "facets": {"facets": True},
+    "facets_filtered": {"text": "skillet", "facets": True},
+    "page_10": {"ranges": {"calories": (450, None)}, "page": 10},
+    "text_page_20": {"text": "skillet", "page": 20},  # past the relevance window
+}
+
+
+def run(runner, main):
+    workdir = tempfile.mkdtemp(prefix="pantry-search-")
+    try:
+        for size in runner.sizes((10000, 100000), (10000,)):
+            index = recipe_index.RecipeIndex(os.path.join(workdir, f"index-{size}.sqlite3"))
+            history = make_history(size // 3)  # three recipes per saved entry
+            # Building the index happens once per size, so it is a single sample.
+            start = time.perf_counter()
+            index.backfill_history(history)
+            if runner.wants(f"search.backfill[{size}]"):
+                runner.record(f"search.backfill[{size}]", [time.perf_counter() - start], params={"recipes": size})
+            for name, query in QUERIES.items():
+                runner.bench(f"search.{name}[{size}]", lambda: index.search(**query), params={"recipes": size})
+            index.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,38 @@
+"""JSON encode/decode (stdlib vs serialization backend) and response compression."""
+
+import json
+
+import compression
+import serialization
+from benchmarks.fixtures import isolated_storage, make_history, make_pantry
+
+
+def run(runner, main):
+    for size in runner.sizes((1000, 100000), (1000,)):
+        document = {"pantry": make_pantry(size)}
+        indented = json.dumps(document, indent=2).encode("utf-8")
+        params = {"items": size, "backend": serialization.BACKEND}
+        runner.bench(f"serialize.stdlib_dumps_indented[{size}]",
+                     lambda: json.dumps(document, indent=2, ensure_ascii=False), params=params)
+        runner.bench(f"serialize.dumps_indented[{size}]", lambda: serialization.dumps(document, pretty=True),
+                     params=params)
+        runner.bench(f"serialize.dumps_compact[{size}]", lambda: serialization.dumps(document), params=params)
+        runner.bench(f"serialize.stdlib_loads[{size}]", lambda: json.loads(indented), params=params)
+        runner.bench(f"serialize.loads[{size}]", lambda: serialization.loads(indented), params=params)
+
+    history = make_history(runner.sizes(1000, 100))
+    runner.bench(f"serialize.dumps_history[{len(history)}]", lambda: serialization.dumps(history),
+                 params={"entries": len(history), "backend": serialization.BACKEND})
+
+    client = main.app.test_client()
+    with isolated_storage(main, pantry=make_pantry(runner.sizes(500, 50))):
+        payload = client.post("/api/meal-plan", json={"cookingMode": "professional"}).get_data()
+        encodings = ["gzip"] + (["br"] if compression.brotli else [])
+        for encoding in encodings:
+            compressed = compression.compress(payload, encoding)
+            runner.bench(f"compress.{encoding}[meal_plan]", lambda: compression.compress(payload, encoding),
+                         params={"bytes": len(payload), "compressed_bytes": len(compressed)})
+        for encoding in ["identity"] + encodings:
+            runner.bench(f"endpoint.pantry[{encoding}]",
+                         lambda: client.get("/api/pantry", headers={"Accept-Encoding": encoding}),
+                         params={"encoding": encoding})
@@ -0,0 +1,79 @@
+"""Cold-start cost of ``import main`` and the import-time budget check.
+
+As a script this is the budget check used in CI and before deploys:
+
+    python -m benchmarks.bench_startup --budget 1.0
+
+It fails when importing main takes longer than the budget (median of several
+fresh interpreters) or when the import pulls in a module that must stay lazy.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.harness import BACKEND_DIR
+
+# Modules that must only be imported on the first LLM call or by the warm-up thread.
+LAZY_MODULES = ("ibm_watsonx_ai",)
+DEFAULT_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "1.0"))
+
+_PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import main\n"
+    "elapsed = time.perf_counter() - start\n"
+    "lazy = [m for m in {lazy!r} if m in sys.modules]\n"
+    "print(elapsed, ','.join(lazy))\n"
+)
+
+
+def measure_import(with_credentials=True):
+    """Import main in a fresh interpreter; returns (seconds, eagerly imported lazy modules)."""
+    env = dict(os.environ)
+    if with_credentials:
+        # Credentials present is the worst case: nothing may be initialized eagerly.
+        env.setdefault("WATSONX_API_KEY", "import-budget-probe")
+        env.setdefault("WATSONX_PROJECT_ID", "import-budget-probe")
+    env["WATSONX_WARMUP"] = "false"
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(lazy=LAZY_MODULES)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    elapsed, _, lazy = output.partition(" ")
+    return float(elapsed), [m for m in lazy.split(",") if m]
+
+
+def run(runner, main):
+    if not runner.wants("startup.import_main"):
+        return
+    samples = [measure_import()[0] for _ in range(runner.repeat)]
+    runner.record("startup.import_main", samples, params={"budget": DEFAULT_BUDGET})
+
+
+def check(budget, repeat=5):
+    samples, eager = [], set()
+    for _ in range(repeat):
+        elapsed, lazy = measure_import()
+        samples.append(elapsed)
+        eager.update(lazy)
+    median = statistics.median(samples)
+    print(f"import main: median {median * 1e3:.1f} ms over {repeat} runs (budget {budget * 1e3:.0f} ms)")
+    failures = []
+    if median > budget:
+        failures.append(f"import time {median:.3f}s exceeds budget {budget:.3f}s")
+    if eager:
+        failures.append(f"modules imported eagerly: {', '.join(sorted(eager))}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time budget check for backend/main.py")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="seconds (default 1.0)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    sys.exit(check(args.budget, args.repeat))
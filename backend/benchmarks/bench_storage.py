@@ -0,0 +1,33 @@
+"""load_pantry / save_pantry at growing pantry sizes and save_recipe with growing history."""
+
+from benchmarks.fixtures import isolated_storage, make_history, make_pantry, make_recipe_set
+
+
+def run(runner, main):
+    for size in runner.sizes((10, 1000, 100000), (10, 1000)):
+        pantry = make_pantry(size)
+        with isolated_storage(main, pantry=pantry):
+            runner.bench(f"storage.load_pantry[{size}]", main.load_pantry, params={"items": size})
+            runner.bench(f"storage.save_pantry[{size}]", lambda: main.save_pantry(pantry),
+                         params={"items": size})
+
+    recipe = make_recipe_set()
+    for size in runner.sizes((0, 100, 1000, 5000), (0, 100)):
+        history = make_history(size)
+        with isolated_storage(main, history=history):
+            def reset_history():
+                main.recipe_log.flush()
+                with main.recipe_log.lock.hold():
+                    main.storage.atomic_write_json(main.RECIPES_FILE, history)
+
+            # Each timed call appends one entry, so history grows by at most max_number per sample.
+            runner.bench(f"storage.save_recipe[history={size}]", lambda: main.save_recipe(recipe, "home"),
+                         setup=reset_history, params={"history": size}, max_number=64)
+
+            def save_and_flush():
+                main.save_recipe(recipe, "home")
+                main.recipe_log.flush()
+
+            # Worst case for the background writer: one flush per saved recipe.
+            runner.bench(f"storage.save_recipe_flushed[history={size}]", save_and_flush,
+                         setup=reset_history, params={"history": size}, max_number=64)
@@ -0,0 +1,98 @@
+"""Per-tenant pantries: request latency as the number of tenants grows, and checks that tenants are isolated."""
+
+import random
+import threading
+import time
+
+from benchmarks.fixtures import isolated_storage, make_pantry
+
+PANTRY_ITEMS = 20
+
+
+def create_tenants(main, count):
+    tenants = [f"household-{i}" for i in range(count)]
+    pantry = make_pantry(PANTRY_ITEMS)
+    for tenant in tenants:
+        store = main.pantry_stores.get(tenant)
+        main.storage.atomic_write_json(store.path, {"pantry": pantry})
+    return tenants
+
+
+def run(runner, main):
+    client = main.app.test_client()
+    for count in runner.sizes((1, 100, 10000), (1, 1000)):
+        with isolated_storage(main):
+            tenants = create_tenants(main, count)
+            for tenant in tenants:  # steady state: every household has been seen once
+                main.pantry_stores.get(tenant).load()
+            rng = random.Random(count)
+            params = {"tenants": count, "items": PANTRY_ITEMS, "max_open": main.pantry_stores.max_open}
+
+            def headers():
+                return {"X-Tenant-ID": rng.choice(tenants)}
+
+            runner.bench(f"tenants.get_pantry[{count}]", lambda: client.get("/api/pantry", headers=headers()),
+                         params=params, max_number=1000)
+            runner.bench(f"tenants.add_item[{count}]",
+                         lambda: client.post("/api/pantry", json={"name": "basil", "quantity": 1}, headers=headers()),
+                         params=params, max_number=200)
+            runner.bench(f"tenants.meal_plan[{count}]",
+                         lambda: client.post("/api/meal-plan", json={}, headers=headers()),
+                         params=params, max_number=1000)
+
+    check_write_isolation(runner, main)
+    check_search_isolation(runner, main)
+
+
+def check_write_isolation(runner, main, timeout=5.0):
+    """A write to tenant B completes while tenant A's file lock is held; raises if it blocks."""
+    name = "tenants.write_while_other_locked"
+    if not runner.wants(name):
+        return
+    samples = []
+    for _ in range(runner.repeat):
+        with isolated_storage(main):
+            locked, other = create_tenants(main, 2)
+            elapsed = []
+
+            def write():
+                start = time.perf_counter()
+                response = main.app.test_client().post("/api/pantry", json={"name": "basil", "quantity": 1},
+                                                       headers={"X-Tenant-ID": other})
+                assert response.status_code == 200, response.get_json()
+                elapsed.append(time.perf_counter() - start)
+
+            with main.pantry_stores.get(locked).lock.hold():
+                thread = threading.Thread(target=write)
+                thread.start()
+                thread.join(timeout)
+                if thread.is_alive() or not elapsed:
+                    raise AssertionError(f"a write to {other} did not complete while {locked} was locked")
+            samples.append(elapsed[0])
+    runner.record(name, samples, params={"items": PANTRY_ITEMS})
+
+
+def check_search_isolation(runner, main):
+    """Recipe search only returns the requesting tenant's recipes; raises otherwise."""
+    name = "tenants.search_isolated"
+    if not runner.wants(name):
+        return
+    client = main.app.test_client()
+    with isolated_storage(main):
+        owner, stranger = create_tenants(main, 2)
+        recipe = {"recipes": [{"title": "Saffron Household Skillet", "technique": "sear",
+                               "ingredientsUsed": ["rice"], "steps": ["Sear the rice."]}]}
+        with main.tenant_context(owner):
+            main.save_recipe(recipe, "home")
+
+        def search(tenant, **args):
+            query = {"q": "saffron skillet", "facets": "true", **args}
+            return client.get("/api/recipes/search", query_string=query, headers={"X-Tenant-ID": tenant}).get_json()
+
+        for args in ({}, {"q": "", "sort": "newest"}):
+            mine, theirs = search(owner, **args), search(stranger, **args)
+            if [r["recipe"]["title"] for r in mine["results"]] != ["Saffron Household Skillet"]:
+                raise AssertionError(f"{owner} cannot find its own recipe: {mine}")
+            if theirs["results"] or theirs["total"] or any(theirs["facets"].values()):
+                raise AssertionError(f"{stranger} can see {owner}'s recipes: {theirs}")
+        runner.bench(name, lambda: search(stranger), params={"tenants": 2}, max_number=1000)
@@ -0,0 +1,54 @@
+"""Compare two benchmark result files and report regressions."""
+
+import argparse
+import sys
+
+from benchmarks.harness import format_value, load
+
+
+def compare(baseline, current, threshold=0.10):
+    """Return rows of (name, old, new, change, status); change > 0 means slower/worse."""
+    old_results = {result["name"]: result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        old = old_results.get(result["name"])
+        if old is None or not old["value"]:
+            rows.append((result["name"], None, result, None, "new"))
+            continue
+        ratio = result["value"] / old["value"]
+        change = (1 / ratio - 1) if result["higher_is_better"] else (ratio - 1)
+        if change > threshold:
+            status = "REGRESSION"
+        elif change < -threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((result["name"], old, result, change, status))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change that counts as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    baseline, current = load(args.baseline), load(args.current)
+    print(f"\nbaseline {baseline['commit']} -> current {current['commit']}")
+    regressions = 0
+    for name, old, new, change, status in compare(baseline, current, args.threshold):
+        old_text = format_value(old["value"], old["unit"]) if old else "-"
+        new_text = format_value(new["value"], new["unit"])
+        change_text = f"{change:+.1%}" if change is not None else ""
+        print(f"  {name:<48} {old_text:>14} {new_text:>14} {change_text:>8}  {status}")
+        regressions += status == "REGRESSION"
+    if regressions:
+        print(f"\n{regressions} regression(s) above {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
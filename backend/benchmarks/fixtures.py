@@ -0,0 +1,198 @@
+"""Synthetic pantries, LLM outputs and stubbed or replayed Watsonx for the benchmarks."""
+
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import fake_llm
+import llm_replay
+
+BASE_INGREDIENTS = [
+    ("rice", "kg", "grains"), ("chicken breast", "g", "meat"), ("onion", "pieces", "vegetables"),
+    ("garlic", "cloves", "vegetables"), ("tomato", "pieces", "vegetables"), ("olive oil", "ml", "oils"),
+    ("cumin", "g", "spices"), ("eggs", "pieces", "dairy"), ("milk", "ml", "dairy"),
+    ("spinach", "g", "vegetables"), ("lentils", "g", "grains"), ("butter", "g", "dairy"),
+    ("potato", "pieces", "vegetables"), ("carrot", "pieces", "vegetables"), ("ginger", "g", "spices"),
+    ("pasta", "g", "grains"), ("cheddar", "g", "dairy"), ("lemon", "pieces", "fruit"),
+]
+
+
+def make_pantry(size, expiring_every=0):
+    """Pantry items shaped like the ones main.add_pantry_item stores.
+
+    With ``expiring_every=n`` every n-th item gets an ``expiresAt`` spread over
+    the 60 days around today, so some are expired and some expire soon.
+    """
+    created = datetime(2025, 8, 18, 21, 45, 21)
+    today = datetime.now().date()
+    items = []
+    for i in range(size):
+        name, unit, category = BASE_INGREDIENTS[i % len(BASE_INGREDIENTS)]
+        if i >= len(BASE_INGREDIENTS):
+            name = f"{name} {i // len(BASE_INGREDIENTS)}"
+        stamp = (created + timedelta(seconds=i)).isoformat()
+        items.append({
+            "id": str(1755533721096 + i),
+            "name": name,
+            "quantity": float(1 + i % 5),
+            "unit": unit,
+            "category": category,
+            "notes": "",
+            "createdAt": stamp,
+            "updatedAt": stamp,
+        })
+        if expiring_every and i % expiring_every == 0:
+            items[-1]["expiresAt"] = (today + timedelta(days=(i * 7) % 60 - 20)).isoformat()
+    return items
+
+
+def make_recipe(index, pantry_names):
+    used = [pantry_names[(index + k) % len(pantry_names)] for k in range(4)]
+    return {
+        "title": f"Benchmark Skillet {index}",
+        "description": "A quick and delicious one-pan meal perfect for weeknight dinners",
+        "cookTime": "20-25 minutes",
+        "servings": 2,
+        "ingredientsUsed": used,
+        "missingIngredients": ["salt", "black pepper"],
+        "nutrition": {"calories": 300 + index % 200, "protein": "20g", "carbs": "30g", "fat": "15g"},
+        "steps": [f"Step {n}: heat 2 tbsp olive oil over medium heat for 3-4 minutes" for n in range(1, 9)],
+        "technique": ("one-pan cooking", "sheet-pan", "one-pot", "stir-fry")[index % 4],
+    }
+
+
+def make_recipe_set(index=0, pantry_names=None, count=3):
+    names = pantry_names or [name for name, _, _ in BASE_INGREDIENTS]
+    return {
+        "recipes": [make_recipe(index * count + k, names) for k in range(count)],
+        "shoppingList": [{"item": "salt", "quantity": 1, "unit": "container"},
+                         {"item": "black pepper", "quantity": 1, "unit": "container"}],
+    }
+
+
+def make_history(size):
+    """recipes.json entries as main.save_recipe writes them."""
+    return [
+        {"mode": "home", "recipe": make_recipe_set(i), "timestamp": datetime(2025, 8, 18).isoformat()}
+        for i in range(size)
+    ]
+
+
+VALID_RESPONSE = json.dumps(make_recipe_set(), indent=2)
+FENCED_RESPONSE = f"Here are your recipes:\n```json\n{VALID_RESPONSE}\n```\nEnjoy!"
+PROSE_RESPONSE = "\n".join(
+    ["# Garlic Rice Skillet"] + [f"{n}. Heat 2 tbsp olive oil in a 12-inch skillet for 3 minutes" for n in range(1, 13)]
+)
+
+
+@contextmanager
+def isolated_storage(main, pantry=None, history=None):
+    """Point main's pantry and recipe stores at a temp directory for the duration of a benchmark.
+
+    The similarity cache is swapped for an empty one that loads ``history``, so the real recipe
+    history never answers a benchmark's generate requests.
+    """
+    workdir = tempfile.mkdtemp(prefix="pantry-bench-")
+    saved = (main.PANTRY_FILE, main.RECIPES_FILE, main.pantry_stores, main.recipe_log, main.recipe_search,
+             main.similar_recipes)
+    main.PANTRY_FILE = os.path.join(workdir, "db.json")
+    main.RECIPES_FILE = os.path.join(workdir, "recipes.json")
+    with open(main.PANTRY_FILE, "w", encoding="utf-8") as f:
+        json.dump({"pantry": pantry or []}, f, indent=2, ensure_ascii=False)
+    if history is not None:
+        with open(main.RECIPES_FILE, "w", encoding="utf-8") as f:
+            json.dump(history, f, indent=2, ensure_ascii=False)
+    main.pantry_stores = main.storage.TenantPantries(os.path.join(workdir, "pantries"), default_path=main.PANTRY_FILE,
+                                                     default_tenant=main.DEFAULT_TENANT, max_open=saved[2].max_open)
+    main.recipe_log = main.storage.RecipeLog(main.RECIPES_FILE, flush_interval=saved[3].flush_interval)
+    main.recipe_search = main.recipe_index.RecipeIndex(os.path.join(workdir, "recipe_index.sqlite3"))
+    cache = saved[5]
+    main.similar_recipes = main.recipe_cache.RecipeCache(min_coverage=cache.min_coverage, max_entries=cache.max_entries,
+                                                         compact=cache.compact, max_pantry=cache.max_pantry)
+    try:
+        yield workdir
+    finally:
+        main.recipe_log.flush()
+        main.recipe_search.close()
+        (main.PANTRY_FILE, main.RECIPES_FILE, main.pantry_stores, main.recipe_log, main.recipe_search,
+         main.similar_recipes) = saved
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@contextmanager
+def llm_backend(main, backend):
+    """Route main's LLM calls to ``backend(model_id, prompt, params)``."""
+    saved = main.credentials, main.model_router.backend
+    main.credentials = object()
+    main.model_router.backend = backend
+    try:
+        yield backend
+    finally:
+        main.credentials, main.model_router.backend = saved
+
+
+def stub_watsonx(main, latency=0.0, response=VALID_RESPONSE):
+    """Replace the Watsonx backend with a canned answer after ``latency`` seconds."""
+
+    def backend(model_id, prompt, params):
+        if latency:
+            time.sleep(latency)
+        return response
+
+    return llm_backend(main, backend)
+
+
+def make_cassette(path, size=20, model_id="meta-llama/llama-3-70b-instruct", latency=1.5):
+    """A cassette of synthetic exchanges, for offline runs without a real recording.
+
+    Mostly valid recipe sets, with fenced and prose answers mixed in so the salvage
+    path runs too; recorded latencies are lognormal around ``latency`` seconds.
+    """
+    cassette = llm_replay.Cassette(path)
+    rng = random.Random(size)
+    for i in range(size):
+        if i % 10 == 8:
+            response = FENCED_RESPONSE
+        elif i % 10 == 9:
+            response = PROSE_RESPONSE
+        else:
+            response = json.dumps(make_recipe_set(i), indent=2)
+        cassette.append(model_id, f"synthetic prompt {i}", {"max_new_tokens": 2500}, response,
+                        rng.lognormvariate(math.log(latency), 0.4))
+    return cassette
+
+
+def offline_watsonx(main, cassette=None, latency=0.0):
+    """``stub_watsonx``, or with a cassette path an in-process replay of it at the same fixed latency."""
+    if cassette is None:
+        return stub_watsonx(main, latency=latency)
+    return llm_backend(main, llm_replay.ReplayBackend(llm_replay.Cassette(cassette), llm_replay.Latency(latency)))
+
+
+@contextmanager
+def fake_llm_server(cassette, **options):
+    """A fake_llm server for ``cassette`` on a free local port, serving from a daemon thread."""
+    server = fake_llm.FakeModelServer(("127.0.0.1", 0), cassette, **options)
+    server.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextmanager
+def without_rate_limits(main):
+    """Lift the per-client rate limits so benchmarks can call generation endpoints back to back."""
+    saved = main.rate_limiter
+    main.rate_limiter = main.rate_limit.RateLimiter(main.rate_limit.MemoryStore(), {})
+    try:
+        yield
+    finally:
+        main.rate_limiter = saved
@@ -0,0 +1,124 @@
+"""Timing harness and JSON result format shared by the benchmark modules."""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+FORMAT_VERSION = 1
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Runner:
+    """Collects benchmark results; ``quick`` shrinks sizes and repeats for smoke runs."""
+
+    def __init__(self, quick=False, repeat=5, min_sample_time=0.05, name_filter=None, cassette=None):
+        self.quick = quick
+        self.repeat = 3 if quick else repeat
+        self.min_sample_time = 0.01 if quick else min_sample_time
+        self.name_filter = name_filter
+        self.cassette = cassette  # recorded LLM exchanges to replay instead of the canned answer
+        self.results = []
+
+    def sizes(self, full, quick):
+        return quick if self.quick else full
+
+    def wants(self, name):
+        return not self.name_filter or any(f in name for f in self.name_filter)
+
+    def bench(self, name, func, setup=None, params=None, max_number=10000):
+        """Time ``func()`` (after an untimed ``setup()`` per sample) and record seconds per call."""
+        if not self.wants(name):
+            return None
+        if setup:
+            setup()
+        # Calibrate the number of calls per sample so each sample is long enough to time.
+        number = 1
+        while number < max_number:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - start >= self.min_sample_time:
+                break
+            number *= 2
+        samples = []
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter() - start) / number)
+        return self.record(name, samples, params=params, unit="s", higher_is_better=False,
+                           extra={"number": number})
+
+    def record(self, name, samples, params=None, unit="s", higher_is_better=False, extra=None):
+        median = statistics.median(samples)
+        result = {
+            "name": name,
+            "params": params or {},
+            "unit": unit,
+            "higher_is_better": higher_is_better,
+            "value": median,
+            "min": min(samples),
+            "max": max(samples),
+            "mean": statistics.fmean(samples),
+            "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            "samples": samples,
+        }
+        if extra:
+            result.update(extra)
+        self.results.append(result)
+        print(f"  {name:<48} {format_value(median, unit):>14}  (min {format_value(min(samples), unit)})")
+        return result
+
+    def document(self):
+        return {
+            "format": FORMAT_VERSION,
+            "commit": git_commit(),
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": self.quick,
+            "results": self.results,
+        }
+
+    def save(self, path=None):
+        document = self.document()
+        if path is None:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            path = os.path.join(RESULTS_DIR, f"{document['commit']}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        return path
+
+
+def format_value(value, unit):
+    if unit != "s":
+        return f"{value:,.1f} {unit}"
+    if value >= 1:
+        return f"{value:.3f} s"
+    if value >= 1e-3:
+        return f"{value * 1e3:.3f} ms"
+    return f"{value * 1e6:.2f} us"
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
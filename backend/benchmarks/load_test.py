@@ -0,0 +1,237 @@
+"""
+Load test: how throughput scales with the gunicorn worker count.
+
+Starts ``gunicorn -c gunicorn.conf.py wsgi:app`` once per worker count against a
+seeded temporary pantry, drives it with concurrent keep-alive HTTP clients for a
+fixed duration and reports requests/s and latency percentiles:
+
+    python -m benchmarks.load_test --workers 1 2 4 8 --clients 32 --duration 15
+
+The request mix covers pantry reads, pantry writes, meal plans and recipe
+generation. Without Watsonx credentials generation serves the fallback recipes,
+so the numbers measure the service itself rather than the model. With
+``--fake-llm`` the workers call a local fake_llm.py server instead, replaying
+``--cassette`` (or synthetic answers) with the given latency, token rate and
+error rate, so the whole generation path is loaded without any network:
+
+    python -m benchmarks.load_test --workers 2 --fake-llm --llm-latency lognormal:1.5,0.4 --llm-error-rate 0.02
+
+The similar-recipe cache is off in that mode so every generation reaches the
+model. Results are written to benchmarks/results/load-<commit>.json.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fixtures import make_cassette, make_pantry  # noqa: E402
+from benchmarks.harness import RESULTS_DIR, git_commit  # noqa: E402
+
+# (weight, method, path, body)
+REQUEST_MIX = [
+    (50, "GET", "/api/pantry", None),
+    (20, "POST", "/api/meal-plan", {"cookingMode": "home"}),
+    (15, "POST", "/api/generate_recipe", {"mode": "home"}),
+    (10, "POST", "/api/pantry", {"name": "load test item", "quantity": 1, "unit": "pieces"}),
+    (5, "GET", "/api/health", None),
+]
+
+
+def wait_until_ready(process, port, log_path, name):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+                raise RuntimeError(f"{name} exited: {f.read()[-2000:]}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/health" if name == "gunicorn" else "/health")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{name} did not become ready within 30s")
+
+
+def start_fake_llm(args, port, workdir):
+    """Run fake_llm.py in its own process, so it never competes with the clients for the GIL."""
+    cassette = args.cassette
+    if cassette is None:
+        cassette = os.path.join(workdir, "cassette.jsonl")
+        make_cassette(cassette, 50)
+    command = [sys.executable, "fake_llm.py", "--cassette", os.path.abspath(cassette), "--port", str(port),
+               "--latency", args.llm_latency, "--tokens-per-second", str(args.llm_tokens_per_second),
+               "--error-rate", str(args.llm_error_rate), "--seed", "1"]
+    log_path = os.path.join(workdir, "fake-llm.log")
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(command, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=log)
+    return wait_until_ready(process, port, log_path, "fake_llm")
+
+
+def start_server(workers, port, workdir, threads, llm_env=None):
+    env = dict(os.environ)
+    env.update({
+        "PANTRY_FILE": os.path.join(workdir, "db.json"),
+        "RECIPES_FILE": os.path.join(workdir, "recipes.json"),
+        "PANTRY_DIR": os.path.join(workdir, "pantries"),
+        "RECIPE_INDEX_FILE": os.path.join(workdir, "recipe_index.sqlite3"),
+        "PREGEN_DIR": os.path.join(workdir, "pregen"),
+        "PROFILE_DIR": os.path.join(workdir, "profiles"),
+        "WEB_CONCURRENCY": str(workers),
+        "WORKER_THREADS": str(threads),
+        "BIND": f"127.0.0.1:{port}",
+        "ACCESS_LOG": "",
+        "LOG_LEVEL": "warning",
+        "RATE_LIMIT_ENABLED": "false",  # all clients share one address here
+    })
+    env.update(llm_env or {})
+    # Server logs go to a file: a pipe nobody drains would eventually block the workers.
+    log_path = os.path.join(workdir, "server.log")
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=log,
+        )
+    return wait_until_ready(process, port, log_path, "gunicorn")
+
+
+def stop_server(process):
+    # SIGTERM triggers gunicorn's graceful shutdown, which flushes pending writes.
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def client_loop(port, stop_at, latencies, errors, seed):
+    rng = random.Random(seed)
+    weights = [weight for weight, *_ in REQUEST_MIX]
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    while time.monotonic() < stop_at:
+        _, method, path, body = rng.choices(REQUEST_MIX, weights)[0]
+        payload = json.dumps(body) if body is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException):
+            errors.append("connection")
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def run_level(workers, clients, duration, port, pantry_size, threads, llm_env=None):
+    workdir = tempfile.mkdtemp(prefix="pantry-load-")
+    with open(os.path.join(workdir, "db.json"), "w", encoding="utf-8") as f:
+        json.dump({"pantry": make_pantry(pantry_size)}, f, indent=2)
+    process = start_server(workers, port, workdir, threads, llm_env)
+    try:
+        latencies, errors = [], []
+        stop_at = time.monotonic() + duration
+        pool = [threading.Thread(target=client_loop, args=(port, stop_at, latencies, errors, i))
+                for i in range(clients)]
+        start = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        stop_server(process)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies.sort()
+    return {
+        "workers": workers,
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) if latencies else None,
+        "p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        "p99": latencies[int(0.99 * (len(latencies) - 1))] if latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput vs gunicorn worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=4, help="threads per worker")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent client connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per worker count")
+    parser.add_argument("--pantry-size", type=int, default=200)
+    parser.add_argument("--port", type=int, default=5077)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load-<commit>.json)")
+    parser.add_argument("--fake-llm", action="store_true", help="generate through a local fake_llm.py server")
+    parser.add_argument("--cassette", help="recorded exchanges for --fake-llm (default: synthetic answers)")
+    parser.add_argument("--llm-latency", default="lognormal:1.5,0.4", help="fake model time to first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-stream", action="store_true", help="use the fake model's streaming endpoint")
+    args = parser.parse_args(argv)
+
+    llm_env, fake_llm, llm_workdir = None, None, None
+    if args.fake_llm:
+        llm_port = args.port + 1
+        llm_workdir = tempfile.mkdtemp(prefix="pantry-llm-")
+        fake_llm = start_fake_llm(args, llm_port, llm_workdir)
+        llm_env = {"LLM_BACKEND": "fake", "LLM_FAKE_URL": f"http://127.0.0.1:{llm_port}",
+                   "LLM_FAKE_STREAM": str(args.llm_stream).lower(), "RECIPE_CACHE_ENABLED": "false"}
+
+    levels = []
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    try:
+        for workers in args.workers:
+            level = run_level(workers, args.clients, args.duration, args.port, args.pantry_size, args.threads,
+                              llm_env)
+            levels.append(level)
+            print(f"{workers:>7} {level['throughput']:>9.1f} {level['p50'] * 1e3:>8.2f} "
+                  f"{level['p95'] * 1e3:>8.2f} {level['p99'] * 1e3:>8.2f} {level['errors']:>7}")
+    finally:
+        if fake_llm is not None:
+            fake_llm.terminate()
+            fake_llm.wait(timeout=10)
+            shutil.rmtree(llm_workdir, ignore_errors=True)
+
+    document = {"commit": git_commit(), "cpus": os.cpu_count(), "duration": args.duration,
+                "threads": args.threads, "pantry_size": args.pantry_size, "levels": levels}
+    if args.fake_llm:
+        document["fake_llm"] = {"cassette": args.cassette, "latency": args.llm_latency, "stream": args.llm_stream,
+                                "tokens_per_second": args.llm_tokens_per_second,
+                                "error_rate": args.llm_error_rate}
+    path = args.output
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"load-{document['commit']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    print(f"\nSaved to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
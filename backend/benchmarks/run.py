@@ -0,0 +1,51 @@
+"""Run the benchmark suite and store the results as JSON."""
+
+import argparse
+import importlib
+import logging
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks import compare  # noqa: E402
+from benchmarks.harness import Runner  # noqa: E402
+
+GROUPS = ["startup", "storage", "serialization", "prompts", "parsing", "recipe_cache", "search", "rate_limit", "expiry", "tenants", "nutrition", "memory", "llm", "endpoints"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-k", dest="filters", action="append",
+                        help="only run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--group", action="append", choices=GROUPS, help="only run these groups")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes and fewer repeats")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per benchmark")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against an earlier result file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression threshold for --compare")
+    parser.add_argument("--cassette", help="replay these recorded LLM exchanges (LLM_BACKEND=record) "
+                                           "instead of the canned Watsonx answer")
+    args = parser.parse_args(argv)
+
+    cassette = os.path.abspath(args.cassette) if args.cassette else None
+    logging.disable(logging.WARNING)
+    os.chdir(BACKEND_DIR)
+    import main as backend  # noqa: E402 - imported after chdir so relative data paths resolve
+
+    runner = Runner(quick=args.quick, repeat=args.repeat, name_filter=args.filters, cassette=cassette)
+    for group in args.group or GROUPS:
+        print(f"[{group}]")
+        importlib.import_module(f"benchmarks.bench_{group}").run(runner, backend)
+
+    path = runner.save(args.output)
+    print(f"\nSaved {len(runner.results)} results to {path}")
+    if args.compare:
+        return compare.main([args.compare, path, "--threshold", str(args.threshold)])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Response compression with Accept-Encoding negotiation.
+
+Compresses JSON and text responses larger than ``COMPRESSION_MIN_SIZE`` bytes
+with brotli (when the ``brotli`` package is installed and the client accepts
+it) or gzip. Small bodies are sent as-is: below roughly a kilobyte the
+compression headers and CPU time cost more than the bytes saved.
+"""
+
+import gzip
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain", "text/html", "text/css", "application/javascript"}
+
+
+def _accepted_encodings(header):
+    """Parse an Accept-Encoding header into {encoding: q}."""
+    accepted = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token] = q
+    return accepted
+
+
+def choose_encoding(header):
+    """Pick 'br', 'gzip' or None for an Accept-Encoding header value."""
+    if not header:
+        return None
+    accepted = _accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if brotli else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for encoding in candidates:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def init_app(app, min_size=COMPRESSION_MIN_SIZE):
+    """Register an after_request hook that compresses eligible responses."""
+
+    @app.after_request
+    def _compress_response(response):
+        response.vary.add("Accept-Encoding")
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or "Content-Encoding" in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    return app
@@ -0,0 +1,172 @@
+"""
+Pantry expiry tracking.
+
+Items may carry an optional ``expiresAt`` (ISO date or datetime; a bare date
+means the item is good through the end of that day). ``ExpiryIndex`` keeps
+the items that have one sorted by expiry time, so "expiring within N days" and
+"already expired" are a binary search plus a slice of the result instead of a
+pass over the whole pantry. ``ExpiryTracker`` caches one index per tenant,
+tagged with the pantry version (``PantryStore.version()``) it was built from,
+so an index is rebuilt once per pantry write rather than once per request and
+a superseded pantry is never kept alive by its index.
+
+``Sweeper`` runs a function periodically in a daemon thread; main.py uses it to
+flag items as spoiled once their expiry has passed.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from recipe_cache import normalize_ingredient
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 86400.0
+
+
+def parse_expiry(value):
+    """Normalize an ``expiresAt`` value to an ISO string, or None when empty; raises ValueError."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"expected an ISO date, got {value!r}")
+    value = value.strip()
+    if len(value) == 10:
+        return date.fromisoformat(value).isoformat()
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).isoformat()
+
+
+def expiry_timestamp(value):
+    """Epoch seconds at which an ``expiresAt`` value expires, or None if it is missing or invalid."""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        if len(value) == 10:
+            end_of_day = datetime.combine(date.fromisoformat(value), datetime.min.time()) + timedelta(days=1)
+            return end_of_day.timestamp()
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class ExpiryIndex:
+    """The items of one pantry snapshot that have an expiry, in expiry order."""
+
+    def __init__(self, items):
+        entries = []
+        for position, item in enumerate(items):
+            expires = expiry_timestamp(item.get("expiresAt"))
+            if expires is not None:
+                entries.append((expires, position))
+        entries.sort()
+        self._times = [expires for expires, _ in entries]
+        self._items = [items[position] for _, position in entries]
+
+    def __len__(self):
+        return len(self._times)
+
+    def expiring_between(self, start, end):
+        """(expiry time, item) pairs with ``start < expiry <= end``, soonest first."""
+        lo = 0 if start is None else bisect.bisect_right(self._times, start)
+        hi = bisect.bisect_right(self._times, end)
+        return list(zip(self._times[lo:hi], self._items[lo:hi]))
+
+    def expired(self, now=None, since=None):
+        """Items whose expiry is at or before ``now`` (and after ``since``, if given)."""
+        now = time.time() if now is None else now
+        return [item for _, item in self.expiring_between(since, now)]
+
+    def expiring_within(self, days, now=None):
+        """(item, days left) for items that are not yet expired but will be within ``days`` days."""
+        now = time.time() if now is None else now
+        return [(item, (expires - now) / DAY_SECONDS)
+                for expires, item in self.expiring_between(now, now + days * DAY_SECONDS)]
+
+    def expired_ids(self, now=None):
+        return {item.get("id") for item in self.expired(now)}
+
+
+class ExpiryTracker:
+    """One ``ExpiryIndex`` per tenant, replaced when that tenant's pantry version changes."""
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()  # tenant -> (version, index)
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def index(self, pantry, tenant=None, version=None):
+        """The index of ``pantry``, which must be ``tenant``'s pantry at ``version``; uncached without them."""
+        if tenant is None or version is None:
+            return ExpiryIndex(pantry)
+        with self._lock:
+            cached = self._indexes.get(tenant)
+            if cached is not None and cached[0] == version:
+                self._indexes.move_to_end(tenant)
+                return cached[1]
+        index = ExpiryIndex(pantry)
+        with self._lock:
+            self._indexes[tenant] = (version, index)
+            self._indexes.move_to_end(tenant)
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index
+
+
+def urgency_weights(expiring):
+    """Weight per normalized ingredient name: 1 for items expiring now, falling off with days left."""
+    weights = {}
+    for item, days_left in expiring:
+        name = normalize_ingredient(item.get("name", ""))
+        if name:
+            weights[name] = max(weights.get(name, 0.0), 1.0 / (1.0 + max(days_left, 0.0)))
+    return weights
+
+
+def rank_recipes(recipes, weights):
+    """Recipes ordered by how much of the expiring produce they use (stable for ties)."""
+    if not weights:
+        return recipes
+
+    def score(recipe):
+        used = recipe.get("ingredientsUsed") if isinstance(recipe, dict) else None
+        if not isinstance(used, list):
+            return 0.0
+        return sum(weights.get(normalize_ingredient(name), 0.0) for name in used if isinstance(name, str))
+
+    return sorted(recipes, key=score, reverse=True)
+
+
+class Sweeper:
+    """Calls ``sweep()`` every ``interval`` seconds in a daemon thread, started on demand."""
+
+    def __init__(self, sweep, interval, name="pantry-expiry-sweep"):
+        self.sweep = sweep
+        self.interval = interval
+        self.name = name
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the thread unless it is running; call after forking, never before."""
+        if self.interval <= 0:
+            return None
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run_loop, name=self.name, daemon=True)
+                self._thread.start()
+        return self._thread
+
+    def _run_loop(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Pantry expiry sweep failed: {str(e)}")
+            time.sleep(self.interval)
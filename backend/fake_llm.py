@@ -0,0 +1,225 @@
+"""
+Local stand-in for the watsonx.ai text generation API, replaying a cassette.
+
+Serves ``POST /ml/v1/text/generation`` (one JSON answer) and
+``POST /ml/v1/text/generation_stream`` (server-sent events, one per token) with
+the request and response shapes of watsonx.ai, answering from a cassette
+recorded with ``LLM_BACKEND=record`` (see llm_replay.py). Point the app at it
+with ``LLM_BACKEND=fake`` and ``LLM_FAKE_URL``:
+
+    python fake_llm.py --cassette llm_cassette.jsonl --port 8090 \\
+        --latency lognormal:1.5,0.4 --tokens-per-second 40 --error-rate 0.02
+
+``--latency`` is the time to the first token and ``--tokens-per-second`` paces
+the rest (0 sends everything at once); with ``--latency recorded`` the recorded
+latency already covers the whole answer, so leave the token rate at 0. Injected
+faults: ``--error-rate`` answers 429/500/503, ``--timeout-rate`` holds the
+request for ``--timeout`` seconds and drops the connection, ``--truncate-rate``
+cuts the answer in half (for a stream: closes it before the final event).
+``GET /health`` and ``GET /stats`` report the cassette size and counters.
+Standard library only, so it runs anywhere the backend does, offline.
+"""
+
+import argparse
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import serialization
+from llm_replay import GENERATION_PATH, STREAM_PATH, Cassette, Faults, Latency, prompt_key, split_tokens
+
+logger = logging.getLogger(__name__)
+
+ERROR_STATUSES = {429: "too_many_requests", 500: "internal_server_error", 503: "service_unavailable"}
+
+
+class FakeModelServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the cassette, delay model and fault injection."""
+
+    daemon_threads = True
+
+    def __init__(self, address, cassette, latency=None, faults=None, tokens_per_second=0.0, on_miss="any",
+                 seed=None):
+        super().__init__(address, _Handler)
+        self.cassette = cassette
+        self.latency = latency or Latency("0")
+        self.faults = faults or Faults()
+        self.tokens_per_second = tokens_per_second
+        self.on_miss = on_miss
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def error_status(self):
+        with self._lock:
+            return self._rng.choice(list(ERROR_STATUSES))
+
+    def start(self):
+        """Serve in a daemon thread (benchmarks, tests); stop with ``shutdown()``."""
+        thread = threading.Thread(target=self.serve_forever, name="fake-llm", daemon=True)
+        thread.start()
+        return thread
+
+
+def _result(model_id, text, tokens, input_tokens, stop_reason):
+    return {
+        "model_id": model_id,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "results": [{
+            "generated_text": text,
+            "generated_token_count": tokens,
+            "input_token_count": input_tokens,
+            "stop_reason": stop_reason,
+        }],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "fake-llm/1"
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status, payload):
+        body = serialization.dumps(payload)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, code, message):
+        self._send_json(status, {"errors": [{"code": code, "message": message}], "status_code": status})
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._send_json(200, {"status": "ok", "exchanges": len(self.server.cassette)})
+        elif path == "/stats":
+            with self.server._lock:
+                counters = dict(self.server.counters)
+            self._send_json(200, {"exchanges": len(self.server.cassette), "counters": counters})
+        else:
+            self._send_error(404, "not_found", f"No route for GET {path}")
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        try:
+            body = serialization.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+        except ValueError:
+            return self._send_error(400, "json_validation_error", "Request body is not valid JSON")
+        if path not in (GENERATION_PATH, STREAM_PATH):
+            return self._send_error(404, "not_found", f"No route for POST {path}")
+        if not isinstance(body, dict) or not isinstance(body.get("input"), str):
+            return self._send_error(400, "json_validation_error", "'input' must be a string")
+        self._generate(body["input"], body.get("model_id"), stream=path == STREAM_PATH)
+
+    def _generate(self, prompt, model_id, stream):
+        server = self.server
+        server.count("requests")
+        exchange = server.cassette.find(prompt, model_id, server.on_miss)
+        if exchange is None:
+            server.count("misses")
+            return self._send_error(404, "replay_miss", f"No recorded response for prompt {prompt_key(prompt)}")
+        fault = server.faults.draw()
+        if fault:
+            server.count(fault)
+        if fault == "timeout":
+            time.sleep(server.faults.timeout)
+            self.close_connection = True
+            return
+        first_token = server.latency.sample(exchange.get("latency"))
+        if fault == "error":
+            time.sleep(first_token)
+            status = server.error_status()
+            return self._send_error(status, ERROR_STATUSES[status], "injected error")
+
+        text = exchange["response"]
+        if fault == "truncate" and not stream:
+            text = text[:len(text) // 2]
+        tokens = split_tokens(text)
+        input_tokens = len(split_tokens(prompt))
+        model_id = model_id or exchange.get("model_id")
+        per_token = 1.0 / server.tokens_per_second if server.tokens_per_second > 0 else 0.0
+        if not stream:
+            time.sleep(first_token + per_token * len(tokens))
+            return self._send_json(200, _result(model_id, text, len(tokens), input_tokens, "eos_token"))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(first_token)
+        # A truncated stream stops halfway and never sends its final event.
+        last = len(tokens) // 2 if fault == "truncate" else len(tokens)
+        for position, token in enumerate(tokens[:last], 1):
+            stop_reason = "eos_token" if position == len(tokens) else "not_finished"
+            event = serialization.dumps(_result(model_id, token, position, input_tokens, stop_reason))
+            self._write_chunk(b"id: %d\nevent: message\ndata: " % position + event + b"\n\n")
+            if per_token and position < last:
+                time.sleep(per_token)
+        if fault == "truncate":
+            self.close_connection = True
+            return
+        if not tokens:
+            event = serialization.dumps(_result(model_id, "", 0, input_tokens, "eos_token"))
+            self._write_chunk(b"id: 1\nevent: message\ndata: " + event + b"\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n" % len(data) + data + b"\r\n")
+        self.wfile.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded LLM answers on watsonx.ai-style endpoints")
+    parser.add_argument("--cassette", default="llm_cassette.jsonl", help="JSONL file recorded with LLM_BACKEND=record")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", default="0", help="time to first token, e.g. lognormal:1.5,0.4 or recorded")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="pace of the remaining tokens (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds an injected timeout holds the request")
+    parser.add_argument("--on-miss", choices=("any", "error"), default="any",
+                        help="unrecorded prompts get some recorded answer (any) or a 404 (error)")
+    parser.add_argument("--seed", type=int, help="seed the latency and fault draws for repeatable runs")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    cassette = Cassette(args.cassette)
+    if not len(cassette):
+        logger.warning(f"⚠️ {args.cassette} has no recorded exchanges; every request will fail")
+    faults = Faults(args.error_rate, args.timeout_rate, args.truncate_rate, timeout=args.timeout, seed=args.seed)
+    server = FakeModelServer((args.host, args.port), cassette, Latency(args.latency, seed=args.seed), faults,
+                             tokens_per_second=args.tokens_per_second, on_miss=args.on_miss, seed=args.seed)
+    logger.info(f"🧪 Fake LLM serving {len(cassette)} exchange(s) on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
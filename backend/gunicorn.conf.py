@@ -0,0 +1,73 @@
+"""
+Gunicorn configuration for the Flask backend (main.py).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden with the environment variables below or on
+the command line (``--workers 4``). Requests spend most of their time waiting
+on Watsonx, so each worker runs a small thread pool (gthread) and the worker
+count scales with the cores.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# Workers derived from cores: 2 x cores + 1, capped so a large host does not
+# multiply per-worker caches and LLM connections without bound.
+_cores = multiprocessing.cpu_count()
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or min(2 * _cores + 1, int(os.getenv("MAX_WORKERS", "12")))
+worker_class = "gthread"
+threads = int(os.getenv("WORKER_THREADS", "4"))
+
+# Load main.py, its prompt templates and caches once in the master and fork after.
+preload_app = True
+
+# LLM generations can take 40s+; graceful_timeout bounds the shutdown flush.
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv("ACCESS_LOG", "-") or None
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+# Workers share their metrics here so whichever one answers /metrics reports all of them.
+# Set before the app is preloaded, since main.py reads it at import.
+_own_metrics_dir = not os.getenv("METRICS_DIR")
+if _own_metrics_dir:
+    os.environ["METRICS_DIR"] = os.path.join(tempfile.gettempdir(), f"pantryai-metrics-{os.getpid()}")
+
+
+def on_starting(server):
+    # Snapshots of workers from an earlier run would otherwise count as live forever.
+    import main
+    if main.shared_metrics is not None:
+        main.shared_metrics.clear()
+
+
+def post_worker_init(worker):
+    # Background work (warm-up, expiry sweep, flush and exporter threads) must start after the fork.
+    import main
+    main.warm_up_watsonx()
+    main.start_expiry_sweeper()
+    main.start_metrics_writer()
+
+
+def child_exit(server, worker):
+    import main
+    main.metrics_worker_exited(worker.pid)
+
+
+def worker_exit(server, worker):
+    import main
+    main.shutdown()
+
+
+def on_exit(server):
+    if _own_metrics_dir:
+        shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
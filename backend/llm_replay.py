@@ -0,0 +1,335 @@
+"""
+Record and replay of LLM exchanges, so the generation path runs without IBM Cloud.
+
+Everything here has the ``backend(model_id, prompt, params) -> str`` shape that
+``ModelRouter`` calls, so it slots in where main.watsonx_generate goes:
+
+- ``Cassette`` is an append-only JSONL file of exchanges: model id, parameters,
+  prompt, response text and the latency seen when it was recorded. Appends hold
+  the file lock from storage.py, so every worker can record into one cassette.
+- ``RecordingBackend`` wraps the real backend and appends each answer it gets.
+- ``ReplayBackend`` answers from a cassette in-process. Prompts are matched
+  exactly (by hash); several recordings of one prompt are served in turn. On a
+  miss, ``on_miss="any"`` picks a recorded answer from the prompt hash (load
+  tests, where pantries drift) and ``on_miss="error"`` raises ``ReplayMiss``
+  (regression runs that must see the recorded answer).
+- ``FakeModelClient`` is the same backend over HTTP, talking to fake_llm.py,
+  which serves a cassette on watsonx.ai-style text generation endpoints,
+  optionally streamed.
+
+``Latency`` turns a spec into delays: ``0.5`` or ``fixed:0.5``,
+``uniform:0.5,2``, ``normal:1.5,0.3``, ``lognormal:1.2,0.5`` (median, sigma),
+``exponential:1`` (mean), or ``recorded`` / ``recorded*0.5`` for the latency
+captured with each exchange. ``Faults`` injects errors, timeouts and truncated
+answers at given rates. Cassettes hold real prompts, pantry contents included:
+keep them out of version control.
+"""
+
+import hashlib
+import http.client
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import serialization
+import storage
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = "2023-05-29"
+GENERATION_PATH = "/ml/v1/text/generation"
+STREAM_PATH = "/ml/v1/text/generation_stream"
+
+
+class ReplayMiss(LookupError):
+    """No recorded exchange for a prompt (with ``on_miss="error"``, or an empty cassette)."""
+
+
+class FakeModelError(RuntimeError):
+    """An error answer from the fake model: injected, or the server's HTTP error."""
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:32]
+
+
+_TOKEN = re.compile(r"\s*\S+")
+
+
+def split_tokens(text):
+    """Word-sized pieces (leading whitespace attached) that join back into ``text``."""
+    pieces = _TOKEN.findall(text)
+    rest = len(text) - sum(map(len, pieces))
+    if rest:
+        pieces.append(text[-rest:])
+    return pieces
+
+
+class Latency:
+    """Random delays from a spec string (see the module docstring); seeded for repeatable runs."""
+
+    _ARITY = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}
+
+    def __init__(self, spec="0", seed=None):
+        self.spec = str(spec).strip().lower()
+        self._rng = random.Random(seed)
+        if self.spec.startswith("recorded"):
+            _, _, factor = self.spec.partition("*")
+            self.kind, self.args = "recorded", (float(factor or 1),)
+        elif ":" in self.spec:
+            kind, _, args = self.spec.partition(":")
+            self.kind, self.args = kind, tuple(float(value) for value in args.split(","))
+        else:
+            self.kind, self.args = "fixed", (float(self.spec or 0),)
+        if self.kind != "recorded" and len(self.args) != self._ARITY.get(self.kind, -1):
+            raise ValueError(f"Invalid latency spec: {spec!r}")
+
+    def sample(self, recorded=None):
+        """Seconds to wait; ``recorded`` is the exchange's own latency, used by ``recorded`` specs."""
+        kind, args, rng = self.kind, self.args, self._rng
+        if kind == "fixed":
+            value = args[0]
+        elif kind == "recorded":
+            value = (recorded or 0.0) * args[0]
+        elif kind == "uniform":
+            value = rng.uniform(*args)
+        elif kind == "normal":
+            value = rng.gauss(*args)
+        elif kind == "lognormal":
+            value = rng.lognormvariate(math.log(args[0]), args[1]) if args[0] > 0 else 0.0
+        else:
+            value = rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+        return max(value, 0.0)
+
+    def __repr__(self):
+        return f"Latency({self.spec!r})"
+
+
+class Faults:
+    """Draws at most one injected fault per call: "error", "timeout" or "truncate" (or None)."""
+
+    def __init__(self, error_rate=0.0, timeout_rate=0.0, truncate_rate=0.0, timeout=30.0, seed=None):
+        self.rates = (("error", error_rate), ("timeout", timeout_rate), ("truncate", truncate_rate))
+        self.timeout = timeout
+        self._rng = random.Random(seed)
+
+    def __bool__(self):
+        return any(rate > 0 for _, rate in self.rates)
+
+    def draw(self):
+        roll = self._rng.random()
+        for fault, rate in self.rates:
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+
+class Cassette:
+    """Recorded exchanges in a JSONL file, indexed by prompt once loaded."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = storage.FileLock(path)
+        self._lock = threading.Lock()
+        self._exchanges = None
+        self._by_key = {}
+        self._turns = {}
+
+    def _load(self):
+        exchanges, skipped = [], 0
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        exchange = serialization.loads(line)
+                    except ValueError:
+                        skipped += 1
+                        continue
+                    if isinstance(exchange, dict) and isinstance(exchange.get("response"), str):
+                        exchanges.append(exchange)
+        if skipped:
+            logger.warning(f"Skipped {skipped} malformed line(s) in {self.path}")
+        self._exchanges = []
+        for exchange in exchanges:
+            self._index(exchange)
+        logger.info(f"Loaded {len(exchanges)} recorded LLM exchange(s) from {self.path}")
+
+    def _index(self, exchange):
+        key = exchange.get("key") or prompt_key(exchange.get("prompt", ""))
+        self._exchanges.append(exchange)
+        self._by_key.setdefault(key, []).append(exchange)
+
+    def exchanges(self):
+        with self._lock:
+            if self._exchanges is None:
+                self._load()
+            return list(self._exchanges)
+
+    def __len__(self):
+        return len(self.exchanges())
+
+    def append(self, model_id, prompt, params, response, latency):
+        """Record one exchange; returns it."""
+        exchange = {
+            "key": prompt_key(prompt),
+            "model_id": model_id,
+            "params": params,
+            "prompt": prompt,
+            "response": response,
+            "latency": round(latency, 4),
+            "recorded_at": datetime.now().isoformat(),
+        }
+        line = serialization.dumps(exchange) + b"\n"
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self.lock.hold(), open(self.path, "ab") as f:
+            f.write(line)
+        with self._lock:
+            if self._exchanges is not None:
+                self._index(exchange)
+        return exchange
+
+    def find(self, prompt, model_id=None, on_miss="any"):
+        """The exchange to replay for a prompt, or None on a miss with ``on_miss="error"``.
+
+        Recordings of the prompt from ``model_id`` are preferred and served round-robin.
+        """
+        key = prompt_key(prompt)
+        with self._lock:
+            if self._exchanges is None:
+                self._load()
+            matches = self._by_key.get(key)
+            if matches:
+                same_model = [exchange for exchange in matches if exchange.get("model_id") == model_id]
+                matches = same_model or matches
+                turn = self._turns.get(key, 0)
+                self._turns[key] = turn + 1
+                return matches[turn % len(matches)]
+            if on_miss != "any" or not self._exchanges:
+                return None
+            return self._exchanges[int(key, 16) % len(self._exchanges)]
+
+
+class RecordingBackend:
+    """Calls the real backend and records every answer it returns."""
+
+    def __init__(self, backend, cassette):
+        self.backend = backend
+        self.cassette = cassette
+
+    def __call__(self, model_id, prompt, params):
+        start = time.perf_counter()
+        text = self.backend(model_id, prompt, params)
+        try:
+            self.cassette.append(model_id, prompt, params, text, time.perf_counter() - start)
+        except OSError as e:
+            logger.error(f"Could not record LLM exchange to {self.cassette.path}: {str(e)}")
+        return text
+
+
+class ReplayBackend:
+    """Answers from a cassette in-process, with simulated latency and injected faults."""
+
+    def __init__(self, cassette, latency=None, faults=None, on_miss="any", tokens_per_second=0.0):
+        self.cassette = cassette
+        self.latency = latency or Latency("0")
+        self.faults = faults or Faults()
+        self.on_miss = on_miss
+        self.tokens_per_second = tokens_per_second
+
+    def __call__(self, model_id, prompt, params):
+        exchange = self.cassette.find(prompt, model_id, self.on_miss)
+        if exchange is None:
+            raise ReplayMiss(f"No recorded response for prompt {prompt_key(prompt)} in {self.cassette.path}")
+        fault = self.faults.draw()
+        if fault == "timeout":
+            time.sleep(self.faults.timeout)
+            raise TimeoutError("injected timeout")
+        text = exchange["response"]
+        delay = self.latency.sample(exchange.get("latency"))
+        if self.tokens_per_second > 0:
+            delay += len(split_tokens(text)) / self.tokens_per_second
+        time.sleep(delay)
+        if fault == "error":
+            raise FakeModelError("injected error")
+        if fault == "truncate":
+            text = text[:len(text) // 2]
+        return text
+
+
+class FakeModelClient:
+    """Backend that calls fake_llm.py (or anything serving the same endpoints) over HTTP.
+
+    Keeps one keep-alive connection per thread. With ``stream=True`` it reads the
+    server-sent events of the streaming endpoint and joins the chunks.
+    """
+
+    def __init__(self, base_url, stream=False, timeout=60.0, project_id="offline"):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.stream = stream
+        self.timeout = timeout
+        self.project_id = project_id
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def __call__(self, model_id, prompt, params):
+        path = f"{self.prefix}{STREAM_PATH if self.stream else GENERATION_PATH}?version={API_VERSION}"
+        body = serialization.dumps({"model_id": model_id, "input": prompt, "parameters": params,
+                                    "project_id": self.project_id})
+        conn = self._connection()
+        try:
+            conn.request("POST", path, body=body, headers={
+                "Content-Type": "application/json",
+                "Accept": "text/event-stream" if self.stream else "application/json",
+            })
+            response = conn.getresponse()
+            if response.status != 200:
+                raise FakeModelError(f"HTTP {response.status}: {_error_message(response.read())}")
+            if self.stream:
+                return _read_stream(response)
+            return serialization.loads(response.read())["results"][0]["generated_text"]
+        except BaseException:
+            # The connection may be mid-response; never reuse it.
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+def _error_message(payload):
+    try:
+        return serialization.loads(payload)["errors"][0]["message"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return payload[:200].decode("utf-8", "replace")
+
+
+def _read_stream(response):
+    """Join the generated_text of server-sent events until a final stop_reason."""
+    parts = []
+    while True:
+        line = response.readline()
+        if not line:
+            raise FakeModelError("stream ended before the final event")
+        if not line.startswith(b"data:"):
+            continue
+        result = serialization.loads(line[5:])["results"][0]
+        parts.append(result.get("generated_text", ""))
+        if result.get("stop_reason", "not_finished") != "not_finished":
+            response.read()  # drain the end of the chunked body so the connection can be reused
+            return "".join(parts)
@@ -1,49 +1,262 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
 import json
 import os
 from dotenv import load_dotenv
-from ibm_watsonx_ai import Credentials
-from ibm_watsonx_ai.foundation_models import Model
 import re
 import logging
 from datetime import datetime
+from model_router import ModelRouter, STRATEGIES
+import compression
+import metrics
+import serialization
+import storage
+import tracing
+from profiler import SlowRequestProfiler
+import profiler
+import recipe_cache
+import expiry
+import nutrition
+import recipe_index
+import pregen
+import validation
+import rate_limit
+import llm_replay
+import time
+import threading
+import socket
+import uuid
+import hashlib
+import math
+import contextvars
+from contextlib import contextmanager, nullcontext
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+app.json = serialization.FastJSONProvider(app)
 CORS(app)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Metrics (exposed at /metrics)
+HTTP_REQUEST_SECONDS = metrics.Histogram(
+    "pantryai_http_request_duration_seconds", "HTTP request latency by endpoint.",
+    ["endpoint", "method", "status"])
+STAGE_SECONDS = metrics.Histogram(
+    "pantryai_stage_duration_seconds", "Latency of backend hot-path stages.", ["stage"])
+LLM_FALLBACKS = metrics.Counter(
+    "pantryai_llm_fallback_total", "Responses served from canned or salvaged recipes.", ["mode", "reason"])
+LLM_PARSE_FAILURES = metrics.Counter(
+    "pantryai_llm_parse_failures_total", "LLM responses that were not valid JSON.", ["mode"])
+LLM_VALIDATION_FAILURES = metrics.Counter(
+    "pantryai_llm_validation_failures_total", "LLM recipes that failed schema or pantry validation.", ["mode", "kind"])
+LLM_REPAIRS = metrics.Counter(
+    "pantryai_llm_repairs_total", "How recipes that failed validation were handled.", ["mode", "outcome"])
+LLM_QUEUE_SECONDS = metrics.Histogram(
+    "pantryai_llm_queue_seconds", "Time spent waiting for an upstream LLM slot.")
+RATE_LIMITED = metrics.Counter(
+    "pantryai_rate_limited_total", "Requests rejected by rate limits or LLM queue timeouts.", ["mode", "reason"])
+LLM_INFLIGHT = metrics.Gauge(
+    "pantryai_llm_inflight", "LLM generations currently in progress.")
+PANTRY_ITEMS = metrics.Gauge(
+    "pantryai_pantry_items", "Number of items in the pantry at the last load or save.",
+    multiprocess_mode="latest")
+PREGEN_RUNS = metrics.Counter(
+    "pantryai_pregen_runs_total", "Background pre-generation runs by outcome.", ["outcome"])
+PREGEN_LOOKUPS = metrics.Counter(
+    "pantryai_pregen_lookups_total", "Recipe requests checked against pre-generated results.", ["result"])
+PANTRY_SPOILED = metrics.Counter(
+    "pantryai_pantry_spoiled_total", "Pantry items flagged as spoiled by the expiry sweep.")
+RECIPE_CACHE_LOOKUPS = metrics.Counter(
+    "pantryai_recipe_cache_lookups_total", "Recipe requests checked against the similarity cache.", ["mode", "result"])
+# With several worker processes (gunicorn sets it), each worker's metrics are shared through
+# METRICS_DIR and /metrics serves their merge, whichever worker answers the scrape
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+shared_metrics = metrics.SharedMetrics(
+    METRICS_DIR, interval=float(os.getenv("METRICS_WRITE_INTERVAL", "5"))) if METRICS_DIR else None
+
+@contextmanager
+def stage(name, **attributes):
+    """Time a hot-path stage into metrics and a trace span; usable as a decorator or a context manager."""
+    with STAGE_SECONDS.labels(name).time(), tracing.span(name, **attributes) as span:
+        yield span
+
+slow_request_profiler = SlowRequestProfiler() if profiler.enabled() else None
+
 # File paths - using db.json for consistency with your existing data
-PANTRY_FILE = "../db.json"  # Your existing db.json file
-RECIPES_FILE = "recipes.json"
+PANTRY_FILE = os.getenv("PANTRY_FILE", "../db.json")  # Your existing db.json file
+RECIPES_FILE = os.getenv("RECIPES_FILE", "recipes.json")
+
+# Per-tenant pantries (X-Tenant-ID header), one file and lock each under PANTRY_DIR;
+# requests without a tenant use the "default" tenant, which keeps PANTRY_FILE.
+# Shared-file storage: safe across threads and worker processes. With COMPACT_RECORDS=true
+# cached pantries and the recipe cache hold compact records (records.py).
+PANTRY_DIR = os.getenv("PANTRY_DIR", "pantries")
+DEFAULT_TENANT = "default"
+pantry_stores = storage.TenantPantries(PANTRY_DIR, default_path=PANTRY_FILE, default_tenant=DEFAULT_TENANT,
+                                       max_open=int(os.getenv("PANTRY_MAX_OPEN", "4096")))
+current_tenant = contextvars.ContextVar("tenant", default=DEFAULT_TENANT)
+
+@contextmanager
+def tenant_context(tenant):
+    """Run a block (e.g. background work) against one tenant's pantry."""
+    token = current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        current_tenant.reset(token)
+
+def pantry_store():
+    """The current tenant's PantryStore."""
+    return pantry_stores.get(current_tenant.get())
+
+recipe_log = storage.RecipeLog(RECIPES_FILE, flush_interval=float(os.getenv("RECIPE_FLUSH_INTERVAL", "1.0")))
+
+# Items expiring within EXPIRY_SOON_DAYS are used first; expired ones are flagged as spoiled
+EXPIRY_SOON_DAYS = float(os.getenv("EXPIRY_SOON_DAYS", "3"))
+EXPIRY_SWEEP_INTERVAL = float(os.getenv("EXPIRY_SWEEP_INTERVAL", "3600"))
+pantry_expiry = expiry.ExpiryTracker(max_entries=pantry_stores.max_open)
+
+# Serve earlier recipe sets that still fit the pantry instead of calling Watsonx
+RECIPE_CACHE_ENABLED = os.getenv("RECIPE_CACHE_ENABLED", "true").lower() == "true"
+similar_recipes = recipe_cache.RecipeCache(
+    min_coverage=float(os.getenv("RECIPE_CACHE_MIN_COVERAGE", "0.6")),
+    max_entries=int(os.getenv("RECIPE_CACHE_MAX_ENTRIES", "10000")),
+    compact=storage.COMPACT_RECORDS,
+    max_pantry=int(os.getenv("RECIPE_CACHE_MAX_PANTRY", str(recipe_cache.MAX_PANTRY))))
+_recipe_cache_load_lock = threading.Lock()
+
+# Full-text and faceted search over saved recipes (/api/recipes/search)
+RECIPE_INDEX_FILE = os.getenv("RECIPE_INDEX_FILE", "recipe_index.sqlite3")
+recipe_search = recipe_index.RecipeIndex(RECIPE_INDEX_FILE)
+
+# Nutrition computed locally from ingredient amounts (bundled nutrients.csv) instead of asked of the LLM
+NUTRITION_ENGINE = os.getenv("NUTRITION_ENGINE", "true").lower() == "true"
+
+# Per-client rate limits and fair sharing of the upstream Watsonx concurrency
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+BACKGROUND_CLIENT = "background"
+
+def client_for_key(api_key):
+    """Client id for an API key (hashed so keys never end up in store keys or metrics)."""
+    return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+def client_id():
+    """Who a request is rate limited as: its X-API-Key, else its address."""
+    api_key = request.headers.get("X-API-Key")
+    if api_key:
+        return client_for_key(api_key)
+    address = request.remote_addr or "unknown"
+    if RATE_LIMIT_TRUST_PROXY and request.headers.get("X-Forwarded-For"):
+        address = request.headers["X-Forwarded-For"].split(",")[0].strip()
+    return "ip:" + address
+
+def _client_weights(spec):
+    """Parse LLM_CLIENT_WEIGHTS, e.g. "key:abc123=4,ip:10.0.0.7=0.5", into scheduler weights."""
+    weights = {BACKGROUND_CLIENT: 0.25}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, weight = part.rpartition("=")
+        name = client_for_key(name[4:]) if name.startswith("key:") else name
+        weights[name] = float(weight)
+    return weights
+
+rate_limiter = rate_limit.RateLimiter(
+    rate_limit.create_store(os.getenv("RATE_LIMIT_REDIS_URL")),
+    {
+        "home": rate_limit.Limit.from_env("RATE_LIMIT_HOME", per_minute=10, burst=5),
+        "professional": rate_limit.Limit.from_env("RATE_LIMIT_PROFESSIONAL", per_minute=4, burst=2),
+    } if RATE_LIMIT_ENABLED else {}
+)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+llm_scheduler = rate_limit.FairScheduler(
+    slots=LLM_MAX_CONCURRENCY,
+    weights=_client_weights(os.getenv("LLM_CLIENT_WEIGHTS", ""))
+)
+# Client holding the current upstream slot; its repairs and hedges are charged to it
+llm_client = contextvars.ContextVar("llm_client", default=None)
+
+@contextmanager
+def llm_slot(client, cost, timeout=None):
+    """Hold an upstream slot for ``client``; yields the seconds spent queuing."""
+    with llm_scheduler.slot(client, cost=cost, timeout=timeout) as waited:
+        token = llm_client.set(client)
+        try:
+            yield waited
+        finally:
+            llm_client.reset(token)
+
+def hedge_slot(params):
+    """A free upstream slot for a hedge call, charged to the slot holder; None when all are busy."""
+    if not llm_scheduler.try_acquire(llm_client.get(), cost=params["max_new_tokens"]):
+        return None
+    return llm_scheduler.release
+
+def too_many_requests(retry_after, message, status=429):
+    """Error response with a Retry-After header (whole seconds, at least 1)."""
+    seconds = max(1, math.ceil(min(retry_after, 3600)))
+    response = jsonify({"success": False, "error": message, "retryAfter": seconds})
+    response.status_code = status
+    response.headers["Retry-After"] = str(seconds)
+    return response
 
 # IBM Watsonx configuration
 WATSONX_API_KEY = os.getenv("WATSONX_API_KEY")
 WATSONX_PROJECT_ID = os.getenv("WATSONX_PROJECT_ID")
 
-# Initialize IBM Watsonx credentials
+# IBM Watsonx credentials are created on first use (or by the warm-up thread), so
+# importing this module never loads the heavy ibm_watsonx_ai SDK.
+WATSONX_URL = os.getenv("WATSONX_URL", "https://us-south.ml.cloud.ibm.com")
+watsonx_configured = bool(WATSONX_API_KEY and WATSONX_PROJECT_ID)
+
+# Where generations come from: "watsonx" (default), "record" (Watsonx, appending every
+# exchange to LLM_CASSETTE), "replay" (answers from LLM_CASSETTE in-process) or "fake"
+# (a fake_llm.py server at LLM_FAKE_URL). The last two need no credentials or network.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "watsonx").strip().lower()
+LLM_CASSETTE = os.getenv("LLM_CASSETTE", "llm_cassette.jsonl")
+LLM_OFFLINE = LLM_BACKEND in ("replay", "fake")
+llm_enabled = watsonx_configured or LLM_OFFLINE
 credentials = None
-if WATSONX_API_KEY and WATSONX_PROJECT_ID:
-    try:
-        credentials = Credentials(
-            api_key=WATSONX_API_KEY,
-            url="https://us-south.ml.cloud.ibm.com"
-        )
-        logger.info("✅ IBM Watsonx credentials initialized successfully")
-    except Exception as e:
-        logger.error(f"❌ Failed to initialize Watsonx credentials: {str(e)}")
-        credentials = None
-else:
+_watsonx_model_class = None
+_watsonx_models = {}
+_watsonx_init_lock = threading.Lock()
+_watsonx_init_failed = False
+if LLM_OFFLINE:
+    logger.info(f"🧪 Offline LLM backend: {LLM_BACKEND}")
+elif not watsonx_configured:
     logger.warning("⚠️ WATSONX_API_KEY or WATSONX_PROJECT_ID not found in environment variables")
 
+def init_watsonx():
+    """Import the Watsonx SDK and create credentials once; returns the credentials or None."""
+    global credentials, _watsonx_model_class, _watsonx_init_failed
+    if credentials is not None or not watsonx_configured or _watsonx_init_failed:
+        return credentials
+    with _watsonx_init_lock:
+        if credentials is None and not _watsonx_init_failed:
+            start = time.perf_counter()
+            try:
+                from ibm_watsonx_ai import Credentials
+                from ibm_watsonx_ai.foundation_models import Model
+                _watsonx_model_class = Model
+                credentials = Credentials(
+                    api_key=WATSONX_API_KEY,
+                    url=WATSONX_URL
+                )
+                logger.info(f"✅ IBM Watsonx credentials initialized successfully ({time.perf_counter() - start:.2f}s)")
+            except Exception as e:
+                logger.error(f"❌ Failed to initialize Watsonx credentials: {str(e)}")
+                _watsonx_init_failed = True
+    return credentials
+
 # Model configuration
-model_id = "meta-llama/llama-3-70b-instruct"  # Updated to recommended model
+model_id = os.getenv("WATSONX_MODEL_ID", "meta-llama/llama-3-70b-instruct")  # Updated to recommended model
+# Optional smaller/faster instruct model used for hedging and fast-first routing
+alternate_model_id = os.getenv("WATSONX_ALTERNATE_MODEL_ID", "")
 home_parameters = {
     "max_new_tokens": 2500,
     "temperature": 0.2,
@@ -60,79 +273,272 @@ professional_parameters = {
     "repetition_penalty": 1.0
 }
 
+def _routing_strategy(env_name):
+    strategy = os.getenv(env_name, "primary").strip().lower()
+    if strategy not in STRATEGIES:
+        logger.warning(f"⚠️ Unknown {env_name}={strategy!r}, using 'primary'")
+        return "primary"
+    return strategy
+
+# Routing strategy per mode: primary | hedged | fast_first
+routing_strategies = {
+    "home": _routing_strategy("WATSONX_HOME_STRATEGY"),
+    "professional": _routing_strategy("WATSONX_PROFESSIONAL_STRATEGY"),
+}
+
+def get_watsonx_model(model_id, params):
+    """Return a cached Watsonx model client for a model and parameter set."""
+    key = (model_id, tuple(sorted(params.items())))
+    model = _watsonx_models.get(key)
+    if model is None:
+        if not init_watsonx():
+            raise RuntimeError("Watsonx is not configured")
+        model = _watsonx_models.setdefault(key, _watsonx_model_class(
+            model_id=model_id,
+            credentials=credentials,
+            params=params,
+            project_id=WATSONX_PROJECT_ID
+        ))
+    return model
+
+def watsonx_generate(model_id, prompt, params):
+    """Run a single text generation against one Watsonx model."""
+    return get_watsonx_model(model_id, params).generate_text(prompt=prompt)
+
+def _llm_backend():
+    """The backend(model_id, prompt, params) that model_router calls, per LLM_BACKEND."""
+    if LLM_BACKEND == "record":
+        return llm_replay.RecordingBackend(watsonx_generate, llm_replay.Cassette(LLM_CASSETTE))
+    if LLM_BACKEND == "replay":
+        return llm_replay.ReplayBackend(
+            llm_replay.Cassette(LLM_CASSETTE),
+            latency=llm_replay.Latency(os.getenv("LLM_REPLAY_LATENCY", "0")),
+            on_miss=os.getenv("LLM_REPLAY_MISS", "any").lower())
+    if LLM_BACKEND == "fake":
+        return llm_replay.FakeModelClient(
+            os.getenv("LLM_FAKE_URL", "http://127.0.0.1:8090"),
+            stream=os.getenv("LLM_FAKE_STREAM", "false").lower() == "true",
+            timeout=float(os.getenv("LLM_FAKE_TIMEOUT", "60")))
+    if LLM_BACKEND != "watsonx":
+        logger.warning(f"⚠️ Unknown LLM_BACKEND={LLM_BACKEND!r}, using 'watsonx'")
+    return watsonx_generate
+
+def parse_llm_json(text):
+    """Parse a raw LLM answer as JSON (the router's validator)."""
+    with stage("parse_json"):
+        return serialization.loads(text)
+
+model_router = ModelRouter(
+    backend=_llm_backend(),
+    validator=parse_llm_json,
+    primary_model=model_id,
+    alternate_model=alternate_model_id,
+    hedge_min_delay=float(os.getenv("WATSONX_HEDGE_MIN_DELAY", "2")),
+    hedge_default_delay=float(os.getenv("WATSONX_HEDGE_DEFAULT_DELAY", "15")),
+    max_workers=2 * LLM_MAX_CONCURRENCY,  # a hedged call holds two executor threads
+    hedge_slot=hedge_slot,
+)
+
+@stage("load_pantry")
 def load_pantry():
-    """Load pantry data from db.json file."""
+    """Load pantry data from db.json file.
+    
+    Served from a cache while the file is unchanged; the returned list is shared,
+    so modify the pantry through pantry_transaction() instead.
+    """
     try:
-        if os.path.exists(PANTRY_FILE):
-            with open(PANTRY_FILE, "r", encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get("pantry", [])
-        return []
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        store = pantry_store()
+        pantry = store.load()
+    except (OSError, json.JSONDecodeError) as e:
         logger.error(f"Error loading pantry data: {str(e)}")
         return []
+    PANTRY_ITEMS.set(len(pantry))
+    tracing.current_span().set_attributes({
+        "pantry.items": len(pantry),
+        "pantry.bytes": store.size,
+        "pantry.tenant": current_tenant.get()
+    })
+    return pantry
 
+@stage("save_pantry")
 def save_pantry(pantry_data):
     """Save pantry data to db.json file."""
     try:
-        # Read existing data
-        data = {"pantry": []}
-        if os.path.exists(PANTRY_FILE):
-            with open(PANTRY_FILE, "r", encoding='utf-8') as f:
-                data = json.load(f)
-        
-        # Update pantry data
-        data["pantry"] = pantry_data
-        
-        # Save back to file
-        with open(PANTRY_FILE, "w", encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        pantry_store().save(pantry_data)
+        PANTRY_ITEMS.set(len(pantry_data))
+        tracing.current_span().set_attribute("pantry.items", len(pantry_data))
         logger.info(f"Pantry data saved successfully. Items count: {len(pantry_data)}")
     except Exception as e:
         logger.error(f"Error saving pantry data: {str(e)}")
         raise
 
-def save_recipe(recipe, mode):
-    """Save recipe data with error handling."""
+@contextmanager
+def pantry_transaction():
+    """Yield a modifiable copy of the pantry and save it on exit, holding the pantry lock throughout."""
+    tenant = current_tenant.get()
+    with stage("pantry_transaction", **{"pantry.tenant": tenant}) as span, pantry_store().transaction() as pantry:
+        yield pantry
+        PANTRY_ITEMS.set(len(pantry))
+        span.set_attribute("pantry.items", len(pantry))
+    logger.info(f"Pantry data saved successfully. Items count: {len(pantry)}")
+    if pregenerator is not None:
+        pregenerator.notify(tenant)
+
+def expiry_index(pantry):
+    """ExpiryIndex of a pantry, cached per tenant while it is the tenant's current snapshot."""
+    version, current = pantry_store().snapshot()
+    if current is not pantry:
+        return expiry.ExpiryIndex(pantry)
+    return pantry_expiry.index(pantry, current_tenant.get(), version)
+
+def usable_pantry(pantry, now=None):
+    """Items that can still be cooked, those expiring within EXPIRY_SOON_DAYS first (soonest first).
+
+    Returns (items, expiring) where expiring is [(item, days left)]. Spoiled items,
+    flagged or merely past their expiry, are left out.
+    """
+    index = expiry_index(pantry)
+    if not len(index):
+        return [item for item in pantry if not item.get("spoiled")], []
+    now = time.time() if now is None else now
+    expiring = [(item, days_left) for item, days_left in index.expiring_within(EXPIRY_SOON_DAYS, now)
+                if not item.get("spoiled")]
+    skip = index.expired_ids(now) | {item.get("id") for item, _ in expiring}
+    items = [item for item, _ in expiring]
+    items.extend(item for item in pantry if item.get("id") not in skip and not item.get("spoiled"))
+    return items, expiring
+
+def set_item_expiry(item, expires_at):
+    """Set (or clear, with None) an item's expiresAt, flagging it spoiled if that is already past."""
+    if expires_at is None:
+        item.pop("expiresAt", None)
+    else:
+        item["expiresAt"] = expires_at
+    expires = expiry.expiry_timestamp(expires_at)
+    if expires is not None and expires <= time.time():
+        if not item.get("spoiled"):
+            item["spoiled"] = True
+            item["spoiledAt"] = datetime.now().isoformat()
+    else:
+        item.pop("spoiled", None)
+        item.pop("spoiledAt", None)
+
+def sweep_spoiled_items(now=None, since=None):
+    """Flag items whose expiry has passed (after ``since``, if given) as spoiled; returns how many."""
+    now = time.time() if now is None else now
+    pending = {item.get("id") for item in expiry_index(load_pantry()).expired(now, since)
+               if not item.get("spoiled")}
+    if not pending:
+        return 0
+    flagged = 0
+    with pantry_transaction() as pantry:
+        for item in pantry:
+            if item.get("id") in pending and not item.get("spoiled"):
+                expires = expiry.expiry_timestamp(item.get("expiresAt"))
+                if expires is not None and expires <= now:
+                    item["spoiled"] = True
+                    item["spoiledAt"] = datetime.now().isoformat()
+                    flagged += 1
+    PANTRY_SPOILED.inc(flagged)
+    logger.info(f"Flagged {flagged} pantry item(s) as spoiled")
+    return flagged
+
+class _SpoiledSweep:
+    """Sweep every tenant's pantry, each time only for items that expired since the previous sweep."""
+
+    def __init__(self):
+        self.last = None
+
+    def __call__(self):
+        now = time.time()
+        for tenant in pantry_stores.tenants():
+            with tenant_context(tenant):
+                try:
+                    sweep_spoiled_items(now, self.last)
+                except Exception as e:
+                    logger.error(f"Expiry sweep failed for tenant {tenant}: {str(e)}")
+        self.last = now
+
+expiry_sweeper = expiry.Sweeper(_SpoiledSweep(), EXPIRY_SWEEP_INTERVAL)
+
+def start_metrics_writer():
+    """Start sharing this worker's metrics (after forking: called from gunicorn's post_worker_init)."""
+    if shared_metrics is not None:
+        shared_metrics.start()
+
+def metrics_worker_exited(pid):
+    """Keep an exited worker's counters in the merged totals (called in the gunicorn master)."""
+    if shared_metrics is not None:
+        shared_metrics.mark_dead(pid)
+
+def start_expiry_sweeper():
+    """Start the periodic spoiled-item sweep (after forking: called from gunicorn's post_worker_init)."""
+    return expiry_sweeper.start()
+
+def load_recipe_cache():
+    """Index recipes.json into the similarity cache (once per process)."""
+    with _recipe_cache_load_lock:
+        if similar_recipes.loaded:
+            return
+        with stage("load_recipe_cache") as span:
+            cached = similar_recipes.load_history(recipe_log.load())
+            span.set_attribute("recipe_cache.entries", cached)
+    logger.info(f"Recipe cache indexed {cached} saved recipe set(s)")
+
+@stage("lookup_recipe_cache")
+def lookup_similar_recipes(pantry_names, mode, options):
+    """A cached recipe set that fits the pantry, or None when Watsonx should be called."""
+    if not similar_recipes.cacheable(pantry_names):
+        RECIPE_CACHE_LOOKUPS.labels(mode, "skipped").inc()
+        return None
+    if not similar_recipes.loaded:
+        load_recipe_cache()
+    cached = similar_recipes.lookup(pantry_names, mode, options)
+    RECIPE_CACHE_LOOKUPS.labels(mode, "hit" if cached else "miss").inc()
+    if cached:
+        tracing.current_span().set_attributes({
+            "recipe_cache.coverage": cached["coverage"],
+            "recipe_cache.similarity": cached["similarity"]
+        })
+    return cached
+
+@stage("backfill_recipe_index")
+def backfill_recipe_index():
+    """Index recipes.json entries saved since the last backfill (e.g. by another process or version)."""
+    added = recipe_search.backfill_history(recipe_log.load())
+    if added:
+        logger.info(f"Indexed {added} saved recipe(s) for search")
+    return added
+
+@stage("save_recipe")
+def save_recipe(recipe, mode, pantry_names=None, options=None):
+    """Queue recipe data for the recipes.json writer thread and index it for similar pantries."""
     try:
-        recipes = []
-        if os.path.exists(RECIPES_FILE):
-            with open(RECIPES_FILE, "r", encoding='utf-8') as f:
-                recipes = json.load(f)
-        
         recipe_entry = {
+            "id": uuid.uuid4().hex,
             "mode": mode, 
             "recipe": recipe, 
             "timestamp": datetime.now().isoformat()
         }
-        recipes.append(recipe_entry)
-        
-        with open(RECIPES_FILE, "w", encoding='utf-8') as f:
-            json.dump(recipes, f, indent=2, ensure_ascii=False)
+        if current_tenant.get() != DEFAULT_TENANT:
+            recipe_entry["tenant"] = current_tenant.get()
+        pantry_key = similar_recipes.pantry_key(pantry_names)
+        if pantry_key:
+            recipe_entry["pantry"] = pantry_key
+        if options:
+            recipe_entry["options"] = options
+        pending = recipe_log.append(recipe_entry)
+        if RECIPE_CACHE_ENABLED and similar_recipes.loaded:
+            similar_recipes.add(recipe, mode, pantry_names, options)
+        tracing.current_span().set_attribute("recipes.pending", pending)
+        with stage("index_recipe"):
+            recipe_search.add_entry(recipe_entry, recipe_entry["id"])
         logger.info(f"Recipe saved successfully for mode: {mode}")
     except Exception as e:
         logger.error(f"Error saving recipe: {str(e)}")
 
-def call_watsonx(prompt, mode="home"):
-    """Call IBM Watsonx.ai to generate recipe suggestions with PantryChef system."""
-    if not credentials:
-        logger.warning("Watsonx not configured - returning fallback response")
-        return get_fallback_recipe(mode)
-    
-    try:
-        # Select parameters based on mode
-        params = professional_parameters if mode == "professional" else home_parameters
-        
-        # Initialize the model
-        model = Model(
-            model_id=model_id,
-            credentials=credentials,
-            params=params,
-            project_id=WATSONX_PROJECT_ID
-        )
-        
-        # Create the system prompt for PantryChef
-        system_prompt = """You are "PantryChef", a culinary LLM that generates recipes strictly from the provided pantry and instructions. 
+# System prompt for PantryChef
+PANTRYCHEF_SYSTEM_PROMPT = """You are "PantryChef", a culinary LLM that generates recipes strictly from the provided pantry and instructions. 
 - Always return ONLY valid JSON conforming to the schema. No prose, no markdown, no comments. 
 - Use ONLY ingredients listed in the pantry for "ingredientsUsed". Anything else belongs in "missingIngredients" and the aggregated "shoppingList".
 - Every recipe must be unique in technique, flavor profile, and title (no template repetition).
@@ -144,27 +550,174 @@ def call_watsonx(prompt, mode="home"):
 - "missingIngredients" and final "shoppingList" must be deduplicated, with sensible base quantities.
 - Nutrition values are estimates per serving.
 - Do not mention these rules in your output."""
+
+def call_watsonx(prompt, mode="home", fallback=True, pantry_names=None):
+    """Call IBM Watsonx.ai to generate recipe suggestions with PantryChef system.
+
+    With ``pantry_names`` the recipes are validated against the schema and the pantry
+    (see validate_llm_output). With ``fallback=False`` failures, and answers that are
+    not JSON, return None instead of the canned fallback or text-salvaged recipes.
+    """
+    if not LLM_OFFLINE and not init_watsonx():
+        if not fallback:
+            return None
+        logger.warning("Watsonx not configured - returning fallback response")
+        LLM_FALLBACKS.labels(mode, "not_configured").inc()
+        return get_fallback_recipe(mode)
+    
+    try:
+        # Select parameters based on mode
+        params = professional_parameters if mode == "professional" else home_parameters
         
         # Combine system prompt with user prompt
-        full_prompt = f"{system_prompt}\n\n{prompt}"
+        full_prompt = f"{PANTRYCHEF_SYSTEM_PROMPT}\n\n{prompt}"
         
-        # Generate response
-        response = model.generate_text(prompt=full_prompt)
-        logger.info("✅ Successfully generated recipe using Watsonx AI PantryChef")
+        # Generate response (routing also validates that the answer is JSON)
+        strategy = routing_strategies.get(mode, "primary")
+        with stage("llm_generate", **{
+            "llm.strategy": strategy,
+            "llm.max_new_tokens": params["max_new_tokens"],
+            "llm.prompt_bytes": len(full_prompt.encode("utf-8")),
+            "llm.prompt_tokens_estimate": tracing.estimate_tokens(full_prompt)
+        }) as span, LLM_INFLIGHT.track_inprogress():
+            result = model_router.generate(full_prompt, params, strategy=strategy)
+            span.set_attributes({
+                "llm.model": result.model_id,
+                "llm.response_bytes": len(result.text.encode("utf-8")),
+                "llm.response_tokens_estimate": tracing.estimate_tokens(result.text),
+                "llm.valid_json": result.data is not None
+            })
+        logger.info(f"✅ Successfully generated recipe using Watsonx AI PantryChef ({result.model_id}, {strategy})")
         
-        # Try to parse as JSON first
-        try:
-            recipe_data = json.loads(response)
-            return recipe_data
-        except json.JSONDecodeError:
-            logger.warning("Response was not valid JSON, attempting to parse text")
-            # If not JSON, create structured response from text
-            return parse_text_response(response)
+        if result.data is not None:
+            if pantry_names is not None:
+                return validate_llm_output(result.data, pantry_names, mode, params, fallback)
+            return result.data
+        
+        LLM_PARSE_FAILURES.labels(mode).inc()
+        if not fallback:
+            logger.warning("Response was not valid JSON, discarding it")
+            return None
+        logger.warning("Response was not valid JSON, attempting to parse text")
+        LLM_FALLBACKS.labels(mode, "text_salvage").inc()
+        # If not JSON, create structured response from text
+        with stage("parse_text"):
+            return parse_text_response(result.text)
                 
     except Exception as e:
         logger.error(f"Error calling Watsonx: {str(e)}")
+        if not fallback:
+            return None
+        LLM_FALLBACKS.labels(mode, "error").inc()
         return get_fallback_recipe(mode)
 
+# Recipes that fail validation are repaired one at a time with a short, targeted prompt
+VALIDATION_REPAIR_ENABLED = os.getenv("VALIDATION_REPAIR", "true").lower() == "true"
+VALIDATION_MAX_REPAIRS = int(os.getenv("VALIDATION_MAX_REPAIRS", "3"))
+REPAIR_MAX_NEW_TOKENS = int(os.getenv("VALIDATION_REPAIR_MAX_TOKENS", "900"))
+
+def build_repair_prompt(recipe, errors, pantry_names):
+    """Prompt asking the model to fix a single recipe, listing exactly what was wrong with it."""
+    problems = "\n".join(f"- {error}" for error in errors)
+    return f"""REPAIR TASK:
+The recipe below failed validation. Fix ONLY the listed problems and keep everything else unchanged.
+
+PROBLEMS:
+{problems}
+
+PANTRY (the only allowed "ingredientsUsed", case-insensitive):
+{json.dumps(pantry_names, ensure_ascii=False)}
+
+RULES:
+- Any ingredient not in the pantry moves from "ingredientsUsed" to "missingIngredients".
+- Required: "title", "ingredientsUsed" (at least one pantry item), "missingIngredients", "steps" (non-empty strings).
+- Return ONLY the corrected recipe as one JSON object, not wrapped in "recipes".
+
+RECIPE:
+{json.dumps(recipe, ensure_ascii=False)}"""
+
+def repair_recipe(recipe, errors, pantry, pantry_names, params):
+    """Ask the model to fix one recipe; returns the repaired recipe, or None if it is still invalid."""
+    prompt = f"{PANTRYCHEF_SYSTEM_PROMPT}\n\n{build_repair_prompt(recipe, errors, pantry_names)}"
+    repair_params = dict(params, max_new_tokens=min(params["max_new_tokens"], REPAIR_MAX_NEW_TOKENS))
+    if llm_client.get() is not None:
+        # Runs inside the generation's slot, but its tokens count toward the client's share
+        llm_scheduler.charge(llm_client.get(), repair_params["max_new_tokens"])
+    try:
+        with stage("llm_repair", **{"llm.prompt_tokens_estimate": tracing.estimate_tokens(prompt)}), \
+                LLM_INFLIGHT.track_inprogress():
+            result = model_router.generate(prompt, repair_params, strategy="primary", label="repair")
+    except Exception as e:
+        logger.error(f"Error repairing recipe: {str(e)}")
+        return None
+    repaired = result.data
+    if isinstance(repaired, dict) and isinstance(repaired.get("recipes"), list) and repaired["recipes"]:
+        repaired = repaired["recipes"][0]
+    if repaired is None or validation.check_recipe(repaired, pantry)[0]:
+        return None
+    return repaired
+
+def validate_llm_output(data, pantry_names, mode, params, fallback=True):
+    """Check every recipe against the schema and the pantry, repairing only the ones that fail.
+
+    Recipes the model cannot repair keep their place if moving their non-pantry
+    ingredients to missingIngredients makes them valid, and are dropped otherwise.
+    """
+    with stage("validate_output") as span:
+        if isinstance(data, dict) and "recipes" not in data and "title" in data:
+            data = {"recipes": [data], "shoppingList": []}
+        envelope_errors = validation.check_recipe_set(data)
+        if envelope_errors:
+            LLM_VALIDATION_FAILURES.labels(mode, "envelope").inc()
+            logger.warning(f"LLM output failed validation: {'; '.join(envelope_errors[:5])}")
+            if not fallback:
+                return None
+            LLM_FALLBACKS.labels(mode, "invalid_output").inc()
+            return get_fallback_recipe(mode)
+        pantry = validation.PantrySet(pantry_names)
+        failures = {}
+        for i, recipe in enumerate(data["recipes"]):
+            errors, foreign = validation.check_recipe(recipe, pantry, f"recipes[{i}]")
+            if errors:
+                failures[i] = (errors, foreign)
+                LLM_VALIDATION_FAILURES.labels(mode, "pantry" if foreign else "schema").inc()
+        span.set_attributes({"validation.recipes": len(data["recipes"]), "validation.failed": len(failures)})
+    if not failures:
+        return data
+
+    logger.warning(f"{len(failures)} of {len(data['recipes'])} recipe(s) failed validation")
+    to_repair = list(failures.items())[:VALIDATION_MAX_REPAIRS] if VALIDATION_REPAIR_ENABLED else []
+    # Sequentially, within the one upstream slot the generation holds
+    repaired = {i: repair_recipe(data["recipes"][i], errors, pantry, pantry_names, params)
+                for i, (errors, _) in to_repair}
+
+    recipes = []
+    for i, recipe in enumerate(data["recipes"]):
+        if i not in failures:
+            recipes.append(recipe)
+        elif repaired.get(i) is not None:
+            LLM_REPAIRS.labels(mode, "repaired").inc()
+            recipes.append(repaired[i])
+        elif failures[i][1]:
+            recipe = dict(recipe, missingIngredients=list(recipe["missingIngredients"]))
+            validation.reclassify_foreign(recipe, pantry)
+            if recipe["ingredientsUsed"]:
+                LLM_REPAIRS.labels(mode, "reclassified").inc()
+                recipes.append(recipe)
+            else:
+                LLM_REPAIRS.labels(mode, "dropped").inc()
+        else:
+            LLM_REPAIRS.labels(mode, "dropped").inc()
+
+    if not recipes:
+        if not fallback:
+            return None
+        LLM_FALLBACKS.labels(mode, "invalid_output").inc()
+        return get_fallback_recipe(mode)
+    data = dict(data, recipes=recipes, shoppingList=list(data.get("shoppingList", [])))
+    validation.merge_shopping_list(data)
+    return data
+
 def parse_text_response(response_text):
     """Parse text response from Watsonx into structured format."""
     lines = response_text.split('\n')
@@ -271,9 +824,20 @@ def get_fallback_recipe(mode="home"):
             ]
         }
 
-def generate_home_mode_prompt(pantry_list, servings=2, dietary="", cuisine="", budget="", appliances="", skill_level=""):
+# With the local nutrition engine the model lists ingredient amounts instead of estimating nutrition
+HOME_NUTRITION_EXAMPLE = '"nutrition": {"calories": 300, "protein": "20g", "carbs": "30g", "fat": "15g"},'
+PROFESSIONAL_NUTRITION_EXAMPLE = '"nutrition": {"calories": 420, "protein": "28g", "carbs": "25g", "fat": "18g"},'
+QUANTITIES_EXAMPLE = '"quantities": [{"item": "pantry item 1", "amount": 200, "unit": "g"}],'
+QUANTITIES_RULE = ('\n- Give every ingredient (used and missing) with its total amount in "quantities" '
+                   '(g, ml, tsp, tbsp, cup or pieces). Do not include nutrition; it is calculated separately.')
+
+def _nutrition_schema(computed_nutrition, nutrition_example):
+    return (QUANTITIES_EXAMPLE, QUANTITIES_RULE) if computed_nutrition else (nutrition_example, "")
+
+def generate_home_mode_prompt(pantry_list, servings=2, dietary="", cuisine="", budget="", appliances="", skill_level="", use_first="", computed_nutrition=False):
     """Generate HOME mode prompt for PantryChef."""
     pantry_json = json.dumps([{"name": item.split(" (")[0], "quantity": item} for item in pantry_list.split(", ")])
+    nutrition_field, quantities_rule = _nutrition_schema(computed_nutrition, HOME_NUTRITION_EXAMPLE)
     
     prompt = f"""TASK:
 Generate at least 3 unique, family-friendly, beginner-approachable recipes using the pantry below. 
@@ -295,14 +859,16 @@ USER INPUT:
 - Budget level (optional): {budget}
 - Available appliances (optional): {appliances}
 - Skill level (optional): {skill_level}
+- Use first (expiring soon, optional): {use_first}
 
 CONSTRAINTS:
 - Each recipe must select a subset of the pantry as "ingredientsUsed". Do not include anything not in pantry there.
 - Anything not in pantry appears in "missingIngredients" and contributes to aggregated "shoppingList".
+- Build recipes around the "Use first" items before anything else in the pantry.
 - Ensure titles and techniques differ across recipes (e.g., one sheet-pan, one one-pot, one skillet).
 - Quantify finishes (e.g., "start with 1/4 tsp salt, adjust to taste").
 - Chicken (if used) must achieve 74°C / 165°F internal.
-- Return ONLY valid JSON that matches the schema (no extra text).
+- Return ONLY valid JSON that matches the schema (no extra text).{quantities_rule}
 
 VALIDATION:
 - Cross-check: every entry in "ingredientsUsed" MUST exist in the provided pantry (case-insensitive). 
@@ -318,7 +884,7 @@ Expected JSON Schema:
       "servings": {servings},
       "ingredientsUsed": ["pantry item 1", "pantry item 2"],
       "missingIngredients": ["missing item 1", "missing item 2"],
-      "nutrition": {{"calories": 300, "protein": "20g", "carbs": "30g", "fat": "15g"}},
+      {nutrition_field}
       "steps": ["Step 1 with details", "Step 2 with details"],
       "technique": "cooking method used"
     }}
@@ -330,9 +896,10 @@ Expected JSON Schema:
     
     return prompt
 
-def generate_professional_mode_prompt(pantry_list, servings=2, dietary="", cuisine="", budget="", appliances="", skill_level=""):
+def generate_professional_mode_prompt(pantry_list, servings=2, dietary="", cuisine="", budget="", appliances="", skill_level="", use_first="", computed_nutrition=False):
     """Generate PROFESSIONAL mode prompt for PantryChef."""
     pantry_json = json.dumps([{"name": item.split(" (")[0], "quantity": item} for item in pantry_list.split(", ")])
+    nutrition_field, quantities_rule = _nutrition_schema(computed_nutrition, PROFESSIONAL_NUTRITION_EXAMPLE)
     
     prompt = f"""TASK:
 Generate at least 3 unique, chef-level recipes using the pantry below.
@@ -354,14 +921,16 @@ USER INPUT:
 - Budget level (optional): {budget}
 - Available appliances (optional): {appliances}
 - Skill level (optional): {skill_level}
+- Use first (expiring soon, optional): {use_first}
 
 CONSTRAINTS:
 - "ingredientsUsed" strictly from pantry; all else into "missingIngredients" and aggregated "shoppingList".
+- Prioritize the "Use first" items; feature each in at least one recipe where plausible.
 - Each recipe must use a distinct technique and flavor direction (e.g., pan-sear with pan sauce, low-temp confit/sous-vide, reduction/emulsion-based plating).
 - Provide pan sizes (e.g., 12-inch skillet), heat descriptors with temps (e.g., medium-high, oil shimmering ~190°C/375°F).
 - Specify reduction endpoints (e.g., "reduce by 70% to nappe consistency, 3–5 min").
 - Mandatory poultry safety: 74°C/165°F internal; rest times stated.
-- Return ONLY valid JSON matching the schema.
+- Return ONLY valid JSON matching the schema.{quantities_rule}
 
 VALIDATION:
 - Cross-check: every entry in "ingredientsUsed" MUST exist in the provided pantry (case-insensitive). 
@@ -377,7 +946,7 @@ Expected JSON Schema:
       "servings": {servings},
       "ingredientsUsed": ["pantry item 1", "pantry item 2"],
       "missingIngredients": ["professional ingredient 1", "professional ingredient 2"],
-      "nutrition": {{"calories": 420, "protein": "28g", "carbs": "25g", "fat": "18g"}},
+      {nutrition_field}
       "steps": ["Step 1 with precise details", "Step 2 with exact temps"],
       "technique": "professional cooking method",
       "winePariring": "optional wine suggestion"
@@ -447,6 +1016,108 @@ Expected JSON Schema:
             }
         }
 
+def prioritize_expiring(recipe_data, expiring):
+    """Put the recipes that use the most soon-to-expire pantry items first."""
+    if not expiring or not isinstance(recipe_data, dict) or not isinstance(recipe_data.get("recipes"), list):
+        return recipe_data
+    return dict(recipe_data, recipes=expiry.rank_recipes(recipe_data["recipes"], expiry.urgency_weights(expiring)))
+
+def with_nutrition(engine, recipe, servings):
+    """(recipe, per-serving values): computed nutrition when enough ingredients are known, else the recipe's own.
+
+    The recipe gets ``nutritionCoverage``, the share of its weight found in the table.
+    """
+    values, coverage = engine.estimate(recipe, servings)
+    recipe = dict(recipe, nutritionCoverage=round(coverage, 2))
+    if values is not None and coverage >= engine.min_coverage:
+        recipe["nutrition"] = nutrition.format_nutrition(values)
+        return recipe, values
+    return recipe, nutrition.parse_nutrition(recipe.get("nutrition"))
+
+def add_nutrition(recipe_data, servings=2):
+    """Replace each recipe's nutrition with per-serving values computed by the nutrition engine."""
+    if not NUTRITION_ENGINE or not isinstance(recipe_data, dict):
+        return recipe_data
+    with stage("compute_nutrition"):
+        engine = nutrition.default_engine()
+        recipes = recipe_data.get("recipes") if "recipes" in recipe_data else [recipe_data]
+        if not isinstance(recipes, list):
+            return recipe_data
+        computed = [with_nutrition(engine, recipe, servings)[0] if isinstance(recipe, dict) else recipe
+                    for recipe in recipes]
+    if "recipes" in recipe_data:
+        return dict(recipe_data, recipes=computed)
+    return computed[0]
+
+def _expires_in(days_left):
+    days = max(0, int(days_left))
+    return "expires today" if days == 0 else f"expires in {days} day{'s' if days != 1 else ''}"
+
+def build_recipe_prompt(pantry, mode, options, expiring=()):
+    """Build the PantryChef prompt for a pantry and the request's optional settings.
+    
+    ``expiring`` is the [(item, days left)] list from usable_pantry(); those items
+    are annotated in the pantry and listed as "Use first".
+    """
+    # Create pantry list string
+    days_left = {id(item): days for item, days in expiring}
+    pantry_list = ", ".join([
+        f"{item['name']} ({item['quantity']} {item['unit']}; {_expires_in(days_left[id(item)])})"
+        if id(item) in days_left else f"{item['name']} ({item['quantity']} {item['unit']})"
+        for item in pantry
+    ])
+    
+    prompt_builder = generate_professional_mode_prompt if mode == "professional" else generate_home_mode_prompt
+    return prompt_builder(
+        pantry_list=pantry_list,
+        servings=options.get("servings", 2),
+        dietary=options.get("dietary", ""),
+        cuisine=options.get("cuisine", ""),
+        budget=options.get("budget", ""),
+        appliances=options.get("appliances", ""),
+        skill_level=options.get("skill_level", ""),
+        use_first=", ".join(item["name"] for item, _ in expiring),
+        computed_nutrition=NUTRITION_ENGINE
+    )
+
+# Speculative pre-generation of home-mode recipes after pantry changes (opt-in)
+PREGEN_ENABLED = os.getenv("PREGEN_ENABLED", "false").lower() == "true"
+PREGEN_DIR = os.getenv("PREGEN_DIR", "pregen")
+
+def _pregen_generate(prompt, tenant):
+    """Generate in the background client's (low-weight) share of the upstream slots."""
+    with llm_slot(BACKGROUND_CLIENT, cost=home_parameters["max_new_tokens"]), tenant_context(tenant):
+        pantry, expiring = usable_pantry(load_pantry())
+        recipe = call_watsonx(prompt, mode="home", fallback=False,
+                              pantry_names=[item.get("name", "") for item in pantry])
+    return add_nutrition(prioritize_expiring(recipe, expiring))
+
+def _pregen_prepare(tenant):
+    """Prompt and worst-case token cost for a tenant's pantry, or None when there is nothing to generate."""
+    with tenant_context(tenant):
+        pantry, expiring = usable_pantry(load_pantry())
+    if not pantry or not llm_enabled:
+        return None
+    prompt = build_recipe_prompt(pantry, "home", {}, expiring)
+    cost = tracing.estimate_tokens(f"{PANTRYCHEF_SYSTEM_PROMPT}\n\n{prompt}") + home_parameters["max_new_tokens"]
+    return prompt, cost
+
+pregenerator = pregen.PreGenerator(
+    prepare=_pregen_prepare,
+    generate=_pregen_generate,
+    busy=lambda: LLM_INFLIGHT.get() > 0,
+    debounce=float(os.getenv("PREGEN_DEBOUNCE_SECONDS", "5")),
+    max_per_hour=int(os.getenv("PREGEN_MAX_PER_HOUR", "20")),
+    token_budget_per_hour=int(os.getenv("PREGEN_TOKEN_BUDGET_PER_HOUR", "100000")),
+    ttl=float(os.getenv("PREGEN_TTL_SECONDS", "3600")),
+    on_outcome=lambda outcome: PREGEN_RUNS.labels(outcome).inc(),
+    # Shared by all workers: the request often lands on another worker than the pantry edit
+    results=pregen.FileResults(PREGEN_DIR, ttl=float(os.getenv("PREGEN_TTL_SECONDS", "3600")),
+                               default_subject=DEFAULT_TENANT),
+    # ...and so is the hourly budget, which would otherwise be granted once per worker
+    ledger=pregen.FileLedger(os.path.join(PREGEN_DIR, "_spent.json"))
+) if PREGEN_ENABLED else None
+
 def generate_meal_plan_mock(ingredients, cooking_mode):
     """Generate mock meal plan data."""
     ingredients_list = [item.get('name', '') for item in ingredients[:3]]
@@ -575,12 +1246,152 @@ def generate_meal_plan_mock(ingredients, cooking_mode):
             }
         ]
 
+def warm_up_watsonx(wait_for_port=None, timeout=30.0):
+    """Initialize Watsonx in a background thread, optionally once the server accepts connections."""
+    if not watsonx_configured or os.getenv("WATSONX_WARMUP", "true").lower() != "true":
+        return None
+
+    def warm_up():
+        if wait_for_port:
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                try:
+                    socket.create_connection(wait_for_port, timeout=0.5).close()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        if not init_watsonx():
+            return
+        for model in filter(None, (model_id, alternate_model_id)):
+            for params in (home_parameters, professional_parameters):
+                try:
+                    get_watsonx_model(model, params)
+                except Exception as e:
+                    logger.warning(f"⚠️ Watsonx warm-up failed for {model}: {str(e)}")
+                    return
+        logger.info("🔥 Watsonx warm-up complete")
+
+    thread = threading.Thread(target=warm_up, name="watsonx-warmup", daemon=True)
+    thread.start()
+    return thread
+
+# Work done once before serving. Under gunicorn (preload_app) this runs before the
+# workers fork, so the warmed caches are shared copy-on-write like the module-level
+# prompt templates and fallback catalogs.
+preload_hooks = []
+
+def preload_hook(func):
+    """Register a function to run from preload()."""
+    preload_hooks.append(func)
+    return func
+
+@preload_hook
+def _preload_pantry():
+    load_pantry()
+
+@preload_hook
+def _preload_nutrition():
+    if NUTRITION_ENGINE:
+        nutrition.default_engine()
+
+@preload_hook
+def _preload_recipe_index():
+    backfill_recipe_index()
+
+@preload_hook
+def _preload_recipe_cache():
+    if RECIPE_CACHE_ENABLED:
+        load_recipe_cache()
+
+def preload():
+    """Run every preload hook, logging how long each took."""
+    for hook in preload_hooks:
+        start = time.perf_counter()
+        try:
+            hook()
+            logger.info(f"Preloaded {hook.__name__.lstrip('_')} in {time.perf_counter() - start:.3f}s")
+        except Exception as e:
+            logger.error(f"Preload {hook.__name__} failed: {str(e)}")
+
+def shutdown():
+    """Flush pending recipe writes, queued traces and shared metrics; called when a worker stops."""
+    storage.flush_all()
+    tracing.flush()
+    if shared_metrics is not None:
+        shared_metrics.write()
+    logger.info("👋 Pending writes flushed")
+
 # API Endpoints
 
+def _endpoint_name():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    g.trace_span = tracing.start_trace(f"{request.method} {_endpoint_name()}", **{
+        "http.method": request.method,
+        "http.route": _endpoint_name(),
+        "http.request_content_length": request.content_length or 0
+    })
+    if slow_request_profiler:
+        g.profile_session = slow_request_profiler.start(f"{request.method}{_endpoint_name()}")
+
+@app.after_request
+def _record_request_metrics(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        HTTP_REQUEST_SECONDS.labels(_endpoint_name(), request.method, response.status_code).observe(
+            time.perf_counter() - start)
+    trace_span = g.get("trace_span")
+    if trace_span is not None:
+        trace_span.set_attributes({
+            "http.status_code": response.status_code,
+            "http.response_content_length": response.calculate_content_length() or 0
+        })
+    return response
+
+@app.teardown_request
+def _finish_request_trace(error=None):
+    session = g.pop("profile_session", None)
+    trace_span = g.pop("trace_span", None)
+    profile_path = slow_request_profiler.finish(session) if session else None
+    if trace_span is not None:
+        if profile_path:
+            trace_span.set_attribute("profile.path", profile_path)
+        if error is not None:
+            trace_span.record_error(error)
+        trace_span.end()
+
+@app.before_request
+def _select_tenant():
+    tenant = request.headers.get("X-Tenant-ID", "").strip() or DEFAULT_TENANT
+    if not storage.valid_tenant(tenant):
+        return jsonify({"success": False, "error": "Invalid X-Tenant-ID (letters, digits, '.', '_' and '-', up to 64)"}), 400
+    current_tenant.set(tenant)
+    g.trace_span.set_attribute("tenant", tenant)
+
+# Registered after the hooks above so it runs before them (after_request runs in
+# reverse order) and the recorded latency and sizes include compression.
+compression.init_app(app)
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Metrics in Prometheus text exposition format."""
+    registry = shared_metrics if shared_metrics is not None else metrics.REGISTRY
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/api/health", methods=["GET"])
 def health():
     """Health check endpoint."""
-    watsonx_status = "connected" if credentials else "not configured"
+    if LLM_OFFLINE:
+        watsonx_status = f"offline ({LLM_BACKEND})"
+    elif credentials:
+        watsonx_status = "connected"
+    elif watsonx_configured and not _watsonx_init_failed:
+        watsonx_status = "configured"
+    else:
+        watsonx_status = "not configured"
     return jsonify({
         "status": "ok", 
         "message": "Flask backend running",
@@ -588,6 +1399,18 @@ def health():
         "timestamp": datetime.now().isoformat()
     })
 
+@app.route("/api/models/stats", methods=["GET"])
+def model_stats():
+    """Per-model latency and success stats plus the active routing strategies."""
+    return jsonify({
+        "success": True,
+        "primaryModel": model_router.primary_model,
+        "alternateModel": model_router.alternate_model,
+        "strategies": routing_strategies,
+        "hedgeDelaySeconds": round(model_router.hedge_delay(), 3),
+        "models": model_router.stats()
+    })
+
 @app.route("/api/pantry", methods=["GET"])
 def get_pantry():
     """Get all pantry items."""
@@ -620,7 +1443,10 @@ def add_pantry_item():
         unit = (data.get("unit") or "units").strip()
         category = (data.get("category") or "").strip()
         
-        pantry = load_pantry()
+        try:
+            expires_at = expiry.parse_expiry(data.get("expiresAt"))
+        except (ValueError, TypeError):
+            return jsonify({"success": False, "error": "Invalid expiresAt date (use YYYY-MM-DD or an ISO datetime)"}), 400
         
         # Generate timestamp-based ID like your existing data
         new_id = str(int(datetime.now().timestamp() * 1000))
@@ -635,9 +1461,11 @@ def add_pantry_item():
             "createdAt": datetime.now().isoformat(),
             "updatedAt": datetime.now().isoformat()
         }
+        if expires_at:
+            set_item_expiry(new_item, expires_at)
         
-        pantry.append(new_item)
-        save_pantry(pantry)
+        with pantry_transaction() as pantry:
+            pantry.append(new_item)
         
         logger.info(f"Added item to pantry: {name} ({quantity} {unit})")
         return jsonify({"success": True, "message": f"{name} added successfully!", "pantry": pantry})
@@ -646,13 +1474,31 @@ def add_pantry_item():
         logger.error(f"Error adding pantry item: {str(e)}")
         return jsonify({"success": False, "error": "Failed to add item"}), 500
 
+@app.route("/api/pantry/expiring", methods=["GET"])
+def get_expiring_items():
+    """Items expiring within ?days= days (default EXPIRY_SOON_DAYS), soonest first, and spoiled items."""
+    try:
+        days = float(request.args.get("days", EXPIRY_SOON_DAYS))
+    except ValueError:
+        return jsonify({"success": False, "error": "days must be a number"}), 400
+    if not math.isfinite(days) or days < 0:
+        return jsonify({"success": False, "error": "days must be a non-negative number"}), 400
+    try:
+        now = time.time()
+        index = expiry_index(load_pantry())
+        expiring = [dict(item, daysLeft=round(days_left, 2))
+                    for item, days_left in index.expiring_within(days, now) if not item.get("spoiled")]
+        return jsonify({"success": True, "days": days, "expiring": expiring, "spoiled": index.expired(now)})
+    except Exception as e:
+        logger.error(f"Error fetching expiring pantry items: {str(e)}")
+        return jsonify({"success": False, "error": "Failed to fetch expiring items"}), 500
+
 @app.route("/api/pantry/delete/<item_id>", methods=["DELETE"])
 def delete_pantry_item(item_id):
     """Delete pantry item."""
     try:
-        pantry = load_pantry()
-        pantry = [item for item in pantry if item.get("id") != item_id]
-        save_pantry(pantry)
+        with pantry_transaction() as pantry:
+            pantry[:] = [item for item in pantry if item.get("id") != item_id]
         return jsonify({"success": True, "message": "Item deleted successfully"})
     except Exception as e:
         logger.error(f"Error deleting pantry item: {str(e)}")
@@ -663,22 +1509,27 @@ def update_pantry_item(item_id):
     """Update pantry item."""
     try:
         data = request.json or {}
-        pantry = load_pantry()
+        if "expiresAt" in data:
+            try:
+                expires_at = expiry.parse_expiry(data["expiresAt"])
+            except (ValueError, TypeError):
+                return jsonify({"success": False, "error": "Invalid expiresAt date (use YYYY-MM-DD or an ISO datetime)"}), 400
         
-        for item in pantry:
-            if item.get("id") == item_id:
-                if "quantity" in data:
-                    item["quantity"] = float(data["quantity"])
-                if "unit" in data:
-                    item["unit"] = data["unit"]
-                if "name" in data:
-                    item["name"] = data["name"]
-                if "category" in data:
-                    item["category"] = data["category"]
-                item["updatedAt"] = datetime.now().isoformat()
-                break
-        
-        save_pantry(pantry)
+        with pantry_transaction() as pantry:
+            for item in pantry:
+                if item.get("id") == item_id:
+                    if "quantity" in data:
+                        item["quantity"] = float(data["quantity"])
+                    if "unit" in data:
+                        item["unit"] = data["unit"]
+                    if "name" in data:
+                        item["name"] = data["name"]
+                    if "category" in data:
+                        item["category"] = data["category"]
+                    if "expiresAt" in data:
+                        set_item_expiry(item, expires_at)
+                    item["updatedAt"] = datetime.now().isoformat()
+                    break
         return jsonify({"success": True, "message": "Item updated successfully"})
     except Exception as e:
         logger.error(f"Error updating pantry item: {str(e)}")
@@ -689,7 +1540,7 @@ def generate_recipe():
     """Generate a single recipe using PantryChef system."""
     data = request.json or {}
     mode = data.get("mode", "home")
-    pantry = load_pantry()
+    pantry, expiring = usable_pantry(load_pantry())
     
     if not pantry:
         return jsonify({
@@ -697,37 +1548,72 @@ def generate_recipe():
             "error": "No pantry items found. Please add some ingredients first."
         }), 400
     
+    pantry_names = [item.get("name", "") for item in pantry]
+    options = recipe_cache.request_options(data)
+    
     try:
-        # Create pantry list string
-        pantry_list = ", ".join([f"{item['name']} ({item['quantity']} {item['unit']})" for item in pantry])
-        
         # Generate appropriate prompt based on mode
-        if mode == "professional":
-            prompt = generate_professional_mode_prompt(
-                pantry_list=pantry_list,
-                servings=data.get("servings", 2),
-                dietary=data.get("dietary", ""),
-                cuisine=data.get("cuisine", ""),
-                budget=data.get("budget", ""),
-                appliances=data.get("appliances", ""),
-                skill_level=data.get("skill_level", "")
-            )
-        else:
-            prompt = generate_home_mode_prompt(
-                pantry_list=pantry_list,
-                servings=data.get("servings", 2),
-                dietary=data.get("dietary", ""),
-                cuisine=data.get("cuisine", ""),
-                budget=data.get("budget", ""),
-                appliances=data.get("appliances", ""),
-                skill_level=data.get("skill_level", "")
-            )
+        with stage("build_prompt") as span:
+            prompt = build_recipe_prompt(pantry, mode, data, expiring)
+            span.set_attributes({
+                "prompt.bytes": len(prompt.encode("utf-8")),
+                "prompt.tokens_estimate": tracing.estimate_tokens(prompt)
+            })
+        
+        # Recipes pre-generated in the background since the last pantry change
+        if pregenerator is not None and mode == "home" and not data.get("fresh"):
+            recipe = pregenerator.take(pregen.prompt_key(prompt), current_tenant.get())
+            PREGEN_LOOKUPS.labels("hit" if recipe else "miss").inc()
+            if recipe:
+                save_recipe(recipe, mode, pantry_names, options)
+                logger.info("Served pre-generated recipes in home mode")
+                return jsonify({
+                    "success": True,
+                    "data": recipe,
+                    "mode": mode,
+                    "pregenerated": True
+                })
         
-        # Call Watsonx with appropriate mode parameters
-        recipe = call_watsonx(prompt, mode=mode)
+        # Recipes generated for a similar pantry are reused while enough of them still fit
+        if RECIPE_CACHE_ENABLED and not data.get("fresh"):
+            cached = lookup_similar_recipes(pantry_names, mode, options)
+            if cached:
+                cached = prioritize_expiring(cached, expiring)
+                logger.info(f"Served {len(cached['recipes'])} cached recipe(s) in {mode} mode "
+                            f"(coverage {cached['coverage']:.0%})")
+                return jsonify({
+                    "success": True,
+                    "data": cached,
+                    "mode": mode,
+                    "cached": True
+                })
+        
+        # Only calls that reach the model count against the client's rate limit (not the
+        # pre-generated, cached or not-configured fallback answers)
+        client = client_id()
+        if llm_enabled:
+            allowed, retry_after = rate_limiter.check(client, mode)
+            if not allowed:
+                RATE_LIMITED.labels(mode, "rate_limit").inc()
+                logger.warning(f"Rate limit exceeded for {client} in {mode} mode")
+                return too_many_requests(retry_after, f"Too many recipe requests in {mode} mode. Please try again later.")
+        
+        # Call Watsonx with appropriate mode parameters, in a fairly shared upstream slot
+        cost = (professional_parameters if mode == "professional" else home_parameters)["max_new_tokens"]
+        try:
+            with (llm_slot(client, cost=cost, timeout=LLM_QUEUE_TIMEOUT) if llm_enabled
+                  else nullcontext()) as waited:
+                if waited is not None:
+                    LLM_QUEUE_SECONDS.observe(waited)
+                recipe = prioritize_expiring(call_watsonx(prompt, mode=mode, pantry_names=pantry_names), expiring)
+            recipe = add_nutrition(recipe, options.get("servings", 2))
+        except rate_limit.QueueTimeout as e:
+            RATE_LIMITED.labels(mode, "queue_timeout").inc()
+            logger.warning(str(e))
+            return too_many_requests(LLM_QUEUE_TIMEOUT / 2, "Recipe generation is busy. Please try again shortly.", 503)
         
         if recipe and ("recipes" in recipe or "title" in recipe):
-            save_recipe(recipe, mode)
+            save_recipe(recipe, mode, pantry_names, options)
             logger.info(f"Successfully generated recipe in {mode} mode")
             return jsonify({
                 "success": True,
@@ -748,13 +1634,70 @@ def generate_recipe():
             "error": str(e)
         }), 500
 
+@app.route("/api/recipes/search", methods=["GET"])
+def search_recipes():
+    """Search saved recipes by text and facets, one page at a time."""
+    args = request.args
+    try:
+        def number(name):
+            value = args.get(name)
+            return float(value) if value not in (None, "") else None
+
+        with stage("search_recipes") as span:
+            result = recipe_search.search(
+                text=args.get("q", ""),
+                mode=args.get("mode") or None,
+                technique=args.get("technique") or None,
+                ingredients=args.getlist("ingredient"),
+                cook_time_min=number("cookTimeMin"),
+                cook_time_max=number("cookTimeMax"),
+                ranges={name: (number(f"min{name.title()}"), number(f"max{name.title()}"))
+                        for name in recipe_index.NUTRIENTS},
+                page=int(args.get("page", 1)),
+                page_size=int(args.get("pageSize", 20)),
+                sort=args.get("sort") or None,
+                facets=args.get("facets", "false").lower() == "true",
+                tenant=current_tenant.get()
+            )
+            span.set_attribute("search.results", len(result["results"]))
+        return jsonify({"success": True, **result})
+    except ValueError as e:
+        return jsonify({"success": False, "error": f"Invalid search parameter: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Error searching recipes: {str(e)}")
+        return jsonify({"success": False, "error": "Failed to search recipes"}), 500
+
+@stage("plan_nutrition")
+def plan_meal_nutrition(meals, data):
+    """Per-serving nutrition for each meal; with "targets" ({"calories": 2000, "protein": 120, ...}),
+    pick "mealsPerDay" meals and portions whose totals come closest to them."""
+    engine = nutrition.default_engine()
+    servings = data.get("servings", 2)
+    meals, vectors = zip(*(with_nutrition(engine, meal, servings) for meal in meals)) if meals else ((), ())
+    meals, vectors = list(meals), [vector or (0.0,) * len(nutrition.NUTRIENTS) for vector in vectors]
+    targets = data.get("targets")
+    if not targets:
+        return meals, {}
+    if not isinstance(targets, dict):
+        raise ValueError("targets must be an object")
+    targets = {name: float(targets[name]) for name in nutrition.NUTRIENTS if targets.get(name) not in (None, "")}
+    slots = int(data.get("mealsPerDay", len(meals)))
+    if slots < 1:
+        raise ValueError("mealsPerDay must be at least 1")
+    plan, totals = nutrition.plan_day(vectors, targets, slots)
+    return [dict(meals[meal], portions=portions) for meal, portions in plan], {
+        "targets": targets,
+        "totals": nutrition.format_nutrition(totals)
+    }
+
 @app.route("/api/meal-plan", methods=["POST"])
 def generate_meal_plan():
     """Generate meal plan with multiple recipes."""
     data = request.json or {}
     cooking_mode = data.get("cookingMode", "home")
     
-    pantry = load_pantry()
+    # Soon-to-expire items come first, so the plan is built around them
+    pantry, _ = usable_pantry(load_pantry())
     
     if not pantry:
         return jsonify({
@@ -765,6 +1708,14 @@ def generate_meal_plan():
     # Generate meals using mock data (which includes detailed recipes)
     meals = generate_meal_plan_mock(pantry, cooking_mode)
     
+    # Computed nutrition, and portions fitted to daily macro targets when given
+    plan_nutrition = {}
+    if NUTRITION_ENGINE:
+        try:
+            meals, plan_nutrition = plan_meal_nutrition(meals, data)
+        except (TypeError, ValueError) as e:
+            return jsonify({"success": False, "error": f"Invalid nutrition targets: {str(e)}"}), 400
+    
     # Extract shopping list from all meals
     shopping_list = []
     for meal in meals:
@@ -781,7 +1732,8 @@ def generate_meal_plan():
         "success": True,
         "data": {
             "meals": meals,
-            "shoppingList": shopping_list_formatted
+            "shoppingList": shopping_list_formatted,
+            **plan_nutrition
         },
         "mode": cooking_mode,
         "note": f"Generated using {cooking_mode} cooking mode with detailed recipes"
@@ -801,4 +1753,8 @@ if __name__ == "__main__":
     logger.info("🏠 Home mode includes 6-8 simple recipe steps")
     logger.info("🌐 Server starting at http://127.0.0.1:5000")
     
+    # With the reloader on, only the serving child process should start background work.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_up_watsonx(wait_for_port=("127.0.0.1", 5000))
+        start_expiry_sweeper()
     app.run(debug=True, host="127.0.0.1", port=5000)
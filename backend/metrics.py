@@ -0,0 +1,464 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms with optional labels, kept in a registry and
+rendered for ``GET /metrics``. Each labelled child has its own lock and the
+label lookup is a single dict access, so recording a sample costs about a
+microsecond and the metrics can stay on in production.
+
+Under several worker processes a scrape reaches only one of them, so
+``SharedMetrics`` (in the spirit of prometheus_client's multiprocess mode) has
+every worker write a snapshot of its registry to ``directory/<pid>.json``
+every few seconds, and renders the merge of all snapshots: counters and
+histograms are summed, gauges summed over live workers ("livesum") or taken
+from the worker that set them last ("latest"). When a worker exits its
+counters and histograms move into ``directory/_dead.json``, so totals never
+go backwards across worker restarts.
+"""
+
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_string(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Registry:
+    """Holds metrics and renders them in text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def dump(self):
+        """JSON-serializable snapshot of every metric, in registration order."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.dump() for metric in metrics}
+
+    def render(self):
+        return render(self.dump())
+
+    def reset(self):
+        """Zero every counter and histogram; gauges keep their values."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            for _, child in metric._items():
+                child.reset()
+
+
+REGISTRY = Registry()
+
+
+def _samples(name, metric):
+    labelnames = metric["labelnames"]
+    for key, value in metric["children"]:
+        if metric["type"] == "histogram":
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + [math.inf], counts):
+                cumulative += count
+                labels = _label_string(labelnames, key, ("le", _format_value(bound)))
+                yield f"{name}_bucket{labels} {cumulative}"
+            labels = _label_string(labelnames, key)
+            yield f"{name}_sum{labels} {_format_value(total)}"
+            yield f"{name}_count{labels} {cumulative}"
+        else:
+            value = value[0] if metric["type"] == "gauge" else value
+            yield f"{name}{_label_string(labelnames, key)} {_format_value(value)}"
+
+
+def render(snapshot):
+    """Text exposition format for a ``Registry.dump()`` (or a merge of several)."""
+    lines = []
+    for name, metric in snapshot.items():
+        lines.append(f"# HELP {name} {metric['documentation']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        lines.extend(_samples(name, metric))
+    return "\n".join(lines) + "\n"
+
+
+def _combine(metric, a, b):
+    if metric["type"] == "counter":
+        return a + b
+    if metric["type"] == "histogram":
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1]]
+    if metric.get("mode") == "latest":
+        return a if a[1] >= b[1] else b
+    return [a[0] + b[0], max(a[1], b[1])]
+
+
+def merge(snapshots):
+    """One snapshot combining the snapshots of several processes."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, dict(metric, children={}))
+            for key, value in metric["children"]:
+                key = tuple(key)
+                current = target["children"].get(key)
+                target["children"][key] = value if current is None else _combine(metric, current, value)
+    for metric in merged.values():
+        metric["children"] = [[list(key), value] for key, value in metric["children"].items()]
+    return merged
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._children_lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values, **labels):
+        """Return the child for one label combination, creating it on first use."""
+        key = values if values else tuple(labels[name] for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._children_lock:
+                child = self._children.setdefault(tuple(str(v) for v in key), self._new_child())
+                self._children[key] = child
+        return child
+
+    def _items(self):
+        with self._children_lock:
+            items = list(self._children.items())
+        seen = set()
+        for key, child in items:
+            if id(child) not in seen:
+                seen.add(id(child))
+                yield tuple(str(v) for v in key), child
+
+    def dump(self):
+        return {"type": self.type, "documentation": self.documentation, "labelnames": list(self.labelnames),
+                "children": [[list(key), self._dump_child(child)] for key, child in self._items()]}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _dump_child(self, child):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self._value += amount
+
+    def get(self):
+        return self._value
+
+    def reset(self):
+        with self._lock:
+            self._value = 0.0
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _dump_child(self, child):
+        return child.get()
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0.0
+        self._updated = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value):
+        self._value = float(value)
+        self._updated = time.time()
+
+    def get(self):
+        return self._value
+
+    def track_inprogress(self):
+        """Context manager / decorator that counts the calls currently inside it."""
+        return _InProgress(self)
+
+    def reset(self):
+        pass
+
+
+class Gauge(_Metric):
+    """``multiprocess_mode`` says how ``SharedMetrics`` merges workers: "livesum" or "latest" (last set)."""
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), multiprocess_mode="livesum", registry=REGISTRY):
+        if multiprocess_mode not in ("livesum", "latest"):
+            raise ValueError(f"Unknown multiprocess_mode: {multiprocess_mode}")
+        self.multiprocess_mode = multiprocess_mode
+        super().__init__(name, documentation, labelnames, registry)
+
+    def dump(self):
+        return dict(super().dump(), mode=self.multiprocess_mode)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def get(self):
+        return self._default.get()
+
+    def track_inprogress(self):
+        return self._default.track_inprogress()
+
+    def _dump_child(self, child):
+        return [child.get(), child._updated]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._upper_bounds = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self):
+        """Context manager / decorator that observes the elapsed wall time in seconds."""
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * len(self._counts)
+            self._sum = 0.0
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def dump(self):
+        return dict(super().dump(), buckets=list(self.buckets))
+
+    def _dump_child(self, child):
+        counts, total = child.snapshot()
+        return [counts, total]
+
+
+class _Timer:
+    def __init__(self, child):
+        self._child = child
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self._child):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class _InProgress:
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._child.inc()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.dec()
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class SharedMetrics:
+    """A registry's metrics merged across the worker processes sharing ``directory``."""
+
+    DEAD = "_dead.json"
+
+    def __init__(self, directory, registry=REGISTRY, interval=5.0):
+        self.directory = directory
+        self.registry = registry
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+        # Held while reading the snapshots and while moving a dead worker's, so a scrape never counts it twice
+        self.lock = storage.FileLock(os.path.join(directory, self.DEAD))
+        self._thread = None
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def _read(self, path):
+        try:
+            return storage.read_json(path)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading metrics snapshot {path}: {str(e)}")
+            return {}
+
+    def write(self):
+        """Write this process's snapshot."""
+        storage.atomic_write_json(self._path(os.getpid()), self.registry.dump())
+
+    def start(self):
+        """Write the snapshot every ``interval`` seconds (after forking: from post_worker_init).
+
+        Counts inherited from the parent are dropped first; ``clear()`` already keeps them.
+        """
+        if self._thread is None:
+            self.registry.reset()
+            self.write()
+            self._thread = threading.Thread(target=self._write_loop, name="metrics-writer", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def _write_loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.write()
+            except Exception as e:
+                logger.error(f"Error writing metrics snapshot: {str(e)}")
+
+    def collect(self):
+        """The merged snapshot of every worker, this one up to date."""
+        with self.lock.hold():
+            names = sorted(name for name in os.listdir(self.directory)
+                           if name.endswith(".json") and not name.startswith("."))
+            snapshots = [self._read(os.path.join(self.directory, name)) for name in names]
+        # This process's registry goes first, so the output keeps its metric order
+        return merge([self.registry.dump()] + [s for name, s in zip(names, snapshots)
+                                               if name != f"{os.getpid()}.json"])
+
+    def render(self):
+        return render(self.collect())
+
+    def mark_dead(self, pid):
+        """Fold an exited worker's counters and histograms into the dead total; its gauges go away."""
+        path = self._path(pid)
+        if not os.path.exists(path):
+            return
+        with self.lock.hold():
+            dead = self._read(path)
+            totals = merge([self._read(os.path.join(self.directory, self.DEAD)),
+                            {name: metric for name, metric in dead.items() if metric["type"] != "gauge"}])
+            storage.atomic_write_json(os.path.join(self.directory, self.DEAD), totals)
+            os.remove(path)
+
+    def clear(self):
+        """Start afresh before the workers fork: drop the snapshots of an earlier run and keep
+        this process's counts (e.g. from preloading) as the total the workers add to."""
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.directory, name))
+        self.write()
+        self.mark_dead(os.getpid())
@@ -0,0 +1,250 @@
+"""
+Model routing for Watsonx text generation.
+
+Wraps a single ``backend(model_id, prompt, params) -> str`` callable and keeps
+rolling latency / success stats per model. On top of that it offers three
+strategies so each endpoint can trade quality for latency:
+
+- ``primary``:    call the primary model only (the original behaviour)
+- ``hedged``:     call the primary model; if it has not answered within its
+                  p95 latency, fire the same prompt at the alternate model and
+                  keep whichever returns valid JSON first
+- ``fast_first``: call the alternate (fast) model first and only go to the
+                  primary model when the fast answer is unusable
+
+Calls made with a ``label`` (e.g. "repair") are recorded under
+``"<model>:<label>"``, so they show up in the stats without moving the
+latency percentiles the hedge delay is based on. Size the executor at twice
+the number of concurrent calls: a hedged call occupies two threads.
+
+A hedge is an extra upstream call. With ``hedge_slot(params)`` the router asks
+for a slot before firing it (a release callable, or None when none is free, in
+which case it keeps waiting on the primary) and releases it once both calls
+have finished, including a loser still running after the winner returned.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("primary", "hedged", "fast_first")
+
+RouterResult = namedtuple("RouterResult", ["text", "data", "model_id"])
+
+
+def parse_json_response(text):
+    """Default validator: the response must be a JSON document."""
+    return json.loads(text)
+
+
+class ModelStats:
+    """Rolling latency window and outcome counters for one model."""
+
+    def __init__(self, window=200):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.successes = 0
+        self.invalid = 0
+        self.errors = 0
+        self.hedge_wins = 0
+
+    def record(self, latency, outcome):
+        with self._lock:
+            self.calls += 1
+            self._latencies.append(latency)
+            if outcome == "success":
+                self.successes += 1
+            elif outcome == "invalid":
+                self.invalid += 1
+            else:
+                self.errors += 1
+
+    def record_hedge_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def percentile(self, q):
+        """Return the q-quantile (0..1) of recent latencies, or None without samples."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q * (len(samples) - 1))))
+        return samples[index]
+
+    def sample_count(self):
+        with self._lock:
+            return len(self._latencies)
+
+    def snapshot(self):
+        p50 = self.percentile(0.50)
+        p95 = self.percentile(0.95)
+        with self._lock:
+            calls = self.calls
+            return {
+                "calls": calls,
+                "successes": self.successes,
+                "invalid": self.invalid,
+                "errors": self.errors,
+                "hedgeWins": self.hedge_wins,
+                "successRate": round(self.successes / calls, 4) if calls else None,
+                "p50Seconds": round(p50, 3) if p50 is not None else None,
+                "p95Seconds": round(p95, 3) if p95 is not None else None,
+            }
+
+
+def _release_when_done(futures, release):
+    """Call ``release()`` once every future has finished or been cancelled."""
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            release()
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+class ModelRouter:
+    """Dispatch generation calls to one or two models according to a strategy."""
+
+    def __init__(self, backend, primary_model, alternate_model=None,
+                 hedge_percentile=0.95, hedge_min_delay=2.0, hedge_default_delay=15.0,
+                 min_samples=20, validator=parse_json_response, max_workers=8, hedge_slot=None):
+        self.backend = backend
+        self.primary_model = primary_model
+        self.alternate_model = alternate_model or None
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.min_samples = min_samples
+        self.validator = validator
+        self.hedge_slot = hedge_slot
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    def stats_for(self, model_id):
+        with self._stats_lock:
+            stats = self._stats.get(model_id)
+            if stats is None:
+                stats = self._stats[model_id] = ModelStats()
+            return stats
+
+    def stats(self):
+        with self._stats_lock:
+            models = list(self._stats)
+        return {model: self.stats_for(model).snapshot() for model in models}
+
+    def hedge_delay(self):
+        """Seconds to wait on the primary model before firing the hedge request."""
+        stats = self.stats_for(self.primary_model)
+        if stats.sample_count() < self.min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, stats.percentile(self.hedge_percentile))
+
+    def generate(self, prompt, params, strategy="primary", label=None):
+        """Generate text and return a RouterResult.
+
+        ``data`` holds the validated payload, or None when no model produced
+        valid JSON (``text`` then carries the first raw answer for salvage).
+        Raises the last backend error if every model call failed. With a
+        ``label`` the calls are recorded apart from the models' own stats.
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown routing strategy: {strategy}")
+        if strategy == "primary" or not self.alternate_model:
+            return self._result_or_raise([self._run(self.primary_model, prompt, params, label)])
+        if strategy == "fast_first":
+            return self._fast_first(prompt, params, label)
+        return self._hedged(prompt, params, label)
+
+    def _run(self, model_id, prompt, params, label=None, started=None):
+        """Call one model and record its stats. Never raises; returns an attempt tuple."""
+        if started is not None:
+            started.set()
+        stats = self.stats_for(f"{model_id}:{label}" if label else model_id)
+        start = time.perf_counter()
+        try:
+            text = self.backend(model_id, prompt, params)
+        except Exception as e:
+            stats.record(time.perf_counter() - start, "error")
+            logger.error(f"Model {model_id} call failed: {str(e)}")
+            return model_id, None, None, e
+        elapsed = time.perf_counter() - start
+        try:
+            data = self.validator(text)
+        except (ValueError, TypeError):
+            stats.record(elapsed, "invalid")
+            return model_id, text, None, None
+        stats.record(elapsed, "success")
+        return model_id, text, data, None
+
+    def _submit(self, model_id, prompt, params, label=None, started=None):
+        # Copy the caller's context so tracing spans nest under the request.
+        return self._executor.submit(contextvars.copy_context().run, self._run, model_id, prompt, params, label,
+                                     started)
+
+    def _result_or_raise(self, attempts):
+        for model_id, text, data, _ in attempts:
+            if data is not None:
+                return RouterResult(text, data, model_id)
+        for model_id, text, _, _ in attempts:
+            if text is not None:
+                return RouterResult(text, None, model_id)
+        raise attempts[-1][3]
+
+    def _fast_first(self, prompt, params, label=None):
+        fast = self._run(self.alternate_model, prompt, params, label)
+        if fast[2] is not None:
+            return RouterResult(fast[1], fast[2], fast[0])
+        logger.info(f"Fast model {self.alternate_model} unusable, falling back to {self.primary_model}")
+        return self._result_or_raise([self._run(self.primary_model, prompt, params, label), fast])
+
+    def _hedged(self, prompt, params, label=None):
+        started = threading.Event()
+        primary = self._submit(self.primary_model, prompt, params, label, started)
+        # The hedge delay is measured from the call's dispatch, not from when it was queued.
+        started.wait()
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done and primary.result()[2] is not None:
+            return self._result_or_raise([primary.result()])
+
+        release = None
+        if self.hedge_slot is not None:
+            release = self.hedge_slot(params)
+            if release is None:
+                logger.info(f"No free upstream slot to hedge {self.primary_model}, waiting on it")
+                return self._result_or_raise([primary.result()])
+        logger.info(f"Hedging {self.primary_model} with {self.alternate_model}")
+        pending = {primary, self._submit(self.alternate_model, prompt, params, label)}
+        if release is not None:
+            _release_when_done(pending, release)
+        attempts = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                attempt = future.result()
+                attempts.append(attempt)
+                if attempt[2] is not None:
+                    # The loser cannot be interrupted mid-request; cancel it if it has not
+                    # started and otherwise let it finish in the background unobserved.
+                    for loser in pending:
+                        loser.cancel()
+                    if attempt[0] == self.alternate_model:
+                        self.stats_for(attempt[0]).record_hedge_win()
+                    return RouterResult(attempt[1], attempt[2], attempt[0])
+        # Neither model produced valid JSON: prefer the primary model's raw text for salvage.
+        attempts.sort(key=lambda attempt: attempt[0] != self.primary_model)
+        return self._result_or_raise(attempts)
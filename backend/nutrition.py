@@ -0,0 +1,331 @@
+"""
+Local nutrition engine: per-serving macros from recipe ingredients.
+
+The bundled table (nutrients.csv: kcal and grams of protein, carbs and fat per
+100 g, plus a typical serving, the weight of one piece and the density for
+volume units) is held column-wise in ``array('d')`` columns: one contiguous
+block of doubles per nutrient instead of a dict per ingredient. A recipe is
+reduced to (table row, grams) pairs and each nutrient total is one
+``sum(map(mul, ...))`` over its column, so the inner loop runs in C.
+
+Ingredient amounts come from a recipe's structured ``quantities`` when the
+model provided them, otherwise they are parsed from the ingredient strings
+("200 g rice", "2 tbsp olive oil", "rice (1.5 kg)"). Ingredients without an
+amount count as the table's typical serving per person. Results are cached by
+the recipe's (name, amount, unit) tuple and servings, so re-scoring the same
+recipes - e.g. inside ``plan_day`` - never re-parses them.
+
+An estimate is only as good as the share of ingredients found in the table, so
+every estimate carries its coverage: the share of the recipe's weight that
+was found, with unknown ingredients weighed from their unit or, without one,
+as ``UNKNOWN_SERVING_G`` per person. Estimates are used only at ``min_coverage``
+(``NUTRITION_MIN_COVERAGE``, default 0.8) or above; below it callers keep the
+recipe's own values.
+"""
+
+import csv
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from operator import mul
+
+from recipe_cache import normalize_ingredient
+
+NUTRIENTS = ("calories", "protein", "carbs", "fat")
+TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nutrients.csv")
+PORTIONS = (0.5, 0.75, 1.0, 1.25, 1.5, 2.0)
+MIN_COVERAGE = float(os.getenv("NUTRITION_MIN_COVERAGE", "0.8"))
+UNKNOWN_SERVING_G = 100.0
+
+MASS_UNITS = {"g": 1.0, "gram": 1.0, "kg": 1000.0, "kilogram": 1000.0, "mg": 0.001,
+              "oz": 28.35, "ounce": 28.35, "lb": 453.6, "pound": 453.6}
+VOLUME_UNITS = {"ml": 1.0, "milliliter": 1.0, "l": 1000.0, "liter": 1000.0, "litre": 1000.0,
+                "tsp": 4.93, "teaspoon": 4.93, "tbsp": 14.79, "tablespoon": 14.79, "cup": 240.0,
+                "fl oz": 29.57}
+PIECE_UNITS = {"piece", "pc", "whole", "unit", "clove", "slice", "fillet", "breast", "head", "stalk", "sprig",
+               "leaf", "can", "bunch", "handful", "large", "medium", "small"}
+TRACE_UNITS = {"pinch": 0.36, "dash": 0.6}
+
+_UNIT_WORDS = sorted(set(MASS_UNITS) | set(VOLUME_UNITS) | PIECE_UNITS | set(TRACE_UNITS), key=len, reverse=True)
+_UNIT = r"(?:" + "|".join(re.escape(unit) for unit in _UNIT_WORDS) + r")(?:e?s)?\.?"
+_AMOUNT = r"\d+\s+\d+/\d+|\d+/\d+|\d+(?:[.,]\d+)?"
+_LEADING = re.compile(rf"^\s*(?P<amount>{_AMOUNT})\s*(?:(?P<unit>{_UNIT})\b)?\s*(?:of\s+)?(?P<name>.*)$", re.I)
+_PARENTHESIZED = re.compile(rf"^(?P<name>[^(]+)\(\s*(?P<amount>{_AMOUNT})\s*(?P<unit>[A-Za-z. ]*?)\s*(?:[;,)]|$)")
+
+
+def _number(text):
+    text = text.replace(",", ".").strip()
+    if " " in text:
+        whole, fraction = text.split(None, 1)
+        return float(whole) + _number(fraction)
+    if "/" in text:
+        numerator, denominator = text.split("/", 1)
+        return float(numerator) / float(denominator) if float(denominator) else 0.0
+    return float(text)
+
+
+@lru_cache(maxsize=8192)
+def _canonical_unit(unit):
+    unit = (unit or "").strip().lower().rstrip(".")
+    for candidate in (unit, unit[:-2] if unit.endswith("es") else unit, unit[:-1] if unit.endswith("s") else unit):
+        if candidate in MASS_UNITS or candidate in VOLUME_UNITS or candidate in PIECE_UNITS or candidate in TRACE_UNITS:
+            return candidate
+    return unit
+
+
+@lru_cache(maxsize=8192)
+def parse_ingredient(text):
+    """Split "200 g rice" or "rice (200 g)" into (name, amount or None, unit)."""
+    text = text.split(",")[0].strip()
+    match = _PARENTHESIZED.match(text)
+    if match:
+        return match["name"].strip(), _number(match["amount"]), _canonical_unit(match["unit"])
+    match = _LEADING.match(text)
+    if match and match["name"].strip():
+        return match["name"].strip(), _number(match["amount"]), _canonical_unit(match["unit"])
+    return text, None, ""
+
+
+class NutrientTable:
+    """Per-100 g nutrients and unit conversions for known ingredients, stored column-wise."""
+
+    def __init__(self, rows):
+        self.names = []
+        self.columns = {nutrient: array("d") for nutrient in NUTRIENTS}
+        self.serving_g = array("d")
+        self.piece_g = array("d")
+        self.density = array("d")
+        self._index = {}
+        for row in rows:
+            name = normalize_ingredient(row["name"])
+            if not name or name in self._index:
+                continue
+            self._index[name] = len(self.names)
+            self.names.append(name)
+            for nutrient in NUTRIENTS:
+                self.columns[nutrient].append(float(row[nutrient]))
+            self.serving_g.append(float(row["serving_g"]))
+            self.piece_g.append(float(row["piece_g"]))
+            self.density.append(float(row["density"]) or 1.0)
+        self._lookups = {}
+        self._lookups_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=TABLE_FILE):
+        with open(path, newline="", encoding="utf-8") as f:
+            return cls(csv.DictReader(f))
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, name):
+        """Row for an ingredient name, matching the longest known phrase in it ("extra virgin olive oil"
+        finds "olive oil"), or -1."""
+        row = self._lookups.get(name)
+        if row is None:
+            row = self._match(name)
+            with self._lookups_lock:
+                if len(self._lookups) > 65536:
+                    self._lookups.clear()
+                self._lookups[name] = row
+        return row
+
+    def _match(self, name):
+        words = normalize_ingredient(name).split()
+        for length in range(len(words), 0, -1):
+            # Rightmost phrases first: the head noun of "vegetable broth" is "broth".
+            for start in range(len(words) - length, -1, -1):
+                phrase = normalize_ingredient(" ".join(words[start:start + length]))
+                row = self._index.get(phrase)
+                if row is None and phrase.endswith("ve"):
+                    row = self._index.get(phrase[:-2] + "f")  # leaves -> leaf, halves -> half
+                if row is not None:
+                    return row
+        return -1
+
+    def grams(self, row, amount, unit, servings):
+        """Weight in grams of ``amount`` ``unit`` of the ingredient in ``row``."""
+        if amount is None:
+            return self.serving_g[row] * servings
+        if unit in MASS_UNITS:
+            return amount * MASS_UNITS[unit]
+        if unit in VOLUME_UNITS:
+            return amount * VOLUME_UNITS[unit] * self.density[row]
+        if unit in TRACE_UNITS:
+            return amount * TRACE_UNITS[unit]
+        # Pieces, or a bare count ("2 eggs"): by piece weight when known, else a serving per piece.
+        return amount * (self.piece_g[row] or self.serving_g[row])
+
+    def totals(self, rows, grams):
+        """Nutrient totals for parallel sequences of table rows and grams."""
+        scale = [g / 100.0 for g in grams]
+        return tuple(sum(map(mul, map(self.columns[nutrient].__getitem__, rows), scale)) for nutrient in NUTRIENTS)
+
+
+def unknown_grams(amount, unit, servings):
+    """Rough weight of an ingredient missing from the table, for coverage only."""
+    if amount is None:
+        return UNKNOWN_SERVING_G * servings
+    if unit in MASS_UNITS:
+        return amount * MASS_UNITS[unit]
+    if unit in VOLUME_UNITS:
+        return amount * VOLUME_UNITS[unit]
+    if unit in TRACE_UNITS:
+        return amount * TRACE_UNITS[unit]
+    return amount * UNKNOWN_SERVING_G
+
+
+def _servings(value, default):
+    try:
+        servings = float(value)
+    except (TypeError, ValueError):
+        match = re.search(r"\d+(?:\.\d+)?", str(value or ""))
+        servings = float(match.group()) if match else default
+    return servings if servings > 0 else default
+
+
+class NutritionEngine:
+    """Per-serving macros for recipes, cached per recipe."""
+
+    def __init__(self, table, cache_size=4096, min_coverage=MIN_COVERAGE):
+        self.table = table
+        self.cache_size = cache_size
+        self.min_coverage = min_coverage
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def ingredients(recipe):
+        """(name, amount or None, unit) for every ingredient of a recipe, used and missing."""
+        quantities = recipe.get("quantities")
+        if isinstance(quantities, list) and quantities:
+            parsed = []
+            for entry in quantities:
+                if isinstance(entry, dict) and isinstance(entry.get("item"), str):
+                    amount = entry.get("amount", entry.get("quantity"))
+                    amount = amount if isinstance(amount, (int, float)) and not isinstance(amount, bool) else None
+                    parsed.append((entry["item"], amount, _canonical_unit(str(entry.get("unit", "")))))
+                elif isinstance(entry, str):
+                    parsed.append(parse_ingredient(entry))
+            if parsed:
+                return tuple(parsed)
+        names = []
+        for field in ("ingredientsUsed", "missingIngredients"):
+            value = recipe.get(field)
+            if isinstance(value, list):
+                names.extend(name for name in value if isinstance(name, str))
+        return tuple(parse_ingredient(name) for name in names)
+
+    def per_serving(self, recipe, servings=2):
+        """Per-serving (calories, protein, carbs, fat) of a recipe, or None below ``min_coverage``."""
+        values, coverage = self.estimate(recipe, servings)
+        return values if coverage >= self.min_coverage else None
+
+    def estimate(self, recipe, servings=2):
+        """(per-serving values or None, share of the recipe's weight found in the table)."""
+        servings = _servings(recipe.get("servings"), _servings(servings, 2.0))
+        key = (self.ingredients(recipe), servings)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        result = self._compute(key[0], servings)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _compute(self, ingredients, servings):
+        rows, grams, unknown = [], [], 0.0
+        for name, amount, unit in ingredients:
+            row = self.table.lookup(name)
+            if row >= 0:
+                rows.append(row)
+                grams.append(self.table.grams(row, amount, unit, servings))
+            else:
+                unknown += unknown_grams(amount, unit, servings)
+        if not rows:
+            return None, 0.0
+        values = tuple(total / servings for total in self.table.totals(rows, grams))
+        known = sum(grams)
+        return values, known / (known + unknown) if known + unknown > 0 else 1.0
+
+    def nutrition(self, recipe, servings=2):
+        """Per-serving nutrition in the recipe format ({"calories": 300, "protein": "20g", ...}), or None."""
+        values = self.per_serving(recipe, servings)
+        return format_nutrition(values) if values is not None else None
+
+
+def parse_nutrition(nutrition):
+    """(calories, protein, carbs, fat) from a recipe's own nutrition ({"calories": 300, "protein": "20g"}), or None."""
+    if not isinstance(nutrition, dict):
+        return None
+    values = []
+    for name in NUTRIENTS:
+        match = re.search(r"\d+(?:\.\d+)?", str(nutrition.get(name, "")))
+        values.append(float(match.group()) if match else 0.0)
+    return tuple(values) if any(values) else None
+
+
+def format_nutrition(values):
+    calories, protein, carbs, fat = values
+    return {"calories": int(round(calories)), "protein": f"{round(protein)}g",
+            "carbs": f"{round(carbs)}g", "fat": f"{round(fat)}g"}
+
+
+def plan_day(vectors, targets, slots=None, portions=PORTIONS, max_rounds=50):
+    """Choose ``slots`` meals (with a portion multiplier each) whose summed macros land closest to ``targets``.
+
+    ``vectors`` are per-serving (calories, protein, carbs, fat) tuples and
+    ``targets`` maps nutrient names to daily amounts (missing ones are ignored).
+    Local search: start from the first meals at one portion each, then keep
+    applying the best single change of one slot's meal or portion until none
+    improves the squared relative error. Returns ([(meal index, portions)], totals).
+    """
+    slots = min(slots or len(vectors), len(vectors))
+    plan = [(i, 1.0) for i in range(slots)]
+    goal = [k for k, nutrient in enumerate(NUTRIENTS)
+            if isinstance(targets.get(nutrient), (int, float)) and targets[nutrient] > 0]
+    if goal:
+        # Work in units of the target, on the targeted nutrients only: error = sum((x - 1) ** 2).
+        scaled = [[vector[k] / targets[NUTRIENTS[k]] for k in goal] for vector in vectors]
+        options = [[[value * portion for value in row] for portion in portions] for row in scaled]
+        totals = [sum(scaled[meal][j] for meal, _ in plan) for j in range(len(goal))]
+        best = sum((total - 1.0) ** 2 for total in totals)
+        for _ in range(max_rounds):
+            move = None
+            for slot, (meal, portion) in enumerate(plan):
+                base = [total - value * portion for total, value in zip(totals, scaled[meal])]
+                used = {m for s, (m, _) in enumerate(plan) if s != slot}
+                for candidate, candidate_options in enumerate(options):
+                    if candidate in used:
+                        continue
+                    for option, row in zip(portions, candidate_options):
+                        score = sum((b + value - 1.0) ** 2 for b, value in zip(base, row))
+                        if score < best - 1e-12:
+                            best, move = score, (slot, candidate, option, base, row)
+            if move is None:
+                break
+            slot, candidate, option, base, row = move
+            plan[slot] = (candidate, option)
+            totals = [b + value for b, value in zip(base, row)]
+    totals = tuple(sum(vectors[meal][k] * portion for meal, portion in plan) for k in range(len(NUTRIENTS)))
+    return plan, totals
+
+
+_default_engine = None
+_default_engine_lock = threading.Lock()
+
+
+def default_engine():
+    """Engine over the bundled table, loaded on first use."""
+    global _default_engine
+    if _default_engine is None:
+        with _default_engine_lock:
+            if _default_engine is None:
+                _default_engine = NutritionEngine(NutrientTable.load())
+    return _default_engine
@@ -0,0 +1,302 @@
+"""
+Speculative recipe pre-generation after pantry changes.
+
+A pantry edit usually means the user is about to ask for suggestions. Each
+``notify(subject)`` (re)starts a debounce timer for that pantry (subject is the
+tenant); once it has been quiet for ``debounce`` seconds a single background
+thread builds the prompt for it, generates recipes and keeps the result, keyed
+by the subject and a hash of the prompt (which covers the pantry contents, so
+it doubles as the pantry version), until a request ``take()``s it or it
+expires.
+
+Results live in a store: ``MemoryResults`` keeps them in this process, and
+``FileResults`` keeps the latest one per subject in a JSON file, so under
+several worker processes the request can land on any worker.
+
+The worker is deliberately low priority: it runs at a raised nice value where
+the OS supports per-thread priorities, waits while foreground generations are
+in flight, and is capped both by generations per hour and by an hourly token
+budget. Each generation is charged its worst case (prompt tokens plus the
+model's ``max_new_tokens``) before it starts. The spend is kept in a ledger:
+``MemoryLedger`` counts this process only, ``FileLedger`` keeps one file that
+every worker charges under its lock, so the limits hold for the whole server.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 3600.0
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class MemoryResults:
+    """Results kept in this process, at most ``max_entries`` of them."""
+
+    def __init__(self, ttl=3600.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._results = OrderedDict()  # (subject, key) -> (time, result)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    def has(self, subject, key):
+        with self._lock:
+            entry = self._results.get((subject, key))
+        return entry is not None and time.time() - entry[0] <= self.ttl
+
+    def put(self, subject, key, result):
+        with self._lock:
+            self._results[(subject, key)] = (time.time(), result)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def take(self, subject, key):
+        with self._lock:
+            entry = self._results.pop((subject, key), None)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+
+class FileResults:
+    """The latest result per subject in ``directory/<subject>.json``, shared by every worker process.
+
+    Subjects must be safe file names (tenant ids are). A new result replaces the
+    subject's previous one, which was for an older pantry.
+    """
+
+    def __init__(self, directory, ttl=3600.0, default_subject="default"):
+        self.directory = directory
+        self.ttl = ttl
+        self.default_subject = default_subject
+
+    def __len__(self):
+        try:
+            return sum(1 for name in os.listdir(self.directory)
+                       if name.endswith(".json") and not name.startswith((".", "_")))
+        except FileNotFoundError:
+            return 0
+
+    def _path(self, subject):
+        return os.path.join(self.directory, f"{subject or self.default_subject}.json")
+
+    def _read(self, path, key):
+        try:
+            entry = storage.read_json(path)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get("key") != key:
+            return None
+        return entry
+
+    def has(self, subject, key):
+        entry = self._read(self._path(subject), key)
+        return entry is not None and time.time() - entry["createdAt"] <= self.ttl
+
+    def put(self, subject, key, result):
+        path = self._path(subject)
+        os.makedirs(self.directory, exist_ok=True)
+        with storage.FileLock(path).hold():
+            storage.atomic_write_json(path, {"key": key, "createdAt": time.time(), "result": result})
+
+    def take(self, subject, key):
+        path = self._path(subject)
+        if not os.path.exists(path):
+            return None
+        with storage.FileLock(path).hold():
+            entry = self._read(path, key)
+            if entry is None:
+                return None
+            try:
+                os.remove(path)  # used once
+            except FileNotFoundError:
+                return None
+        if time.time() - entry["createdAt"] > self.ttl:
+            return None
+        return entry["result"]
+
+
+def _refusal(entries, cost, max_runs, max_tokens):
+    """Why one more generation of ``cost`` tokens would break the hourly limits, or None."""
+    if len(entries) >= max_runs:
+        return "rate_limited"
+    if sum(tokens for _, tokens in entries) + cost > max_tokens:
+        return "over_budget"
+    return None
+
+
+class MemoryLedger:
+    """Generations charged in the last hour by this process."""
+
+    def __init__(self):
+        self._entries = []  # [time, tokens]
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        self._entries = [entry for entry in self._entries if now - entry[0] <= WINDOW_SECONDS]
+
+    def spent(self):
+        with self._lock:
+            self._expire(time.time())
+            return len(self._entries), sum(tokens for _, tokens in self._entries)
+
+    def charge(self, cost, max_runs, max_tokens):
+        """Record ``cost`` if both hourly limits allow it; returns the refusal reason or None."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            refusal = _refusal(self._entries, cost, max_runs, max_tokens)
+            if refusal is None:
+                self._entries.append([now, cost])
+        return refusal
+
+
+class FileLedger:
+    """Generations charged in the last hour by every worker, in one JSON file updated under its lock."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = storage.FileLock(path)
+
+    def _load(self, now):
+        try:
+            entries = storage.read_json(self.path)
+        except (OSError, ValueError):
+            return []
+        if not isinstance(entries, list):
+            return []
+        return [entry for entry in entries
+                if isinstance(entry, list) and len(entry) == 2 and now - entry[0] <= WINDOW_SECONDS]
+
+    def spent(self):
+        entries = self._load(time.time())
+        return len(entries), sum(tokens for _, tokens in entries)
+
+    def charge(self, cost, max_runs, max_tokens):
+        """Record ``cost`` if both hourly limits allow it; returns the refusal reason or None."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self.lock.hold():
+            now = time.time()
+            entries = self._load(now)
+            refusal = _refusal(entries, cost, max_runs, max_tokens)
+            if refusal is None:
+                entries.append([now, cost])
+                storage.atomic_write_json(self.path, entries)
+        return refusal
+
+
+class PreGenerator:
+    """Debounced background generator with a rate limit and a token ceiling.
+
+    ``prepare(subject)`` returns ``(prompt, cost)`` for the subject's pantry or
+    None when there is nothing to generate; ``generate(prompt, subject)`` returns
+    the result or None on failure. ``busy()`` reports whether foreground
+    generations are running. ``results`` defaults to a ``MemoryResults`` and
+    ``ledger`` to a ``MemoryLedger``.
+    """
+
+    def __init__(self, prepare, generate, busy=lambda: False, debounce=5.0, max_per_hour=20,
+                 token_budget_per_hour=100000, ttl=3600.0, max_entries=256, on_outcome=None, niceness=10,
+                 results=None, ledger=None):
+        self.prepare = prepare
+        self.generate = generate
+        self.busy = busy
+        self.debounce = debounce
+        self.max_per_hour = max_per_hour
+        self.token_budget_per_hour = token_budget_per_hour
+        self.on_outcome = on_outcome
+        self.niceness = niceness
+        self.results = results if results is not None else MemoryResults(ttl, max_entries)
+        self.ledger = ledger if ledger is not None else MemoryLedger()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._due = {}  # subject -> monotonic time its debounce ends
+        self._thread = None
+
+    def notify(self, subject=None):
+        """Record a pantry change; generation starts once its changes stop for ``debounce`` seconds."""
+        with self._changed:
+            self._due[subject] = time.monotonic() + self.debounce
+            if self._thread is None or not self._thread.is_alive():
+                # Started lazily so a pre-forking server never forks a running thread.
+                self._thread = threading.Thread(target=self._run_loop, name="recipe-pregen", daemon=True)
+                self._thread.start()
+            self._changed.notify()
+
+    def take(self, key, subject=None):
+        """Remove and return the result generated for ``key`` and ``subject``, if it is still fresh."""
+        return self.results.take(subject, key)
+
+    def __len__(self):
+        return len(self.results)
+
+    def spent(self):
+        """(generations, tokens) charged in the last hour."""
+        return self.ledger.spent()
+
+    def _charge(self, cost):
+        """Reserve ``cost`` tokens if both hourly limits allow it; returns the refusal reason or None."""
+        return self.ledger.charge(cost, self.max_per_hour, self.token_budget_per_hour)
+
+    def _lower_priority(self):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.niceness)
+        except (AttributeError, OSError):
+            pass  # no per-thread priorities here; the busy() check still yields to requests
+
+    def _run_loop(self):
+        self._lower_priority()
+        while True:
+            with self._changed:
+                while True:
+                    now = time.monotonic()
+                    ready = [subject for subject, due in self._due.items() if due <= now]
+                    if ready:
+                        break
+                    self._changed.wait(min(self._due.values()) - now if self._due else None)
+                for subject in ready:
+                    del self._due[subject]
+            for subject in ready:
+                while self.busy():
+                    time.sleep(0.5)
+                try:
+                    outcome = self.run_once(subject)
+                except Exception as e:
+                    logger.error(f"Recipe pre-generation failed: {str(e)}")
+                    outcome = "error"
+                if self.on_outcome:
+                    self.on_outcome(outcome)
+
+    def run_once(self, subject=None):
+        """Generate for the subject's pantry now; returns the outcome as a short string."""
+        job = self.prepare(subject)
+        if job is None:
+            return "skipped"
+        prompt, cost = job
+        key = prompt_key(prompt)
+        if self.results.has(subject, key):
+            return "already_cached"
+        refusal = self._charge(cost)
+        if refusal:
+            logger.info(f"Skipping recipe pre-generation: {refusal.replace('_', ' ')}")
+            return refusal
+        start = time.perf_counter()
+        result = self.generate(prompt, subject)
+        if result is None:
+            return "failed"
+        self.results.put(subject, key, result)
+        logger.info(f"Pre-generated recipes in {time.perf_counter() - start:.2f}s")
+        return "generated"
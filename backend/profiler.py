@@ -0,0 +1,121 @@
+"""
+Sampling profiler for slow requests.
+
+While requests are in flight a single daemon thread samples their stacks via
+``sys._current_frames()`` every ``PROFILE_INTERVAL`` seconds. When a request
+finishes after more than ``PROFILE_SLOW_REQUEST_SECONDS`` its samples are
+written in collapsed-stack format (one ``frame;frame;frame count`` line per
+unique stack), which flamegraph.pl and speedscope open directly. Faster
+requests simply discard their samples. Samples are counted under the
+profiler's lock and only for registered sessions, so ``finish`` gets a stable
+copy once it has unregistered the request.
+
+Set ``PROFILE_SLOW_REQUEST_SECONDS=0`` (the default) to disable the hook.
+"""
+
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SLOW_REQUEST_SECONDS = float(os.getenv("PROFILE_SLOW_REQUEST_SECONDS", "0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+MAX_STACK_DEPTH = 128
+
+
+def enabled():
+    return PROFILE_SLOW_REQUEST_SECONDS > 0
+
+
+class _Session:
+    def __init__(self, thread_id, label):
+        self.thread_id = thread_id
+        self.label = label
+        self.started = time.perf_counter()
+        self.samples = Counter()
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class SlowRequestProfiler:
+    """Samples in-flight request threads and keeps profiles of the slow ones."""
+
+    def __init__(self, threshold=PROFILE_SLOW_REQUEST_SECONDS, interval=PROFILE_INTERVAL, output_dir=PROFILE_DIR):
+        self.threshold = threshold
+        self.interval = interval
+        self.output_dir = output_dir
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._sequence = itertools.count(1)
+
+    def start(self, label):
+        """Begin sampling the calling thread; pass the result to ``finish``."""
+        session = _Session(threading.get_ident(), label)
+        with self._lock:
+            self._sessions[session.thread_id] = session
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return session
+
+    def finish(self, session):
+        """Stop sampling; returns the profile path when the request was slow, else None."""
+        with self._lock:
+            if self._sessions.get(session.thread_id) is session:
+                del self._sessions[session.thread_id]
+            samples = Counter(session.samples)
+        elapsed = time.perf_counter() - session.started
+        if elapsed < self.threshold or not samples:
+            return None
+        return self._write(session, samples, elapsed)
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                sessions = list(self._sessions.values())
+            if not sessions:
+                self._wakeup.clear()
+                self._wakeup.wait()
+                continue
+            frames = sys._current_frames()
+            stacks = [(session, _collapse(frames[session.thread_id]))
+                      for session in sessions if session.thread_id in frames]
+            del frames
+            with self._lock:
+                for session, stack in stacks:
+                    if self._sessions.get(session.thread_id) is session:
+                        session.samples[stack] += 1
+            time.sleep(self.interval)
+
+    def _write(self, session, samples, elapsed):
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() or c in "-_" else "_" for c in session.label)[:80]
+        # pid and sequence keep names unique across workers and requests finishing in the same second
+        name = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(self._sequence)}-{safe_label}.folded"
+        path = os.path.join(self.output_dir, name)
+        try:
+            with open(path, "x", encoding="utf-8") as f:
+                for stack, count in samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            logger.error(f"Error writing slow-request profile: {str(e)}")
+            return None
+        logger.warning(f"🐢 Slow request {session.label} took {elapsed:.2f}s, profile saved to {path}")
+        return path
@@ -0,0 +1,259 @@
+"""
+Per-client rate limiting and fair scheduling of upstream LLM calls.
+
+- ``RateLimiter`` applies token buckets per (client, limit name). Bucket state
+  lives in a ``MemoryStore`` (per process) or, when ``RATE_LIMIT_REDIS_URL``
+  is set and the ``redis`` package is installed, in Redis (or any server that
+  speaks its protocol and runs Lua scripts) so all workers share one budget.
+- ``FairScheduler`` hands out a fixed number of concurrent upstream slots with
+  start-time fair queuing: each waiting call is tagged with a virtual start
+  time that advances by ``cost / weight`` per client, so a client that queues
+  many expensive calls cannot starve others, and heavier-weighted clients get
+  proportionally more of the slots. Extra calls made on behalf of a slot holder
+  either take a free slot without queuing (``try_acquire``) or run inside the
+  held slot and are only charged (``charge``).
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class Limit:
+    """``rate`` tokens per second refilled into a bucket holding at most ``burst``."""
+
+    __slots__ = ("rate", "burst")
+
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.burst = float(burst)
+
+    @classmethod
+    def from_env(cls, prefix, per_minute, burst):
+        """Read ``<prefix>_PER_MINUTE`` and ``<prefix>_BURST``, with defaults."""
+        return cls(float(os.getenv(f"{prefix}_PER_MINUTE", str(per_minute))),
+                   float(os.getenv(f"{prefix}_BURST", str(burst))))
+
+
+class MemoryStore:
+    """Token buckets in a dict; buckets that have refilled completely are pruned."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, limit, cost=1.0, now=None):
+        """Spend ``cost`` tokens; returns (allowed, seconds until it would be allowed)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.burst, now))
+            tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (cost - tokens) / limit.rate if limit.rate > 0 else float("inf")
+            if len(self._buckets) > self.max_keys:
+                self._prune(now, limit)
+        return allowed, retry_after
+
+    def _prune(self, now, limit):
+        # A bucket that would be full again is indistinguishable from a new one.
+        full_after = limit.burst / limit.rate if limit.rate > 0 else float("inf")
+        for key in [k for k, (_, updated) in self._buckets.items() if now - updated >= full_after]:
+            del self._buckets[key]
+
+
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+elseif rate > 0 then
+    retry = (cost - tokens) / rate
+else
+    retry = -1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+if rate > 0 then
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+end
+return {allowed, tostring(retry)}
+"""
+
+
+class RedisStore:
+    """Token buckets in Redis, updated atomically by a Lua script."""
+
+    def __init__(self, url, prefix="pantryai:ratelimit:"):
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._script = self._client.register_script(_TOKEN_BUCKET_LUA)
+
+    def take(self, key, limit, cost=1.0, now=None):
+        now = time.time() if now is None else now
+        allowed, retry_after = self._script(keys=[self.prefix + key], args=[limit.rate, limit.burst, cost, now])
+        retry_after = float(retry_after)
+        return bool(allowed), float("inf") if retry_after < 0 else retry_after
+
+
+def create_store(redis_url=None):
+    """Redis store when a URL is given and reachable, otherwise the in-process store."""
+    if redis_url:
+        if redis is None:
+            logger.warning("RATE_LIMIT_REDIS_URL is set but the redis package is not installed; "
+                           "using per-process rate limits")
+        else:
+            try:
+                store = RedisStore(redis_url)
+                store._client.ping()
+                return store
+            except Exception as e:
+                logger.warning(f"Redis rate-limit store unavailable ({str(e)}); using per-process rate limits")
+    return MemoryStore()
+
+
+class RateLimiter:
+    """Named limits (e.g. one per cooking mode) applied per client."""
+
+    def __init__(self, store, limits):
+        self.store = store
+        self.limits = limits
+
+    def check(self, client, name, cost=1.0):
+        """Returns (allowed, retry_after_seconds); names without a limit are always allowed."""
+        limit = self.limits.get(name)
+        if limit is None:
+            return True, 0.0
+        try:
+            return self.store.take(f"{name}:{client}", limit, cost)
+        except Exception as e:
+            # A broken shared store must not take the endpoint down with it.
+            logger.error(f"Rate limit check failed: {str(e)}")
+            return True, 0.0
+
+
+class QueueTimeout(Exception):
+    """No upstream slot became free within the timeout."""
+
+    def __init__(self, waited):
+        super().__init__(f"No LLM slot available after {waited:.1f}s")
+        self.waited = waited
+
+
+class _Ticket:
+    __slots__ = ("granted", "cancelled")
+
+    def __init__(self):
+        self.granted = False
+        self.cancelled = False
+
+
+class FairScheduler:
+    """``slots`` concurrent upstream calls shared between clients by weighted fair queuing."""
+
+    def __init__(self, slots, weights=None, default_weight=1.0):
+        self.slots = slots
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self._cond = threading.Condition()
+        self._free = slots
+        self._queue = []  # (virtual start, sequence, ticket)
+        self._finish = {}  # client -> virtual finish time of its last queued call
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+
+    def weight(self, client):
+        return self.weights.get(client, self.default_weight)
+
+    def waiting(self):
+        with self._cond:
+            return sum(1 for _, _, ticket in self._queue if not ticket.cancelled)
+
+    def in_use(self):
+        with self._cond:
+            return self.slots - self._free
+
+    @contextmanager
+    def slot(self, client, cost=1.0, timeout=None):
+        """Hold one upstream slot for the duration of the block; raises QueueTimeout."""
+        start = time.monotonic()
+        with self._cond:
+            virtual_start = self._charge(client, cost)
+            if self._free > 0 and not self._queue:
+                self._free -= 1
+                self._virtual_time = virtual_start
+            else:
+                ticket = _Ticket()
+                heapq.heappush(self._queue, (virtual_start, next(self._sequence), ticket))
+                deadline = None if timeout is None else start + timeout
+                while not ticket.granted:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        ticket.cancelled = True
+                        raise QueueTimeout(time.monotonic() - start)
+                    self._cond.wait(remaining)
+        try:
+            yield time.monotonic() - start
+        finally:
+            self._release()
+
+    def try_acquire(self, client, cost=1.0):
+        """Take a slot only if one is free and nobody is waiting; pair a True result with ``release()``."""
+        with self._cond:
+            if self._free <= 0 or self._queue:
+                return False
+            self._free -= 1
+            self._virtual_time = self._charge(client, cost)
+            return True
+
+    def release(self):
+        """Give back a slot taken with ``try_acquire``."""
+        self._release()
+
+    def charge(self, client, cost):
+        """Count ``cost`` against ``client``'s share for a call made inside a slot it already holds."""
+        with self._cond:
+            self._charge(client, cost)
+
+    def _charge(self, client, cost):
+        virtual_start = max(self._virtual_time, self._finish.get(client, 0.0))
+        self._finish[client] = virtual_start + cost / self.weight(client)
+        return virtual_start
+
+    def _release(self):
+        with self._cond:
+            while self._queue:
+                virtual_start, _, ticket = heapq.heappop(self._queue)
+                if not ticket.cancelled:
+                    ticket.granted = True
+                    self._virtual_time = virtual_start
+                    self._cond.notify_all()
+                    break
+            else:
+                self._free += 1
+            if len(self._finish) > 10000:
+                # Clients whose last call is behind the virtual clock have no backlog to remember.
+                self._finish = {c: f for c, f in self._finish.items() if f > self._virtual_time}
@@ -0,0 +1,234 @@
+"""
+Similarity cache over previously generated recipe sets.
+
+Each saved recipe set is keyed by the normalized ingredient set of the pantry
+it was generated for (or, for older history entries that did not record the
+pantry, the union of its ``ingredientsUsed``). Keys are MinHash-signed and
+bucketed with LSH banding, so a lookup only examines sets whose pantry was
+similar to the current one. Candidates are then validated exactly: a cached
+recipe is servable only if every one of its ``ingredientsUsed`` is still in the
+pantry, and a set is served only when the share of servable recipes reaches
+the coverage threshold. Below it the caller goes to Watsonx.
+
+Hashing costs grow with the pantry, so pantries of more than ``max_pantry``
+items are never looked up and sets generated for them are keyed by their
+``ingredientsUsed`` instead. ``pantry_key`` is the normalized, capped form of a
+pantry to store with a saved set, so history entries stay small.
+
+With ``compact=True`` the cached recipes and shopping lists are held as
+records.py records and turned back into plain dicts only for a lookup hit.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import lru_cache
+
+import records
+
+NUM_PERM = 64
+BANDS = 32  # 2 rows per band: pairs with Jaccard ~0.2+ usually share a bucket
+ROWS = NUM_PERM // BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+MAX_PANTRY = 500
+
+# Deterministic permutation coefficients so signatures are stable across processes.
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % (_MERSENNE_PRIME - 1) + 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME)
+    for i in range(NUM_PERM)
+]
+
+_PARENTHETICAL = re.compile(r"\([^)]*\)")
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=8192)
+def _normalize(name):
+    text = _PARENTHETICAL.sub(" ", name.lower())
+    text = _SPACES.sub(" ", _NON_WORD.sub(" ", text)).strip()
+    words = text.split(" ")
+    last = words[-1]
+    if len(last) > 3:
+        if last.endswith("ies"):
+            last = last[:-3] + "y"
+        elif last.endswith("oes"):
+            last = last[:-2]
+        elif last.endswith("s") and not last.endswith("ss"):
+            last = last[:-1]
+    words[-1] = last
+    return " ".join(words)
+
+
+def normalize_ingredient(name):
+    """Canonical form for matching: lowercase, no quantities in parentheses, singular-ish."""
+    return _normalize(name if isinstance(name, str) else str(name))
+
+
+def ingredient_set(names):
+    return frozenset(filter(None, (normalize_ingredient(name) for name in names)))
+
+
+def minhash(tokens):
+    hashes = [int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+              for token in tokens]
+    if not hashes:
+        return (_MAX_HASH,) * NUM_PERM
+    return tuple(min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in _PERMUTATIONS)
+
+
+@lru_cache(maxsize=256)
+def _signature(key):
+    """MinHash of a frozenset key; a lookup and the save that follows it hash the pantry once."""
+    return minhash(key)
+
+
+def _band_keys(signature):
+    return [(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+# Request fields that shape the generated recipes; a cached set must match them.
+OPTION_FIELDS = ("servings", "dietary", "cuisine", "budget", "appliances", "skill_level")
+
+
+def request_options(data):
+    """The OPTION_FIELDS present in a request body."""
+    return {name: data[name] for name in OPTION_FIELDS if data.get(name) not in (None, "")}
+
+
+def options_key(options):
+    options = options or {}
+    return (str(options.get("servings", 2)),) + tuple(
+        str(options.get(name, "") or "").strip().lower() for name in OPTION_FIELDS[1:])
+
+
+class _Entry:
+    __slots__ = ("entry_id", "mode", "options", "key", "signature", "recipes", "used", "shopping_list")
+
+    def __init__(self, entry_id, mode, options, key, signature, recipes, used, shopping_list):
+        self.entry_id = entry_id
+        self.mode = mode
+        self.options = options
+        self.key = key
+        self.signature = signature
+        self.recipes = recipes
+        self.used = used
+        self.shopping_list = shopping_list
+
+
+class RecipeCache:
+    """In-process MinHash/LSH index over recipe sets, bounded to ``max_entries``."""
+
+    def __init__(self, min_coverage=0.6, max_entries=10000, compact=False, max_pantry=MAX_PANTRY):
+        self.min_coverage = min_coverage
+        self.max_entries = max_entries
+        self.max_pantry = max_pantry
+        self.compact = compact
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cacheable(self, pantry_names):
+        """Whether a pantry is small enough to be looked up and keyed by."""
+        return bool(pantry_names) and len(pantry_names) <= self.max_pantry
+
+    def pantry_key(self, pantry_names):
+        """Sorted normalized names to save with a recipe set, or None for pantries above ``max_pantry``."""
+        return sorted(ingredient_set(pantry_names)) if self.cacheable(pantry_names) else None
+
+    def add(self, recipe_data, mode, pantry_names=None, options=None):
+        """Index one generated recipe set; returns False when it has nothing cacheable."""
+        recipes = [r for r in (recipe_data or {}).get("recipes", [])
+                   if isinstance(r, dict) and r.get("title") and r.get("ingredientsUsed")]
+        if not recipes:
+            return False
+        used = [ingredient_set(r["ingredientsUsed"]) for r in recipes]
+        key = ingredient_set(pantry_names) if self.cacheable(pantry_names) else frozenset().union(*used)
+        if not key:
+            return False
+        signature = _signature(key)
+        shopping_list = recipe_data.get("shoppingList", [])
+        if self.compact:
+            recipes = tuple(records.Recipe.from_dict(r) for r in recipes)
+            if isinstance(shopping_list, list):
+                shopping_list = tuple(records.compact(item, records.ShoppingItem) for item in shopping_list)
+        with self._lock:
+            entry = _Entry(self._next_id, mode, options_key(options), key, signature, recipes, used,
+                           shopping_list)
+            self._next_id += 1
+            self._entries[entry.entry_id] = entry
+            for band_key in _band_keys(signature):
+                self._buckets.setdefault(band_key, set()).add(entry.entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict_oldest()
+        return True
+
+    def _evict_oldest(self):
+        _, entry = self._entries.popitem(last=False)
+        for band_key in _band_keys(entry.signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(entry.entry_id)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def load_history(self, history):
+        """Index recipes.json entries (oldest first); returns how many were cached."""
+        added = 0
+        for item in history:
+            if isinstance(item, dict):
+                added += self.add(item.get("recipe"), item.get("mode", "home"),
+                                  item.get("pantry"), item.get("options"))
+        self.loaded = True
+        return added
+
+    def lookup(self, pantry_names, mode, options=None):
+        """Return a servable recipe set for this pantry, or None below the coverage threshold."""
+        if not self.cacheable(pantry_names):
+            return None
+        pantry = ingredient_set(pantry_names)
+        if not pantry:
+            return None
+        wanted_options = options_key(options)
+        signature = _signature(pantry)
+        with self._lock:
+            candidate_ids = set()
+            for band_key in _band_keys(signature):
+                candidate_ids.update(self._buckets.get(band_key, ()))
+            candidates = [self._entries[i] for i in candidate_ids if i in self._entries]
+
+        best, best_rank = None, None
+        for entry in candidates:
+            if entry.mode != mode or entry.options != wanted_options:
+                continue
+            fitting = [i for i, used in enumerate(entry.used) if used <= pantry]
+            coverage = len(fitting) / len(entry.used)
+            if coverage < self.min_coverage:
+                continue
+            similarity = len(entry.key & pantry) / len(entry.key | pantry)
+            rank = (coverage, similarity, entry.entry_id)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (entry, fitting), rank
+        if best is None:
+            return None
+
+        entry, fitting = best
+        recipes = [records.plain(entry.recipes[i]) for i in fitting]
+        missing = {normalize_ingredient(m) for r in recipes for m in r.get("missingIngredients", [])}
+        shopping_list = [records.plain(item) for item in entry.shopping_list
+                         if not isinstance(item, Mapping) or normalize_ingredient(item.get("item", "")) in missing]
+        return {
+            "recipes": recipes,
+            "shoppingList": shopping_list,
+            "coverage": round(best_rank[0], 3),
+            "similarity": round(best_rank[1], 3),
+        }
@@ -0,0 +1,372 @@
+"""
+Searchable index over saved recipes, backed by SQLite FTS5.
+
+Every recipe inside a recipes.json entry (and every ``Recipe`` row of the
+SQLAlchemy app) becomes one row with full-text columns (title, technique,
+ingredients, body) and facet columns (mode, technique, cook time range in
+minutes, calories/protein/carbs/fat). Rows are keyed by ``(source, key)`` and
+inserted with ``INSERT OR IGNORE``, so indexing the same recipe twice - from
+``save_recipe`` and again from a backfill - is harmless, and several worker
+processes can share one index file.
+
+Rows belong to a tenant (household): a recipes.json entry's ``tenant``, or
+``DEFAULT_TENANT`` for entries without one and for app.py's rows. ``search``
+only ever returns one tenant's rows, and facet counts are kept per tenant.
+The index is derived data: a file from an older ``SCHEMA_VERSION`` is dropped
+and rebuilt by the next backfills.
+
+Connections are opened lazily per thread and process (never shared across a
+fork); writes are serialized by SQLite's own locking.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+import serialization
+
+SCHEMA_VERSION = 2
+DEFAULT_TENANT = "default"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    key TEXT NOT NULL,
+    tenant TEXT NOT NULL DEFAULT 'default',
+    mode TEXT,
+    title TEXT NOT NULL,
+    technique TEXT,
+    cook_min REAL,
+    cook_max REAL,
+    calories REAL,
+    protein REAL,
+    carbs REAL,
+    fat REAL,
+    created_at TEXT,
+    data BLOB NOT NULL,
+    UNIQUE (source, key)
+);
+CREATE INDEX IF NOT EXISTS recipes_tenant ON recipes (tenant, id);
+CREATE INDEX IF NOT EXISTS recipes_mode ON recipes (tenant, mode, id);
+CREATE INDEX IF NOT EXISTS recipes_technique ON recipes (technique COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS recipes_cook ON recipes (cook_max);
+CREATE INDEX IF NOT EXISTS recipes_calories ON recipes (calories);
+CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5 (
+    title, technique, ingredients, body,
+    content='', tokenize='porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS facet_counts (
+    tenant TEXT NOT NULL, facet TEXT NOT NULL, value TEXT NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (tenant, facet, value)
+);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+NUTRIENTS = ("calories", "protein", "carbs", "fat")
+FACETS = ("mode", "technique")
+SORTS = ("relevance", "newest", "oldest")
+MAX_PAGE_SIZE = 100
+_TABLES = ("recipes", "recipes_fts", "facet_counts", "meta")
+RELEVANCE_WINDOW = 250  # relevance ranks the newest matches only (older ones follow by date), so broad terms stay fast
+FACET_SCAN_LIMIT = 1000  # filtered facet counts beyond this many matches are approximate
+
+_NUMBER = r"(\d+(?:\.\d+)?)"
+_DURATION = re.compile(_NUMBER + r"(?:\s*(?:-|–|to)\s*" + _NUMBER + r")?\s*(hours?|hrs?|h\b|minutes?|mins?|m\b)?", re.I)
+_AMOUNT = re.compile(_NUMBER)
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def parse_minutes(value):
+    """Parse a cookTime such as '20-25 minutes' or '1 hour 30 min' into (min, max) minutes."""
+    if isinstance(value, (int, float)):
+        return float(value), float(value)
+    if not value:
+        return None, None
+    low = high = 0.0
+    found = False
+    for start, end, unit in _DURATION.findall(str(value)):
+        scale = 60.0 if unit and unit[0].lower() == "h" else 1.0
+        low += float(start) * scale
+        high += float(end or start) * scale
+        found = True
+    return (low, high) if found else (None, None)
+
+
+def parse_amount(value):
+    """Numeric part of a nutrition value such as '20g' or 350."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _AMOUNT.search(str(value or ""))
+    return float(match.group(1)) if match else None
+
+
+def match_expression(text):
+    """Turn free text into an FTS5 query of quoted terms (no query-syntax injection).
+
+    Terms are matched whole (after porter stemming) rather than as prefixes: prefix
+    queries materialize the whole doclist and are an order of magnitude slower on
+    common words.
+    """
+    return " ".join(f'"{word}"' for word in _WORD.findall(str(text).lower()))
+
+
+def phrase_expression(text):
+    words = _WORD.findall(str(text).lower())
+    return f'"{" ".join(words)}"' if words else ""
+
+
+def history_rows(entry, entry_key):
+    """Index rows for one recipes.json entry, one per recipe it contains."""
+    recipe_data = entry.get("recipe") or {}
+    recipes = recipe_data.get("recipes")
+    if recipes is None:
+        recipes = [recipe_data] if recipe_data.get("title") else []
+    rows = []
+    for position, recipe in enumerate(recipes):
+        if not isinstance(recipe, dict) or not recipe.get("title"):
+            continue
+        nutrition = recipe.get("nutrition") or {}
+        cook_min, cook_max = parse_minutes(recipe.get("cookTime"))
+        rows.append({
+            "source": "history",
+            "key": f"{entry_key}:{position}",
+            "tenant": entry.get("tenant") or DEFAULT_TENANT,
+            "mode": entry.get("mode"),
+            "title": str(recipe["title"]),
+            "technique": recipe.get("technique") or None,
+            "ingredients": " ".join(str(i) for i in recipe.get("ingredientsUsed", [])),
+            "body": " ".join([str(recipe.get("description", ""))] + [str(s) for s in recipe.get("steps", [])]),
+            "cook_min": cook_min,
+            "cook_max": cook_max,
+            "created_at": entry.get("timestamp"),
+            "data": recipe,
+            **{name: parse_amount(nutrition.get(name)) for name in NUTRIENTS},
+        })
+    return rows
+
+
+def model_row(recipe_id, title, body):
+    """Index row for a ``models.Recipe`` (title and free-text body only)."""
+    return {
+        "source": "db", "key": str(recipe_id), "tenant": DEFAULT_TENANT, "mode": None, "title": title or "", "technique": None,
+        "ingredients": "", "body": body or "", "cook_min": None, "cook_max": None, "created_at": None,
+        "data": {"id": recipe_id, "title": title, "body": body},
+        **{name: None for name in NUTRIENTS},
+    }
+
+
+class RecipeIndex:
+    """FTS5 + facet index stored in one SQLite file (``":memory:"`` works for a single thread)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._migrate(conn)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def _migrate(conn):
+        """Create the schema, dropping an index file written by an older version first."""
+        if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            conn.executescript(SCHEMA)
+            return
+        conn.execute("BEGIN IMMEDIATE")  # one process migrates; the others wait and then see the new version
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                for table in _TABLES:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                for statement in SCHEMA.split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def add_rows(self, rows):
+        """Insert rows not indexed yet; returns how many were new."""
+        conn = self._connect()
+        added = 0
+        with conn:
+            for row in rows:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO recipes (source, key, tenant, mode, title, technique, cook_min, cook_max, "
+                    "calories, protein, carbs, fat, created_at, data) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                    (row["source"], row["key"], row["tenant"], row["mode"], row["title"], row["technique"],
+                     row["cook_min"],
+                     row["cook_max"], row["calories"], row["protein"], row["carbs"], row["fat"],
+                     row["created_at"], serialization.dumps(row["data"])))
+                if cursor.rowcount:
+                    conn.execute(
+                        "INSERT INTO recipes_fts (rowid, title, technique, ingredients, body) VALUES (?,?,?,?,?)",
+                        (cursor.lastrowid, row["title"], row["technique"] or "", row["ingredients"], row["body"]))
+                    for facet in FACETS:
+                        if row[facet]:
+                            conn.execute(
+                                "INSERT INTO facet_counts (tenant, facet, value, count) VALUES (?, ?, ?, 1) "
+                                "ON CONFLICT (tenant, facet, value) DO UPDATE SET count = count + 1",
+                                (row["tenant"], facet, str(row[facet]).lower()))
+                    added += 1
+        return added
+
+    def add_entry(self, entry, entry_key):
+        return self.add_rows(history_rows(entry, entry_key))
+
+    def get_meta(self, name, default=0):
+        row = self._connect().execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, name, value):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def backfill_history(self, history):
+        """Index recipes.json entries past the last backfilled position; returns rows added."""
+        start = self.get_meta("history_entries")
+        if start > len(history):  # the file was replaced or truncated: start over
+            start = 0
+        added = self.add_rows(row for position in range(start, len(history))
+                              for row in history_rows(history[position], entry_key(history[position], position)))
+        self.set_meta("history_entries", len(history))
+        return added
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+
+    def search(self, text="", mode=None, technique=None, ingredients=(), cook_time_min=None, cook_time_max=None,
+               ranges=None, page=1, page_size=20, sort=None, facets=False, tenant=DEFAULT_TENANT):
+        """One page of ``tenant``'s matching recipes, newest first (or by relevance when ``text`` is given)."""
+        page = max(1, int(page))
+        page_size = min(max(1, int(page_size)), MAX_PAGE_SIZE)
+
+        terms = [match_expression(text)] + [f"ingredients : {expr}" for expr in map(phrase_expression, ingredients)
+                                            if expr]
+        fts_match = " AND ".join(f"({t})" for t in terms if t) or None
+
+        filters, params = ["r.tenant = ?"], [tenant]
+        if mode:
+            filters.append("r.mode = ?")
+            params.append(mode)
+        if technique:
+            filters.append("r.technique = ? COLLATE NOCASE")
+            params.append(technique)
+        if cook_time_min is not None:
+            filters.append("r.cook_min >= ?")
+            params.append(float(cook_time_min))
+        if cook_time_max is not None:
+            filters.append("r.cook_max <= ?")
+            params.append(float(cook_time_max))
+        for name, (low, high) in (ranges or {}).items():
+            if name not in NUTRIENTS:
+                raise ValueError(f"Unknown nutrition field: {name}")
+            if low is not None:
+                filters.append(f"r.{name} >= ?")
+                params.append(float(low))
+            if high is not None:
+                filters.append(f"r.{name} <= ?")
+                params.append(float(high))
+
+        # Full-text queries are driven from the FTS index in rowid order so LIMIT stops the scan early.
+        if fts_match:
+            source = "recipes_fts f JOIN recipes r ON r.id = f.rowid"
+            where = " AND ".join(["recipes_fts MATCH ?"] + filters)
+            params = [fts_match] + params
+            order_column = "f.rowid"
+        else:
+            source = "recipes r"
+            where = " AND ".join(filters)
+            order_column = "r.id"
+
+        if sort is None:
+            sort = "relevance" if fts_match else "newest"
+        elif sort not in SORTS:
+            raise ValueError(f"Unknown sort: {sort}")
+        offset = (page - 1) * page_size
+        direction = "ASC" if sort == "oldest" else "DESC"
+        query = f"SELECT r.* FROM {source} WHERE {where} ORDER BY {order_column} {direction} LIMIT ? OFFSET ?"
+
+        conn = self._connect()
+        if sort == "relevance" and fts_match:
+            # The newest RELEVANCE_WINDOW matches by rank, then every older match newest first,
+            # so pages run through the whole match set.
+            rows = []
+            if offset < RELEVANCE_WINDOW:
+                ranked = (f"SELECT * FROM (SELECT r.*, f.rank AS score FROM {source} WHERE {where} "
+                          f"ORDER BY {order_column} DESC LIMIT {RELEVANCE_WINDOW}) ORDER BY score LIMIT ? OFFSET ?")
+                rows = conn.execute(ranked, params + [page_size + 1, offset]).fetchall()
+            if len(rows) <= page_size:
+                rows += conn.execute(query, params + [page_size + 1 - len(rows),
+                                                      max(offset, RELEVANCE_WINDOW)]).fetchall()
+        else:
+            rows = conn.execute(query, params + [page_size + 1, offset]).fetchall()
+        result = {
+            "results": [self._result(row) for row in rows[:page_size]],
+            "page": page,
+            "pageSize": page_size,
+            "hasMore": len(rows) > page_size,
+        }
+        if facets:
+            result.update(self._facets(conn, source, where, params, order_column, tenant,
+                                       unfiltered=not fts_match and len(filters) == 1))
+        return result
+
+    def _facets(self, conn, source, where, params, order_column, tenant, unfiltered):
+        if unfiltered:
+            counts = {facet: {} for facet in FACETS}
+            for facet, value, count in conn.execute(
+                    "SELECT facet, value, count FROM facet_counts WHERE tenant = ? ORDER BY count DESC", (tenant,)):
+                counts[facet][value] = count
+            total = conn.execute("SELECT COUNT(*) FROM recipes WHERE tenant = ?", (tenant,)).fetchone()[0]
+            return {"total": total, "totalIsExact": True, "facets": counts}
+
+        rows = conn.execute(f"SELECT r.mode, r.technique FROM {source} WHERE {where} "
+                            f"ORDER BY {order_column} DESC LIMIT {FACET_SCAN_LIMIT + 1}", params).fetchall()
+        exact = len(rows) <= FACET_SCAN_LIMIT
+        counts = {facet: Counter() for facet in FACETS}
+        for row in rows[:FACET_SCAN_LIMIT]:
+            for facet in FACETS:
+                if row[facet]:
+                    counts[facet][str(row[facet]).lower()] += 1
+        return {
+            "total": len(rows) if exact else FACET_SCAN_LIMIT,
+            "totalIsExact": exact,
+            "facets": {facet: dict(counter.most_common()) for facet, counter in counts.items()},
+        }
+
+    @staticmethod
+    def _result(row):
+        recipe = serialization.loads(row["data"])
+        return {
+            "id": row["id"],
+            "source": row["source"],
+            "mode": row["mode"],
+            "savedAt": row["created_at"],
+            "recipe": recipe,
+        }
+
+
+def entry_key(entry, position):
+    """Stable key of a recipes.json entry: its id, or its position for entries saved before ids."""
+    return entry.get("id") or f"legacy:{position}"
+
@@ -0,0 +1,285 @@
+"""
+Compact in-memory records for pantry items and saved recipes.
+
+Every worker keeps its pantries (one per tenant) and the recipe history behind
+the similarity cache resident. As parsed JSON, each item is a dict with about
+ten keys and its own copies of the same few strings. The records here hold
+the same data in ``__slots__`` objects:
+
+- names, units, categories and dates are ``sys.intern``-ed, so the thousands
+  of "g", "Vegetables" or "2025-08-18" values share one string;
+- ``createdAt``/``updatedAt``/``spoiledAt`` become int microseconds (28-32
+  bytes instead of a ~75 byte ISO string), numeric ids become ints and small
+  quantities share one float object;
+- a recipe keeps the fields the cache matches on (title, ingredientsUsed,
+  missingIngredients) unpacked and deflates the rest - description, steps,
+  nutrition - into one blob with a preset dictionary of recipe vocabulary.
+
+Records are read-only ``Mapping``s keyed by the API's camelCase names, so code
+that reads ``item.get("name")``, ``item["unit"]`` or ``dict(item)`` is unchanged.
+``to_dict()`` rebuilds exactly the dict a record was made from (same keys, same
+order, same values); serialization.py calls it when a record reaches a JSON
+response, so the API boundary never sees the compact form. Values a record
+cannot store exactly - unknown keys, timestamps that would not round-trip -
+are kept verbatim. To change an item, copy it with ``dict(item)``.
+"""
+
+import sys
+import zlib
+from collections.abc import Mapping
+from operator import attrgetter
+from datetime import datetime, timedelta
+
+import serialization
+
+_SKIP = object()  # returned by a packer for values its slot cannot store exactly
+_intern = sys.intern
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _text(value):
+    return _intern(value) if type(value) is str else _SKIP
+
+
+def _string(value):
+    return value if type(value) is str else _SKIP
+
+
+def _pack_id(value):
+    """Digit-only ids ("1755533721096") as ints when they convert back unchanged."""
+    if type(value) is not str:
+        return _SKIP
+    if value.isascii() and value.isdigit() and (value == "0" or value[0] != "0"):
+        return int(value)
+    return value
+
+
+def _unpack_id(value):
+    return str(value) if type(value) is int else value
+
+
+def pack_time(value):
+    """A naive ISO datetime as int microseconds since the epoch, when isoformat() gives it back unchanged."""
+    if type(value) is not str:
+        return _SKIP
+    if len(value) in (19, 26):
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        if moment.tzinfo is None and moment.isoformat() == value:
+            return (moment - _EPOCH) // _MICROSECOND
+    return value
+
+
+def unpack_time(value):
+    return (_EPOCH + timedelta(microseconds=value)).isoformat() if type(value) is int else value
+
+
+_QUANTITIES = {}
+
+
+def _number(value):
+    """Share one float object per common quantity (whole and quarter amounts up to 1024)."""
+    if type(value) is float and 0 < value <= 1024 and (value * 4).is_integer():
+        return _QUANTITIES.setdefault(value, value)
+    return value
+
+
+def _names(value):
+    if type(value) is list and all(type(name) is str for name in value):
+        return tuple(map(_intern, value))
+    return _SKIP
+
+
+class _Layout:
+    """Key order and slot mapping shared by every record with the same shape."""
+
+    __slots__ = ("keys", "fields", "values", "unpack")
+
+    def __init__(self, keys, fields):
+        self.keys = keys  # API keys in their original order
+        self.fields = fields  # API key -> (slot, unpack), or None when the value is in the extras
+        if None in fields.values() or not keys:
+            self.values = None
+        else:
+            # All values live in slots: one attrgetter call fetches them in key order.
+            getter = attrgetter(*(slot for slot, _ in fields.values()))
+            self.values = getter if len(keys) > 1 else lambda record: (getter(record),)
+        self.unpack = [(key, field[1]) for key, field in fields.items() if field is not None and field[1] is not None]
+
+
+_LAYOUTS = {}
+_MAX_LAYOUTS = 4096
+_NO_EXTRA = frozenset()
+
+
+def _layout(cls, keys, extra_keys):
+    cache_key = (cls, keys, extra_keys)
+    layout = _LAYOUTS.get(cache_key)
+    if layout is None:
+        fields = {key: None if key in extra_keys else (cls.FIELDS[key][0], cls.FIELDS[key][2]) for key in keys}
+        layout = _Layout(tuple(map(_intern, keys)), fields)
+        if len(_LAYOUTS) < _MAX_LAYOUTS:
+            _LAYOUTS[cache_key] = layout
+    return layout
+
+
+class Record(Mapping):
+    """Read-only mapping over ``__slots__``; subclasses declare ``FIELDS``: key -> (slot, pack, unpack)."""
+
+    __slots__ = ("_layout", "_extra")
+    FIELDS = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        fields = cls.FIELDS
+        extra = None
+        for key, value in data.items():
+            spec = fields.get(key)
+            if spec is not None:
+                slot, pack, _ = spec
+                packed = value if pack is None else pack(value)
+                if packed is not _SKIP:
+                    setattr(record, slot, packed)
+                    continue
+            if extra is None:
+                extra = {}
+            extra[key] = value
+        record._layout = _layout(cls, tuple(data), frozenset(extra) if extra else _NO_EXTRA)
+        record._extra = None if extra is None else cls._pack_extra(extra)
+        return record
+
+    @staticmethod
+    def _pack_extra(extra):
+        return extra
+
+    def _extras(self):
+        return self._extra
+
+    def __getitem__(self, key):
+        field = self._layout.fields[key]
+        if field is None:
+            return self._extras()[key]
+        slot, unpack = field
+        value = getattr(self, slot)
+        return value if unpack is None else unpack(value)
+
+    def get(self, key, default=None):
+        field = self._layout.fields.get(key, _SKIP)
+        if field is _SKIP:
+            return default
+        if field is None:
+            return self._extras()[key]
+        slot, unpack = field
+        value = getattr(self, slot)
+        return value if unpack is None else unpack(value)
+
+    def __contains__(self, key):
+        return key in self._layout.fields
+
+    def __iter__(self):
+        return iter(self._layout.keys)
+
+    def __len__(self):
+        return len(self._layout.keys)
+
+    def to_dict(self):
+        """The plain dict this record was made from."""
+        layout = self._layout
+        if layout.values is not None:
+            result = dict(zip(layout.keys, layout.values(self)))
+            for key, unpack in layout.unpack:
+                result[key] = unpack(result[key])
+            return result
+        extra = self._extras() if self._extra is not None else None
+        result = {}
+        for key, field in self._layout.fields.items():
+            if field is None:
+                result[key] = extra[key]
+            else:
+                slot, unpack = field
+                value = getattr(self, slot)
+                result[key] = value if unpack is None else unpack(value)
+        return result
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class PantryItem(Record):
+    """One pantry item as stored by the pantry endpoints."""
+
+    __slots__ = ("id", "name", "quantity", "unit", "category", "notes",
+                 "created_at", "updated_at", "expires_at", "spoiled", "spoiled_at")
+    FIELDS = {
+        "id": ("id", _pack_id, _unpack_id),
+        "name": ("name", _text, None),
+        "quantity": ("quantity", _number, None),
+        "unit": ("unit", _text, None),
+        "category": ("category", _text, None),
+        "notes": ("notes", _text, None),
+        "createdAt": ("created_at", pack_time, unpack_time),
+        "updatedAt": ("updated_at", pack_time, unpack_time),
+        "expiresAt": ("expires_at", _text, None),
+        "spoiled": ("spoiled", None, None),
+        "spoiledAt": ("spoiled_at", pack_time, unpack_time),
+    }
+
+
+class ShoppingItem(Record):
+    """One ``shoppingList`` entry of a recipe set."""
+
+    __slots__ = ("item", "quantity", "unit", "category")
+    FIELDS = {
+        "item": ("item", _text, None),
+        "quantity": ("quantity", _number, None),
+        "unit": ("unit", _text, None),
+        "category": ("category", _text, None),
+    }
+
+
+# Preset deflate dictionary: a few hundred bytes of text that recipe blobs
+# commonly contain, so even a short recipe compresses well on its own.
+RECIPE_ZDICT = (
+    b'"nutrition":{"calories":"protein":"carbs":"fat":"fiber":"sodium":"g","quantities":[{"item":"quantity":'
+    b'"unit":"grams","cup","tbsp","tsp","description":"A quick and delicious meal perfect for weeknight dinners'
+    b'","steps":["Preheat the oven to 200C (400F). ","Heat the olive oil in a large skillet over medium heat. '
+    b'Add the onion and garlic and cook until softened, about 3-4 minutes. Season with salt and pepper to taste'
+    b'. Stir in the tomatoes and bring to a simmer. Reduce the heat and cook until tender, stirring occasional'
+    b'ly. Transfer to a plate and serve immediately. Bake for 20-25 minutes until golden brown. Serve hot with '
+)
+
+
+class Recipe(Record):
+    """One generated recipe; everything but the matching fields is kept deflated."""
+
+    __slots__ = ("title", "cook_time", "servings", "ingredients_used", "missing", "technique")
+    FIELDS = {
+        "title": ("title", _string, None),
+        "cookTime": ("cook_time", _text, None),
+        "servings": ("servings", _number, None),
+        "ingredientsUsed": ("ingredients_used", _names, list),
+        "missingIngredients": ("missing", _names, list),
+        "technique": ("technique", _text, None),
+    }
+
+    @staticmethod
+    def _pack_extra(extra):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15, zdict=RECIPE_ZDICT)
+        return compressor.compress(serialization.dumps(extra)) + compressor.flush()
+
+    def _extras(self):
+        return serialization.loads(zlib.decompressobj(-15, zdict=RECIPE_ZDICT).decompress(self._extra))
+
+
+def compact(item, cls):
+    """``cls.from_dict(item)`` for dicts; anything else is returned unchanged."""
+    return cls.from_dict(item) if type(item) is dict else item
+
+
+def plain(value):
+    """The API form of a record (its dict); other values are returned unchanged."""
+    return value.to_dict() if isinstance(value, Record) else value
@@ -0,0 +1,77 @@
+"""
+Fast JSON serialization for responses and data files.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise; both paths produce UTF-8 bytes. ``FastJSONProvider`` plugs the
+same serializer into Flask so ``jsonify`` emits compact JSON.
+"""
+
+import dataclasses
+import decimal
+import json
+import uuid
+from collections.abc import Mapping
+from datetime import date
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+
+def _default(obj):
+    """Fallback for types neither serializer handles natively (mirrors Flask's default)."""
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, Mapping):  # e.g. the read-only records of records.py
+        return obj.to_dict() if hasattr(obj, "to_dict") else dict(obj)
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj, pretty=False):
+        """Serialize to UTF-8 JSON bytes; ``pretty`` indents by two spaces."""
+        option = _OPTIONS | orjson.OPT_INDENT_2 if pretty else _OPTIONS
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    def dumps(obj, pretty=False):
+        """Serialize to UTF-8 JSON bytes; ``pretty`` indents by two spaces."""
+        if pretty:
+            text = json.dumps(obj, default=_default, ensure_ascii=False, indent=2)
+        else:
+            text = json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":"))
+        return text.encode("utf-8")
+
+    def loads(data):
+        return json.loads(data)
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by ``dumps``/``loads`` above; always compact."""
+
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
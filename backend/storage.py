@@ -0,0 +1,375 @@
+"""
+JSON file storage that is safe to share between worker processes.
+
+- ``PantryStore`` serves reads from an in-process cache that is revalidated
+  against the file's stat on every load, so a write from another worker is
+  picked up on the next request. Writes hold an exclusive lock on a sidecar
+  ``.lock`` file across read-modify-write and replace the data file atomically.
+  With ``COMPACT_RECORDS=true`` cached items are compact ``records.PantryItem``s.
+- ``TenantPantries`` gives every tenant (household) its own ``PantryStore``,
+  file and lock, sharded over subdirectories.
+- ``RecipeLog`` buffers appended recipe entries in memory and a background
+  thread flushes them in batches, under the same kind of lock.
+
+``flush_all()`` writes every pending entry; it runs at interpreter exit and
+from the gunicorn ``worker_exit`` hook so graceful shutdowns lose nothing.
+On platforms without ``fcntl`` the file lock degrades to an in-process lock.
+Files are indented for readability unless ``COMPACT_STORAGE=true``.
+"""
+
+import atexit
+import hashlib
+import logging
+import os
+import re
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import records
+import serialization
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+COMPACT_STORAGE = os.getenv("COMPACT_STORAGE", "false").lower() == "true"
+COMPACT_RECORDS = os.getenv("COMPACT_RECORDS", "false").lower() == "true"
+
+# Read once at import: os.umask can only be read by setting it, which is not thread-safe later on
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+_stores = []
+_stores_lock = threading.Lock()
+
+
+def _register(store):
+    with _stores_lock:
+        _stores.append(store)
+
+
+def flush_all():
+    """Flush pending writes of every store in this process."""
+    with _stores_lock:
+        stores = list(_stores)
+    for store in stores:
+        try:
+            store.flush()
+        except Exception as e:
+            logger.error(f"Error flushing {store.path}: {str(e)}")
+
+
+atexit.register(flush_all)
+
+
+def read_json(path):
+    with open(path, "rb") as f:
+        return serialization.loads(f.read())
+
+
+def _file_mode(path):
+    """Permissions for a rewritten file: the current file's, or what open() would give a new one."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+def atomic_write_json(path, data):
+    """Write JSON to a temp file in the same directory and rename it over ``path``.
+
+    The temp file (created 0600) gets ``path``'s permissions first, so readers such as
+    backups keep their access.
+    """
+    payload = serialization.dumps(data, pretty=not COMPACT_STORAGE)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.chmod(tmp_path, _file_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(payload)
+
+
+class FileLock:
+    """Exclusive lock shared by threads (in-process lock) and processes (flock)."""
+
+    def __init__(self, path):
+        self.path = path + ".lock"
+        self._thread_lock = threading.RLock()
+
+    @contextmanager
+    def hold(self):
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path, "a") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class PantryStore:
+    """The ``pantry`` list inside a JSON document such as db.json."""
+
+    def __init__(self, path, compact=None):
+        self.path = path
+        self.compact = COMPACT_RECORDS if compact is None else compact
+        self.lock = FileLock(path)
+        self._cache_lock = threading.Lock()
+        self._cache_key = None
+        self._document = None
+        self.size = 0
+
+    def _read_document(self):
+        key = _stat_key(self.path)
+        if key is None:
+            return None, {"pantry": []}
+        return key, read_json(self.path)
+
+    def _cached(self, document, unchanged=None):
+        """The form a document is kept in memory: its pantry items as compact records.
+
+        ``unchanged`` maps id(item) to the cached record of items a transaction did not
+        modify, so a write only builds records for the items that changed.
+        """
+        pantry = document.get("pantry")
+        if not self.compact or not isinstance(pantry, list):
+            return document
+        unchanged = unchanged or {}
+        document = dict(document)
+        document["pantry"] = [unchanged.get(id(item)) or records.compact(item, records.PantryItem)
+                              for item in pantry]
+        return document
+
+    def _unchanged(self, key, items, new_items):
+        """id(new item) -> cached record where ``new_items[i]`` still equals the ``items[i]`` that was read."""
+        with self._cache_lock:
+            if not self.compact or key is None or key != self._cache_key:
+                return None
+            cached = self._document.get("pantry")
+        if not isinstance(cached, list) or len(cached) != len(items):
+            return None
+        return {id(new): record for new, item, record in zip(new_items, items, cached) if new == item}
+
+    def _document_snapshot(self):
+        key = _stat_key(self.path)
+        with self._cache_lock:
+            if key is not None and key == self._cache_key:
+                return key, self._document
+        key, document = self._read_document()
+        document = self._cached(document)
+        with self._cache_lock:
+            self._cache_key, self._document = key, document
+            self.size = key[2] if key else 0
+        return key, document
+
+    def load(self):
+        """Current pantry items (read-only records when compact).
+
+        The list is shared with the cache: do not mutate it.
+        """
+        return self._document_snapshot()[1].get("pantry", [])
+
+    def version(self):
+        """Opaque value that changes whenever the pantry file changes."""
+        return self._document_snapshot()[0]
+
+    def snapshot(self):
+        """(version, items) of one and the same pantry state; the items are shared like ``load()``'s."""
+        key, document = self._document_snapshot()
+        return key, document.get("pantry", [])
+
+    def _write(self, document, unchanged=None):
+        size = atomic_write_json(self.path, document)
+        document = self._cached(document, unchanged)
+        with self._cache_lock:
+            self._cache_key, self._document = _stat_key(self.path), document
+            self.size = size
+
+    def save(self, pantry):
+        """Replace the pantry, keeping any other top-level keys in the document."""
+        with self.lock.hold():
+            key, document = self._read_document()
+            unchanged = self._unchanged(key, document.get("pantry", []), pantry)
+            document = dict(document)
+            document["pantry"] = pantry
+            self._write(document, unchanged)
+
+    @contextmanager
+    def transaction(self):
+        """Yield a private copy of the pantry and save it on a clean exit, all under the lock."""
+        with self.lock.hold():
+            key, document = self._read_document()
+            items = document.get("pantry", [])
+            pantry = [dict(item) for item in items]
+            copies = list(pantry)  # keeps the copies alive, so their ids stay unique
+            yield pantry
+            unchanged = self._unchanged(key, items, copies)
+            document = dict(document)
+            document["pantry"] = pantry
+            self._write(document, unchanged)
+
+    def flush(self):
+        """Pantry writes are write-through; nothing is ever pending."""
+
+
+TENANT_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+def valid_tenant(tenant):
+    return isinstance(tenant, str) and TENANT_ID.match(tenant) is not None and ".." not in tenant
+
+
+class TenantPantries:
+    """One ``PantryStore`` per tenant, each in its own file with its own lock.
+
+    Tenant files live in ``directory/<shard>/<tenant>.json``, where the shard is
+    the first byte of a hash of the tenant id, so writes for one household never
+    touch another's file and no directory grows past a few hundred entries at
+    10k tenants. ``default_tenant`` keeps ``default_path`` (db.json) when given.
+    At most ``max_open`` stores (with their cached documents) are kept in memory.
+    """
+
+    def __init__(self, directory, default_path=None, default_tenant="default", max_open=4096):
+        self.directory = directory
+        self.default_path = default_path
+        self.default_tenant = default_tenant
+        self.max_open = max_open
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, tenant):
+        if tenant == self.default_tenant and self.default_path:
+            return self.default_path
+        shard = hashlib.blake2b(tenant.encode("utf-8"), digest_size=1).hexdigest()
+        return os.path.join(self.directory, shard, f"{tenant}.json")
+
+    def get(self, tenant):
+        """The store for ``tenant``; raises ValueError for ids that are not safe file names."""
+        with self._lock:
+            store = self._stores.get(tenant)
+            if store is not None:
+                self._stores.move_to_end(tenant)
+                return store
+        if not valid_tenant(tenant):
+            raise ValueError(f"Invalid tenant id: {tenant!r}")
+        path = self.path(tenant)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            store = self._stores.setdefault(tenant, PantryStore(path))
+            while len(self._stores) > self.max_open:
+                self._stores.popitem(last=False)
+        return store
+
+    def __len__(self):
+        return len(self._stores)
+
+    def tenants(self):
+        """Every tenant with a pantry file (the default tenant first)."""
+        if self.default_path and os.path.exists(self.default_path):
+            yield self.default_tenant
+        try:
+            shards = sorted(entry.path for entry in os.scandir(self.directory) if entry.is_dir())
+        except FileNotFoundError:
+            return
+        for shard in shards:
+            for entry in os.scandir(shard):
+                tenant, ext = os.path.splitext(entry.name)
+                if ext == ".json" and valid_tenant(tenant) and tenant != self.default_tenant:
+                    yield tenant
+
+
+class RecipeLog:
+    """Append-only list of recipe entries (recipes.json) with batched writes."""
+
+    def __init__(self, path, flush_interval=1.0, max_pending=50):
+        self.path = path
+        self.lock = FileLock(path)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        _register(self)
+
+    def append(self, entry):
+        """Queue an entry; it reaches the file within ``flush_interval`` seconds."""
+        with self._pending_lock:
+            self._pending.append(entry)
+            pending = len(self._pending)
+            if self._thread is None or not self._thread.is_alive():
+                # Started lazily so a pre-forking server never forks a running thread.
+                self._thread = threading.Thread(target=self._flush_loop, name="recipe-log-flusher", daemon=True)
+                self._thread.start()
+        if pending >= self.max_pending or self.flush_interval <= 0:
+            self._wakeup.set()
+        return pending
+
+    def pending(self):
+        with self._pending_lock:
+            return len(self._pending)
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing recipes to {self.path}: {str(e)}")
+
+    def flush(self):
+        """Write pending entries to the file; returns how many were written."""
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        try:
+            with self.lock.hold():
+                recipes = self._read()
+                recipes.extend(batch)
+                atomic_write_json(self.path, recipes)
+        except Exception:
+            with self._pending_lock:
+                self._pending[:0] = batch
+            raise
+        logger.info(f"Flushed {len(batch)} recipe(s) to {self.path}")
+        return len(batch)
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return []
+        return read_json(self.path)
+
+    def load(self):
+        """Every saved entry, including ones not yet flushed."""
+        with self.lock.hold():
+            recipes = self._read()
+        with self._pending_lock:
+            return recipes + self._pending
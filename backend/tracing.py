@@ -0,0 +1,294 @@
+"""
+Request-scoped tracing with OTLP-compatible JSON export.
+
+Each request opens a root span; ``span()`` nests child spans under whatever
+span is current in the calling context. When the root span ends, the finished
+trace is queued and a background thread writes it as OTLP/JSON
+(``{"resourceSpans": [...]}``), one document per line, to ``TRACE_FILE`` and/or
+POSTs it to an OTLP/HTTP collector at ``TRACE_OTLP_ENDPOINT``
+(e.g. ``http://localhost:4318/v1/traces``).
+
+Tracing is off unless one of those targets is configured; spans are then
+no-ops that cost a context-variable lookup.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "pantry-ai-backend")
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+MAX_SPANS_PER_TRACE = 512
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span = contextvars.ContextVar("pantryai_current_span", default=None)
+
+
+def enabled():
+    return bool(TRACE_FILE or TRACE_OTLP_ENDPOINT)
+
+
+def estimate_tokens(text):
+    """Rough token count for English prompts (~4 characters per token)."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+class _Trace:
+    def __init__(self):
+        self.trace_id = "%032x" % random.getrandbits(128)
+        self.spans = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def add(self, span):
+        with self.lock:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+
+class Span:
+    """A timed operation inside a trace."""
+
+    def __init__(self, name, trace, parent=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.trace = trace
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent.span_id if parent else ""
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status = STATUS_OK
+        self.status_message = ""
+        self.start_ns = 0
+        self.end_ns = 0
+        self._token = None
+
+    @property
+    def trace_id(self):
+        return self.trace.trace_id
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes):
+        self.attributes.update(attributes)
+
+    def record_error(self, error):
+        self.status = STATUS_ERROR
+        self.status_message = str(error)
+
+    def duration(self):
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+    def start(self):
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def end(self):
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Ended from a different context than the one that started it.
+                _current_span.set(None)
+            self._token = None
+        self.trace.add(self)
+        if not self.parent_id:
+            _exporter.submit(self.trace)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_error(exc)
+        self.end()
+        return False
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status, "message": self.status_message},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    trace_id = ""
+    span_id = ""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def duration(self):
+        return 0.0
+
+    def start(self):
+        return self
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def current_span():
+    """The innermost active span, or a no-op span outside a sampled trace."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def start_trace(name, **attributes):
+    """Open the root span of a new trace (call ``end()`` on the result)."""
+    if not enabled() or random.random() >= TRACE_SAMPLE_RATE:
+        return NOOP_SPAN
+    return Span(name, _Trace(), kind=SPAN_KIND_SERVER, attributes=attributes).start()
+
+
+def span(name, **attributes):
+    """Child span of the current span; a no-op when no trace is active."""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent.trace, parent=parent, attributes=attributes)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def to_otlp_json(traces):
+    """Build an OTLP/JSON ExportTraceServiceRequest for finished traces."""
+    spans = []
+    for trace in traces:
+        with trace.lock:
+            spans.extend(span.to_otlp() for span in trace.spans)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "pantryai.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+class _Exporter:
+    """Background batcher that writes finished traces to a file and/or collector."""
+
+    def __init__(self, max_queue=1000, batch_size=64, flush_interval=1.0):
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def submit(self, trace):
+        if not enabled():
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="trace-exporter", daemon=True)
+                    self._thread.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._flush_interval
+            while len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._export(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _export(self, traces):
+        document = to_otlp_json(traces)
+        if TRACE_FILE:
+            try:
+                with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(document, ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.error(f"Error writing traces: {str(e)}")
+        if TRACE_OTLP_ENDPOINT:
+            body = json.dumps(document).encode("utf-8")
+            req = urllib.request.Request(TRACE_OTLP_ENDPOINT, data=body,
+                                         headers={"Content-Type": "application/json"})
+            try:
+                urllib.request.urlopen(req, timeout=5).close()
+            except Exception as e:
+                logger.error(f"Error exporting traces to {TRACE_OTLP_ENDPOINT}: {str(e)}")
+
+    def flush(self):
+        """Block until every queued trace has been exported."""
+        if self._thread is not None:
+            self._queue.join()
+
+
+_exporter = _Exporter()
+
+
+def flush():
+    _exporter.flush()
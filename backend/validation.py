@@ -0,0 +1,154 @@
+"""
+Validation of LLM recipe output against the PantryChef schema and the pantry.
+
+Schemas use a small JSON Schema subset (type, properties, required, items,
+minItems, minLength) and are compiled once into nested closures, so checking
+a response costs a handful of ``isinstance`` calls per field rather than a walk
+over the schema document. Pantry membership uses a precomputed set of
+normalized names (case-insensitive, quantities in parentheses ignored, simple
+plurals folded), the same normalization the recipe cache uses.
+"""
+
+from recipe_cache import normalize_ingredient
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+}
+
+
+def compile_schema(schema):
+    """Compile a schema into ``check(value, path, errors)`` that appends error messages."""
+    type_names = schema.get("type")
+    if isinstance(type_names, str):
+        type_names = [type_names]
+    expected = tuple(t for name in type_names or () for t in
+                     (_TYPES[name] if isinstance(_TYPES[name], tuple) else (_TYPES[name],)))
+    allows_bool = "boolean" in (type_names or ())
+    type_label = " or ".join(type_names or ())
+    min_length = schema.get("minLength")
+    min_items = schema.get("minItems")
+    item_check = compile_schema(schema["items"]) if "items" in schema else None
+    property_checks = [(name, compile_schema(sub)) for name, sub in schema.get("properties", {}).items()]
+    required = tuple(schema.get("required", ()))
+
+    def check(value, path, errors):
+        if expected and (not isinstance(value, expected) or (isinstance(value, bool) and not allows_bool)):
+            errors.append(f"{path}: expected {type_label}")
+            return
+        if min_length is not None and isinstance(value, str) and len(value.strip()) < min_length:
+            errors.append(f"{path}: must not be empty")
+        if isinstance(value, list):
+            if min_items is not None and len(value) < min_items:
+                errors.append(f"{path}: needs at least {min_items} item(s)")
+            if item_check is not None:
+                for i, item in enumerate(value):
+                    item_check(item, f"{path}[{i}]", errors)
+        if isinstance(value, dict):
+            for name in required:
+                if name not in value:
+                    errors.append(f"{path}.{name}: missing")
+            for name, sub_check in property_checks:
+                if name in value:
+                    sub_check(value[name], f"{path}.{name}", errors)
+
+    return check
+
+
+STRING_LIST = {"type": "array", "items": {"type": "string", "minLength": 1}}
+
+RECIPE_SCHEMA = {
+    "type": "object",
+    "required": ["title", "ingredientsUsed", "missingIngredients", "steps"],
+    "properties": {
+        "title": {"type": "string", "minLength": 1},
+        "description": {"type": "string"},
+        "cookTime": {"type": ["string", "number"]},
+        "servings": {"type": ["integer", "number", "string"]},
+        "ingredientsUsed": dict(STRING_LIST, minItems=1),
+        "missingIngredients": STRING_LIST,
+        "nutrition": {"type": "object"},
+        "quantities": {"type": "array", "items": {"type": "object", "required": ["item"]}},
+        "steps": dict(STRING_LIST, minItems=1),
+        "technique": {"type": "string"},
+    },
+}
+
+# Recipes are checked one by one (see check_recipe) so failures can be repaired individually.
+RECIPE_SET_SCHEMA = {
+    "type": "object",
+    "required": ["recipes"],
+    "properties": {
+        "recipes": {"type": "array", "minItems": 1, "items": {"type": "object"}},
+        "shoppingList": {"type": "array", "items": {"type": "object", "required": ["item"]}},
+    },
+}
+
+_check_recipe_set = compile_schema(RECIPE_SET_SCHEMA)
+_check_recipe = compile_schema(RECIPE_SCHEMA)
+
+
+class PantrySet:
+    """Normalized pantry names for case-insensitive membership checks."""
+
+    def __init__(self, names):
+        self.names = frozenset(filter(None, (normalize_ingredient(name) for name in names)))
+
+    def __contains__(self, name):
+        return normalize_ingredient(name) in self.names
+
+    def foreign(self, ingredients):
+        """Entries of ``ingredients`` that are not in the pantry."""
+        return [name for name in ingredients if normalize_ingredient(name) not in self.names]
+
+
+def check_recipe_set(data):
+    """Errors in the envelope (recipes array, shopping list); individual recipes are not checked."""
+    errors = []
+    _check_recipe_set(data, "$", errors)
+    return errors
+
+
+def check_recipe(recipe, pantry, path="recipe"):
+    """Validate one recipe; returns (errors, foreign ingredients), both empty when it is valid.
+
+    Pantry membership is only checked once the recipe matches the schema, so a
+    non-empty ``foreign`` list means the recipe is otherwise well-formed.
+    """
+    errors = []
+    _check_recipe(recipe, path, errors)
+    if errors:
+        return errors, []
+    foreign = pantry.foreign(recipe["ingredientsUsed"])
+    if foreign:
+        errors.append(f"{path}.ingredientsUsed: not in the pantry: {', '.join(foreign)}")
+    return errors, foreign
+
+
+def reclassify_foreign(recipe, pantry):
+    """Move ingredientsUsed entries that are not in the pantry to missingIngredients; returns them."""
+    foreign = pantry.foreign(recipe["ingredientsUsed"])
+    if foreign:
+        moved = set(foreign)
+        recipe["ingredientsUsed"] = [name for name in recipe["ingredientsUsed"] if name not in moved]
+        missing = recipe["missingIngredients"]
+        known = {normalize_ingredient(name) for name in missing}
+        missing.extend(name for name in foreign if normalize_ingredient(name) not in known)
+    return foreign
+
+
+def merge_shopping_list(data):
+    """Add missingIngredients of every recipe that the aggregated shoppingList lacks."""
+    shopping_list = data.setdefault("shoppingList", [])
+    listed = {normalize_ingredient(entry.get("item", "")) for entry in shopping_list if isinstance(entry, dict)}
+    for recipe in data.get("recipes", []):
+        for name in recipe.get("missingIngredients", []):
+            key = normalize_ingredient(name)
+            if key not in listed:
+                listed.add(key)
+                shopping_list.append({"item": name, "quantity": 1, "unit": "piece"})
+    return shopping_list
@@ -0,0 +1,14 @@
+"""
+Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module preloads caches once; with ``preload_app`` gunicorn does
+that in the master process before forking the workers.
+"""
+
+import main
+
+main.preload()
+
+app = main.app